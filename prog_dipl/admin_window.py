@@ -8,13 +8,17 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import QFont, QIntValidator, QFontMetrics, QIcon
 from PyQt5.QtCore import Qt
+from api_client import SERVER_URL, get_session, get_mirror
 
-API_URL = 'http://127.0.0.1:5000'
+API_URL = SERVER_URL
 
 
 class AdminScreen(QWidget):
     def __init__(self):
         super().__init__()
+        self.http = get_session()
+        # Группы, студенты и предметы обновляются через /api/sync
+        self.mirror = get_mirror()
         self.setWindowTitle('Окно администратора')
         self.setGeometry(100, 100, 1200, 850)
         self.setMinimumSize(1000, 700)
@@ -200,7 +204,7 @@ class AdminScreen(QWidget):
     def load_users(self):
         """Загрузка списка пользователей из API"""
         try:
-            response = requests.get(f'{API_URL}/api/get_users')
+            response = self.http.get(f'{API_URL}/api/get_users')
             if response.status_code != 200:
                 raise Exception(response.json().get('error', 'Ошибка'))
             
@@ -252,7 +256,7 @@ class AdminScreen(QWidget):
             return
             
         try:
-            response = requests.delete(f'{API_URL}/api/delete_user/{username}')
+            response = self.http.delete(f'{API_URL}/api/delete_user/{username}')
             
             if response.status_code == 200:
                 QMessageBox.information(self, 'Успех', 'Пользователь успешно удален')
@@ -274,7 +278,7 @@ class AdminScreen(QWidget):
             return
 
         try:
-            response = requests.post(f'{API_URL}/api/register', json={
+            response = self.http.post(f'{API_URL}/api/register', json={
                 'username': username,
                 'password': password,
                 'role': role
@@ -294,10 +298,8 @@ class AdminScreen(QWidget):
 
     def load_groups(self):
         try:
-            response = requests.get(f'{API_URL}/api/get_universities')
-            if response.status_code != 200:
-                raise Exception(response.json().get('error', 'Ошибка'))
-            groups = response.json()
+            self.mirror.refresh()
+            groups = self.mirror.groups()
             self.groups_table.setRowCount(len(groups))
             
             for row_idx, g in enumerate(groups):
@@ -344,7 +346,7 @@ class AdminScreen(QWidget):
             return
         try:
             course = int(course_text)
-            response = requests.post(f'{API_URL}/api/add_group', json={
+            response = self.http.post(f'{API_URL}/api/add_group', json={
                 'name': name,
                 'course': course
             })
@@ -366,10 +368,8 @@ class AdminScreen(QWidget):
         group_id = int(self.groups_table.item(row, 0).text())
         group_name = self.groups_table.item(row, 1).text()
         try:
-            response = requests.get(f'{API_URL}/api/get_students/{group_id}')
-            if response.status_code != 200:
-                raise Exception(response.json().get('error', 'Ошибка'))
-            students = response.json()
+            self.mirror.refresh()
+            students = self.mirror.students(group_id)
             student_count = len(students)
         except Exception as e:
             QMessageBox.critical(self, 'Ошибка', f'Ошибка получения студентов: {str(e)}')
@@ -384,7 +384,7 @@ class AdminScreen(QWidget):
         msg_box.exec_()
         if msg_box.clickedButton() == delete_all_btn:
             try:
-                response_del = requests.delete(f'{API_URL}/api/delete_group/{group_id}')
+                response_del = self.http.delete(f'{API_URL}/api/delete_group/{group_id}')
                 if response_del.status_code != 200:
                     raise Exception(response_del.json().get('error', 'Ошибка'))
                 self.load_groups()
@@ -403,10 +403,8 @@ class AdminScreen(QWidget):
         layout.addWidget(QLabel('Выберите новую группу:'))
 
         try:
-            response = requests.get(f'{API_URL}/api/get_universities')
-            if response.status_code != 200:
-                raise Exception(response.json().get('error', 'Ошибка'))
-            groups = response.json()
+            self.mirror.refresh()
+            groups = self.mirror.groups()
         except Exception as e:
             QMessageBox.critical(self, 'Ошибка', f'Ошибка загрузки групп: {str(e)}')
             return
@@ -438,14 +436,14 @@ class AdminScreen(QWidget):
     def do_transfer_and_delete(self, old_group_id, new_group_id, dlg):
         try:
             # Перевод студентов
-            response = requests.post(f'{API_URL}/api/transfer_group', json={
+            response = self.http.post(f'{API_URL}/api/transfer_group', json={
                 'old_group_id': old_group_id,
                 'new_group_id': new_group_id
             })
             if response.status_code != 200:
                 raise Exception(response.json().get('error', 'Ошибка'))
             # Удаление группы
-            del_response = requests.delete(f'{API_URL}/api/delete_group/{old_group_id}')
+            del_response = self.http.delete(f'{API_URL}/api/delete_group/{old_group_id}')
             if del_response.status_code != 200:
                 raise Exception(del_response.json().get('error', 'Ошибка'))
             dlg.accept()
@@ -532,6 +530,8 @@ class AdminScreen(QWidget):
 class StudentManagementWindow(QDialog):
     def __init__(self, group_id, group_name):
         super().__init__()
+        self.http = get_session()
+        self.mirror = get_mirror()
         self.group_id = group_id
         self.group_name = group_name
         self.setWindowTitle(f'Группа: {group_name}')
@@ -611,10 +611,8 @@ class StudentManagementWindow(QDialog):
 
     def load_students(self):
         try:
-            response = requests.get(f'{API_URL}/api/get_students/{self.group_id}')
-            if response.status_code != 200:
-                raise Exception(f"Ошибка: {response.json().get('error', 'Неизвестная ошибка')}")
-            students = response.json()
+            self.mirror.refresh()
+            students = self.mirror.students(self.group_id)
             self.students_table.setRowCount(len(students))
             for row_idx, student in enumerate(students):
                 self.students_table.setItem(row_idx, 0, QTableWidgetItem(student['surname']))
@@ -651,7 +649,7 @@ class StudentManagementWindow(QDialog):
     def update_nonresident_status(self, student_id, state):
         is_nonresident = 1 if state == Qt.Checked else 0
         try:
-            response = requests.post(f'{API_URL}/api/update_student_nonresident', json={
+            response = self.http.post(f'{API_URL}/api/update_student_nonresident', json={
                 'student_id': student_id,
                 'is_nonresident': is_nonresident
             })
@@ -662,10 +660,8 @@ class StudentManagementWindow(QDialog):
 
     def load_all_groups(self):
         try:
-            response = requests.get(f'{API_URL}/api/get_universities')
-            if response.status_code != 200:
-                raise Exception(response.json().get('error', 'Ошибка'))
-            self.all_groups = response.json()
+            self.mirror.refresh()
+            self.all_groups = self.mirror.groups()
         except Exception as e:
             QMessageBox.critical(self, 'Ошибка', f'Ошибка загрузки групп: {str(e)}')
 
@@ -679,7 +675,7 @@ class StudentManagementWindow(QDialog):
             QMessageBox.warning(self, 'Ошибка', 'Заполните обязательные поля (Фамилия и Имя)')
             return
         try:
-            response = requests.post(f'{API_URL}/api/add_student', json={
+            response = self.http.post(f'{API_URL}/api/add_student', json={
                 'surname': surname,
                 'name': name,
                 'middle_name': middle,
@@ -705,7 +701,7 @@ class StudentManagementWindow(QDialog):
         if reply == QMessageBox.No:
             return
         try:
-            response = requests.delete(f'{API_URL}/api/delete_student/{student_id}')
+            response = self.http.delete(f'{API_URL}/api/delete_student/{student_id}')
             if response.status_code != 200:
                 raise Exception(response.json().get('error', 'Ошибка'))
             self.load_students()
@@ -720,10 +716,8 @@ class StudentManagementWindow(QDialog):
         layout.addWidget(QLabel('Выберите новую группу:'))
 
         try:
-            response = requests.get(f'{API_URL}/api/get_universities')
-            if response.status_code != 200:
-                raise Exception(response.json().get('error', 'Ошибка'))
-            groups = response.json()
+            self.mirror.refresh()
+            groups = self.mirror.groups()
         except Exception as e:
             QMessageBox.critical(self, 'Ошибка', f'Ошибка загрузки групп: {str(e)}')
             return
@@ -754,7 +748,7 @@ class StudentManagementWindow(QDialog):
 
     def do_transfer(self, student_id, new_group_id, dialog):
         try:
-            response = requests.post(f'{API_URL}/api/transfer_student', json={
+            response = self.http.post(f'{API_URL}/api/transfer_student', json={
                 'student_id': student_id,
                 'new_group_id': new_group_id
             })
@@ -836,6 +830,8 @@ class StudentManagementWindow(QDialog):
 class SubjectsTab(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.http = get_session()
+        self.mirror = get_mirror()
         self.init_ui()
         self.load_subjects()
         self.set_style()
@@ -888,10 +884,8 @@ class SubjectsTab(QWidget):
 
     def load_subjects(self):
         try:
-            response = requests.get(f'{API_URL}/api/subjects')
-            if response.status_code != 200:
-                raise Exception(response.json().get('error', 'Ошибка'))
-            subjects = response.json()
+            self.mirror.refresh()
+            subjects = self.mirror.subjects()
             self.subjects_table.setRowCount(len(subjects))
             for row_idx, subj in enumerate(subjects):
                 self.subjects_table.setItem(row_idx, 0, QTableWidgetItem(str(subj['id'])))
@@ -924,7 +918,7 @@ class SubjectsTab(QWidget):
             return
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{API_URL}/api/subjects/add",
                 json={"name": name, "description": description},
                 timeout=5  # Таймаут 5 секунд
@@ -948,7 +942,7 @@ class SubjectsTab(QWidget):
 
     def delete_subject(self, subject_id):
         try:
-            response = requests.delete(f'{API_URL}/api/subjects/{subject_id}')
+            response = self.http.delete(f'{API_URL}/api/subjects/{subject_id}')
             if response.status_code != 200:
                 raise Exception(response.json().get('error', 'Ошибка'))
             self.load_subjects()
@@ -1001,7 +995,7 @@ class SubjectsTab(QWidget):
                 QMessageBox.warning(dialog, 'Ошибка', 'Заполните название')
                 return
             try:
-                response = requests.put(f'{API_URL}/api/subjects/{subject_id}', json={
+                response = self.http.put(f'{API_URL}/api/subjects/{subject_id}', json={
                     'name': new_name,
                     'description': new_desc
                 })
@@ -0,0 +1,239 @@
+"""Общий HTTP-клиент приложения: одна сессия requests с пулом keep-alive соединений"""
+import json
+import threading
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import msgpack
+except ImportError:  # Без пакета msgpack используется колоночный JSON
+    msgpack = None
+
+SERVER_URL = 'http://127.0.0.1:5000'
+# Таймауты по умолчанию: (подключение, чтение) в секундах
+DEFAULT_TIMEOUT = (3, 30)
+# Размер пула соединений (не меньше числа рабочих потоков окон)
+DEFAULT_POOL_SIZE = 10
+# Сколько ответов с ETag хранить для повторной проверки (If-None-Match)
+ETAG_CACHE_SIZE = 256
+
+COLUMNAR_MIMETYPE = 'application/x-columnar+json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Потоковый ответ: одна JSON-строка на запись
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Заголовок Accept для компактных ответов: msgpack (если установлен),
+# затем колоночный JSON, затем обычный JSON
+COMPACT_ACCEPT = ', '.join(
+    ([MSGPACK_MIMETYPE] if msgpack is not None else [])
+    + [COLUMNAR_MIMETYPE, 'application/json;q=0.5']
+)
+
+
+class RequestRejected(Exception):
+    """Сервер отклонил запрос (ответ 4xx): повтор того же запроса не поможет"""
+
+
+def decode_response(response):
+    """Тело ответа сервера в любом из форматов (JSON, колоночный JSON, msgpack)"""
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+    if content_type == MSGPACK_MIMETYPE:
+        return msgpack.unpackb(response.content, raw=False)
+    data = response.json()
+    if content_type == COLUMNAR_MIMETYPE:
+        columns = data['columns']
+        return [dict(zip(columns, values)) for values in zip(*data['data'])]
+    return data
+
+
+def iter_ndjson(response):
+    """Записи потокового ответа по мере получения (ответ запрошен с stream=True).
+
+    Ответы в других форматах разбираются целиком.
+    """
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+    if content_type != NDJSON_MIMETYPE:
+        yield from decode_response(response)
+        return
+    with response:
+        for line in response.iter_lines(chunk_size=64 * 1024):
+            if not line:
+                continue
+            row = json.loads(line)
+            if 'error' in row:
+                # Ошибка на сервере после начала передачи
+                raise Exception(f"Server error: {row['error']}")
+            yield row
+
+
+class ApiSession(requests.Session):
+    """Сессия с таймаутом по умолчанию и пулом переиспользуемых соединений.
+
+    Относительные адреса ('/api/...') дополняются base_url. GET-ответы
+    с ETag запоминаются: повторный запрос отправляется с If-None-Match,
+    и на ответ 304 подставляется сохраненное тело.
+    """
+
+    def __init__(self, base_url=SERVER_URL, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.base_url = base_url
+        self.timeout = timeout
+        self.etag_cache = OrderedDict()
+        self._etag_lock = threading.Lock()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.headers['Connection'] = 'keep-alive'
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if url.startswith('/'):
+            url = f"{self.base_url}{url}"
+        return super().request(method, url, *args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+        # Один адрес может запрашиваться в разных форматах
+        key = (request.url, request.headers.get('Accept'))
+        with self._etag_lock:
+            cached = self.etag_cache.get(key)
+        if cached and 'If-None-Match' not in request.headers:
+            request.headers['If-None-Match'] = cached[0]
+
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and cached:
+            # Данные не изменились - отдаем сохраненный ответ
+            response.status_code = 200
+            response._content = cached[1]
+            response.headers = cached[2].copy()
+            with self._etag_lock:
+                self.etag_cache.move_to_end(key)
+        elif response.status_code == 200 and 'ETag' in response.headers:
+            with self._etag_lock:
+                self.etag_cache[key] = (response.headers['ETag'], response.content, response.headers.copy())
+                self.etag_cache.move_to_end(key)
+                while len(self.etag_cache) > ETAG_CACHE_SIZE:
+                    self.etag_cache.popitem(last=False)
+        return response
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure(base_url=SERVER_URL, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    """Пересоздание общей сессии с новыми параметрами"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = ApiSession(base_url, pool_size, timeout)
+        return _session
+
+
+def get_session():
+    """Общая сессия для всех окон приложения"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = ApiSession()
+        return _session
+
+
+class ReferenceMirror:
+    """Локальная копия групп, студентов и предметов.
+
+    refresh() запрашивает /api/sync и применяет только строки, измененные
+    после известной версии.
+    """
+    TABLES = ('groups', 'students', 'subjects')
+
+    def __init__(self, session=None):
+        self.session = session
+        self._lock = threading.Lock()
+        # Одновременные обновления из разных потоков выполняются по очереди
+        self._refresh_lock = threading.Lock()
+        self.version = 0
+        self.tables = {table: {} for table in self.TABLES}
+
+    def _fetch(self, since):
+        session = self.session or get_session()
+        response = session.get('/api/sync', params={'since': since})
+        if response.status_code >= 400:
+            raise Exception(response.json().get('error', 'Ошибка синхронизации'))
+        return response.json()
+
+    def refresh(self, fetch=None):
+        """Загрузка изменений с сервера (fetch(since) -> ответ /api/sync).
+
+        Возвращает True, если копия изменилась.
+        """
+        with self._refresh_lock:
+            delta = (fetch or self._fetch)(self.version)
+            if not delta['full'] and delta['version'] == self.version:
+                return False
+            self._apply(delta)
+        return True
+
+    def _apply(self, delta):
+        with self._lock:
+            if delta['full']:
+                self.tables = {table: {} for table in self.TABLES}
+            for table in self.TABLES:
+                changes = delta['changes'].get(table, {})
+                rows = self.tables[table]
+                for row in changes.get('inserted', []) + changes.get('updated', []):
+                    rows[row['id']] = row
+                for row_id in changes.get('deleted', []):
+                    rows.pop(row_id, None)
+            self.version = delta['version']
+
+    def groups(self):
+        """Группы в формате /api/get_universities"""
+        with self._lock:
+            counts = {}
+            for student in self.tables['students'].values():
+                counts[student['group_id']] = counts.get(student['group_id'], 0) + 1
+            groups = [
+                dict(group, students_count=counts.get(group['id'], 0))
+                for group in self.tables['groups'].values()
+            ]
+        return sorted(groups, key=lambda group: group['name'])
+
+    def subjects(self):
+        """Предметы в формате /api/subjects"""
+        with self._lock:
+            return sorted((dict(row) for row in self.tables['subjects'].values()), key=lambda row: row['id'])
+
+    def students(self, group_id=None):
+        """Студенты группы (или все) в формате /api/get_students"""
+        with self._lock:
+            groups = self.tables['groups']
+            students = [
+                {
+                    'id': student['id'],
+                    'surname': student['surname'],
+                    'name': student['name'],
+                    'middle_name': student['middle_name'],
+                    'is_nonresident': student['is_nonresident'],
+                    'group_name': groups[student['group_id']]['name'],
+                }
+                for student in sorted(self.tables['students'].values(), key=lambda row: row['id'])
+                if student['group_id'] in groups and (not group_id or student['group_id'] == group_id)
+            ]
+        if group_id:
+            return sorted(students, key=lambda row: (row['surname'], row['name']))
+        return sorted(students, key=lambda row: (row['group_name'], row['surname'], row['name']))
+
+
+_mirror = None
+
+
+def get_mirror():
+    """Общая копия справочников для окон администратора"""
+    global _mirror
+    with _session_lock:
+        if _mirror is None:
+            _mirror = ReferenceMirror()
+        return _mirror
@@ -0,0 +1,279 @@
+"""Нагрузочный тест API сервера посещаемости.
+
+Каждый сценарий выполняется заданное время заданным числом параллельных
+клиентов (у каждого свое keep-alive соединение); выводятся пропускная
+способность и задержки p50/p95/p99. Результаты сохраняются в JSON и могут
+сравниваться с предыдущим прогоном.
+
+Сценарии save_attendance и transfer_group изменяют базу, поэтому тест
+нужно запускать на базе из generate_data.py:
+    python generate_data.py --output bench
+    cd bench && python ../run_server.py &
+    python benchmark.py --dataset bench/dataset.json --concurrency 16 --duration 20
+    python benchmark.py --dataset bench/dataset.json --compare bench_results/<прошлый прогон>.json
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import threading
+import time
+
+import requests
+
+STATUSES = ('present', 'late', 'sick', 'absent')
+
+
+# --- Сценарии: функция (session, rng, context, state) -> response ---
+
+def random_day(rng, context):
+    start = datetime.date.fromisoformat(context['start_date'])
+    end = datetime.date.fromisoformat(context['end_date'])
+    return start + datetime.timedelta(days=rng.randrange((end - start).days + 1))
+
+
+def scenario_get_statistics(session, rng, context, state):
+    # Статистика группы за месяц
+    start = random_day(rng, context)
+    return session.get(f"{context['url']}/api/get_statistics", params={
+        'start_date': start.isoformat(),
+        'end_date': (start + datetime.timedelta(days=30)).isoformat(),
+        'group_id': rng.choice(context['groups']),
+    })
+
+
+def scenario_get_attendance(session, rng, context, state):
+    return session.get(f"{context['url']}/api/get_attendance", params={
+        'date': random_day(rng, context).isoformat(),
+        'lesson_number': rng.randint(1, context['lessons_per_day']),
+        'group_id': rng.choice(context['groups']),
+    })
+
+
+def scenario_save_attendance(session, rng, context, state):
+    return session.post(f"{context['url']}/api/save_attendance", json={
+        'student_id': rng.choice(context['students']),
+        'date': random_day(rng, context).isoformat(),
+        'lesson_number': rng.randint(1, context['lessons_per_day']),
+        'subject_id': rng.choice(context['subjects']),
+        'status': rng.choice(STATUSES),
+    })
+
+
+def scenario_get_students(session, rng, context, state):
+    return session.get(f"{context['url']}/api/get_students", params={'group_id': rng.choice(context['groups'])})
+
+
+def scenario_transfer_group(session, rng, context, state):
+    # Каждый клиент переводит студентов между своими двумя группами туда и обратно
+    source, target = state['pair']
+    state['pair'] = (target, source)
+    return session.post(f"{context['url']}/api/transfer_group", json={
+        'old_group_id': source, 'new_group_id': target
+    })
+
+
+SCENARIOS = {
+    'get_statistics': scenario_get_statistics,
+    'get_attendance': scenario_get_attendance,
+    'save_attendance': scenario_save_attendance,
+    'get_students': scenario_get_students,
+    'transfer_group': scenario_transfer_group,
+}
+
+
+def load_context(url, dataset_path):
+    """Идентификаторы групп, предметов и студентов, диапазон дат"""
+    context = {'url': url, 'lessons_per_day': 4}
+    if dataset_path:
+        with open(dataset_path, encoding='utf-8') as f:
+            context.update(json.load(f))
+    else:
+        today = datetime.date.today()
+        context['start_date'] = (today - datetime.timedelta(days=90)).isoformat()
+        context['end_date'] = today.isoformat()
+    session = requests.Session()
+    context['groups'] = [group['id'] for group in session.get(f'{url}/api/get_universities').json()]
+    context['subjects'] = [subject['id'] for subject in session.get(f'{url}/api/subjects').json()]
+    students = []
+    after_id = None
+    while True:
+        params = {'limit': 1000}
+        if after_id is not None:
+            params['after_id'] = after_id
+        response = session.get(f'{url}/api/get_students', params=params)
+        students += [student['id'] for student in response.json()]
+        after_id = response.headers.get('X-Next-After-Id')
+        if after_id is None:
+            break
+    context['students'] = students
+    if not (context['groups'] and context['subjects'] and students):
+        raise SystemExit('В базе нет групп, предметов или студентов')
+    return context
+
+
+def create_transfer_pairs(context, count):
+    """Пары групп для transfer_group: реальная группа переводится во временную"""
+    session = requests.Session()
+    url = context['url']
+    suffix = int(time.time())
+    pairs = []
+    for i in range(count):
+        source = context['groups'][i % len(context['groups'])]
+        ids = []
+        for name in (f'BENCH-{suffix}-{i}-A', f'BENCH-{suffix}-{i}-B'):
+            response = session.post(f'{url}/api/add_group', json={'name': name, 'course': 1})
+            ids.append(response.json()['id'])
+        session.post(f'{url}/api/transfer_group', json={'old_group_id': source, 'new_group_id': ids[0]})
+        pairs.append({'source': source, 'bench': ids})
+    return pairs
+
+
+def remove_transfer_pairs(context, pairs):
+    """Возврат студентов в исходные группы и удаление временных"""
+    session = requests.Session()
+    url = context['url']
+    for pair in pairs:
+        for group_id in pair['bench']:
+            session.post(f'{url}/api/transfer_group', json={'old_group_id': group_id, 'new_group_id': pair['source']})
+            session.delete(f'{url}/api/delete_group/{group_id}')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def run_scenario(name, context, concurrency, duration, seed, states=None):
+    """Запуск сценария: concurrency потоков в течение duration секунд"""
+    func = SCENARIOS[name]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        session = requests.Session()
+        rng = random.Random(seed * 1000 + index)
+        state = states[index] if states else {}
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = func(session, rng, context, state)
+                response.content
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            if ok:
+                local_latencies.append(time.perf_counter() - started)
+            else:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+    }
+
+
+def print_results(results, baseline=None):
+    print(f"{'сценарий':<18}{'запр/с':>10}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'ошибки':>9}")
+    for name, result in results.items():
+        line = (f"{name:<18}{result['throughput']:>10}{result['p50_ms'] or '-':>10}"
+                f"{result['p95_ms'] or '-':>10}{result['p99_ms'] or '-':>10}{result['errors']:>9}")
+        previous = (baseline or {}).get(name)
+        if previous and previous['throughput'] and result['p95_ms'] and previous['p95_ms']:
+            line += (f"   запр/с {result['throughput'] / previous['throughput'] - 1:+.0%}, "
+                     f"p95 {result['p95_ms'] / previous['p95_ms'] - 1:+.0%}")
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API посещаемости')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--dataset', help='dataset.json из generate_data.py (диапазон дат, число пар)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='сценарии через запятую: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='длительность каждого сценария, с')
+    parser.add_argument('--warmup', type=float, default=2, help='прогрев перед сценарием, с')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output-dir', default='bench_results')
+    parser.add_argument('--compare', help='файл результатов предыдущего прогона')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    context = load_context(args.url, args.dataset)
+    results = {}
+    for name in names:
+        states = None
+        pairs = []
+        if name == 'transfer_group':
+            pairs = create_transfer_pairs(context, args.concurrency)
+            states = [{'pair': tuple(pair['bench'])} for pair in pairs]
+        try:
+            if args.warmup:
+                run_scenario(name, context, args.concurrency, args.warmup, args.seed + 1, states)
+                if states:
+                    # После прогрева студенты могут оказаться во второй группе пары
+                    for state, pair in zip(states, pairs):
+                        state['pair'] = tuple(pair['bench'])
+                        requests.post(f'{args.url}/api/transfer_group', json={
+                            'old_group_id': pair['bench'][1], 'new_group_id': pair['bench'][0]})
+            results[name] = run_scenario(name, context, args.concurrency, args.duration, args.seed, states)
+        finally:
+            remove_transfer_pairs(context, pairs)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"benchmark-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'url': args.url,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'dataset': {key: value for key, value in context.items()
+                        if key not in ('url', 'groups', 'subjects', 'students')},
+            'results': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f'Результаты сохранены: {path}')
+
+
+if __name__ == '__main__':
+    main()
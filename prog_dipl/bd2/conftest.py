@@ -0,0 +1,81 @@
+"""Общие фикстуры тестов сервера.
+
+Сервер импортируется один раз за сеанс из временной папки с копией
+шаблонных баз: при импорте servbd применяет миграции к databases/
+в текущей папке, и пути баз в пулах соединений относительные.
+"""
+import datetime
+import importlib
+import os
+import random
+import shutil
+import sqlite3
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_UNIVERSITY_DB = os.path.join(BASE_DIR, 'preloaded_university.db')
+TEMPLATE_USER_DB = os.path.join(BASE_DIR, 'preloaded_user.db')
+
+
+@pytest.fixture(scope='session')
+def servbd(tmp_path_factory):
+    """Модуль сервера с базами во временной папке (без потоков заданий и кэша статистики)"""
+    workdir = tmp_path_factory.mktemp('server')
+    os.makedirs(workdir / 'databases')
+    shutil.copyfile(TEMPLATE_UNIVERSITY_DB, workdir / 'databases' / 'university.db')
+    shutil.copyfile(TEMPLATE_USER_DB, workdir / 'databases' / 'user.db')
+    cwd = os.getcwd()
+    saved_env = {name: os.environ.get(name) for name in ('JOB_WORKERS', 'STATS_CACHE')}
+    os.chdir(workdir)
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['STATS_CACHE'] = 'off'
+    try:
+        yield importlib.import_module('servbd')
+    finally:
+        os.chdir(cwd)
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@pytest.fixture
+def client(servbd):
+    return servbd.app.test_client()
+
+
+def make_university_db(servbd, path, migrations):
+    """Копия шаблонной базы с примененными миграциями (возвращает их версии)"""
+    shutil.copyfile(TEMPLATE_UNIVERSITY_DB, path)
+    return servbd.run_migrations(path, migrations)
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def fill_attendance(conn, servbd, start, days, seed=1):
+    """Группы, студенты, предметы и случайные отметки за days дней с start"""
+    rng = random.Random(seed)
+    with conn:
+        conn.executemany("INSERT INTO groups (id, name, course) VALUES (?, ?, ?)",
+                         [(10 + i, f'ТЕСТ-{i}', 1 + i % 4) for i in range(3)])
+        conn.executemany("INSERT INTO subjects (id, name, description) VALUES (?, ?, '')",
+                         [(20 + i, f'Предмет {i}') for i in range(3)])
+        students = [(100 + i, f'Фамилия{i:02d}', 'Имя', 'Отчество', 10 + i % 3) for i in range(12)]
+        conn.executemany("INSERT INTO students (id, surname, name, middle_name, group_id) "
+                         "VALUES (?, ?, ?, ?, ?)", students)
+        rows = []
+        for offset in range(days):
+            day = servbd.day_number((start + datetime.timedelta(days=offset)).isoformat())
+            for student_id, *_ in students[:-1]:  # Последний студент без отметок
+                for lesson_number in range(1, 4):
+                    if rng.random() < 0.8:
+                        rows.append((student_id, day, lesson_number, rng.choice([20, 21, 22, None]),
+                                     rng.choice(servbd.ATTENDANCE_STATUSES)))
+        conn.executemany("INSERT INTO attendance (student_id, day, lesson_number, subject_id, status) "
+                         "VALUES (?, ?, ?, ?, ?)", rows)
@@ -0,0 +1,231 @@
+"""Сравнение хранения дат посещаемости: текст 'YYYY-MM-DD' и номер дня.
+
+Отметки из базы generate_data.py (до или после миграции 7 - колонка date
+есть в обоих вариантах) копируются в две базы: со старой схемой (date TEXT)
+и с новой (day INTEGER + вычисляемая date). Для каждой выводятся размеры
+таблицы и индексов (dbstat) и время запросов по диапазону дат - тех же,
+что выполняют get_statistics и get_attendance.
+
+Пример (около 3 млн отметок):
+    python generate_data.py --output bench --groups 200 --students-per-group 25 --days 240
+    python date_storage_benchmark.py --source bench/databases/university.db --workdir bench/date_storage
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import time
+
+DAY_EPOCH = datetime.date(1970, 1, 1)
+
+# Схемы таблицы attendance до и после миграции 7 (servbd.py)
+LAYOUTS = {
+    'text': {
+        'column': 'date',
+        'ddl': [
+            """CREATE TABLE attendance (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                lesson_number INTEGER NOT NULL,
+                subject_id INTEGER,
+                status TEXT NOT NULL CHECK(status IN ('present', 'late', 'sick', 'absent')),
+                UNIQUE(student_id, date, lesson_number)
+            )""",
+        ],
+        'insert': "INSERT INTO attendance (id, student_id, date, lesson_number, subject_id, status) "
+                  "SELECT id, student_id, date, lesson_number, subject_id, status FROM source.attendance ORDER BY id",
+    },
+    'day': {
+        'column': 'day',
+        'ddl': [
+            """CREATE TABLE attendance (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                lesson_number INTEGER NOT NULL,
+                subject_id INTEGER,
+                status TEXT NOT NULL CHECK(status IN ('present', 'late', 'sick', 'absent')),
+                date TEXT GENERATED ALWAYS AS (date(day * 86400, 'unixepoch')) VIRTUAL,
+                UNIQUE(student_id, day, lesson_number)
+            )""",
+        ],
+        'insert': "INSERT INTO attendance (id, student_id, day, lesson_number, subject_id, status) "
+                  "SELECT id, student_id, CAST(julianday(date) - 2440587.5 AS INTEGER), lesson_number, "
+                  "subject_id, status FROM source.attendance ORDER BY id",
+    },
+}
+INDEXES = [
+    "CREATE INDEX idx_attendance_lesson ON attendance({column}, lesson_number, subject_id, student_id, status)",
+    "CREATE INDEX idx_attendance_student_date ON attendance(student_id, {column}, lesson_number, subject_id, status)",
+]
+
+# Запросы: имя -> (SQL, какие параметры нужны)
+QUERIES = {
+    # Все отметки за месяц (статистика без фильтров, сводные таблицы)
+    'month_by_status': ("SELECT status, COUNT(*) FROM attendance WHERE {column} BETWEEN ? AND ? GROUP BY status",
+                        'range'),
+    # Отметки студента за месяц (статистика по группе из исходной таблицы)
+    'student_month': ("SELECT lesson_number, subject_id, status FROM attendance "
+                      "WHERE student_id = ? AND {column} BETWEEN ? AND ?", 'student_range'),
+    # Ведомость занятия (get_attendance)
+    'lesson': ("SELECT student_id, status FROM attendance WHERE {column} = ? AND lesson_number = ?", 'lesson'),
+}
+RANGE_DAYS = 30
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Размер индексов и скорость выборок по датам посещаемости')
+    parser.add_argument('--source', default=os.path.join('bench', 'databases', 'university.db'),
+                        help='база с отметками (из generate_data.py)')
+    parser.add_argument('--workdir', default=os.path.join('bench', 'date_storage'),
+                        help='папка для двух тестовых баз')
+    parser.add_argument('--repeat', type=int, default=200, help='число запросов каждого вида')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='число поочередных замеров двух баз (берется лучший)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help='не удалять тестовые базы')
+    return parser.parse_args(argv)
+
+
+def build_database(path, layout, source):
+    """Копия отметок в схеме layout; возвращает время копирования и построения индексов"""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("ATTACH DATABASE ? AS source", (source,))
+    started = time.perf_counter()
+    conn.execute("BEGIN")
+    for sql in layout['ddl']:
+        conn.execute(sql)
+    conn.execute(layout['insert'])
+    for sql in INDEXES:
+        conn.execute(sql.format(column=layout['column']))
+    conn.execute("COMMIT")
+    elapsed = time.perf_counter() - started
+    conn.execute("DETACH DATABASE source")
+    conn.execute("ANALYZE")
+    conn.close()
+    return elapsed
+
+
+def object_sizes(conn):
+    """Размер таблицы и каждого индекса в байтах"""
+    return dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+
+
+def random_params(rng, kind, first_day, last_day, students, lessons):
+    """Параметры запроса в номерах дней"""
+    if kind == 'lesson':
+        return [rng.randint(first_day, last_day), rng.choice(lessons)]
+    start = rng.randint(first_day, max(first_day, last_day - RANGE_DAYS + 1))
+    params = [start, start + RANGE_DAYS - 1]
+    if kind == 'student_range':
+        params.insert(0, rng.choice(students))
+    return params
+
+
+def as_text(params, kind):
+    """Те же параметры с датами в виде 'YYYY-MM-DD'"""
+    first = 1 if kind == 'student_range' else 0
+    last = first + (1 if kind == 'lesson' else 2)
+    return [(DAY_EPOCH + datetime.timedelta(days=value)).isoformat() if first <= i < last else value
+            for i, value in enumerate(params)]
+
+
+def time_queries(conn, layout_name, plan):
+    """Медиана и p95 времени каждого запроса (мс) на одинаковых параметрах"""
+    column = LAYOUTS[layout_name]['column']
+    result = {}
+    for name, (sql, kind) in QUERIES.items():
+        sql = sql.format(column=column)
+        timings = []
+        rows = 0
+        for params in plan[name]:
+            if layout_name == 'text':
+                params = as_text(params, kind)
+            started = time.perf_counter()
+            rows += len(conn.execute(sql, params).fetchall())
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        result[name] = {
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[max(0, int(len(timings) * 0.95) - 1)],
+            'rows': rows,
+        }
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.source):
+        raise SystemExit(f'Нет базы {args.source} (см. generate_data.py)')
+    os.makedirs(args.workdir, exist_ok=True)
+
+    source = sqlite3.connect(args.source)
+    total = source.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+    first_date, last_date = source.execute("SELECT MIN(date), MAX(date) FROM attendance").fetchone()
+    students = [row[0] for row in source.execute("SELECT DISTINCT student_id FROM attendance")]
+    lessons = [row[0] for row in source.execute("SELECT DISTINCT lesson_number FROM attendance")]
+    source.close()
+    if not total:
+        raise SystemExit('В базе нет отметок')
+    first_day = (datetime.date.fromisoformat(first_date) - DAY_EPOCH).days
+    last_day = (datetime.date.fromisoformat(last_date) - DAY_EPOCH).days
+    print(f'Отметок: {total}, период {first_date} - {last_date}')
+
+    rng = random.Random(args.seed)
+    plan = {name: [random_params(rng, kind, first_day, last_day, students, lessons) for _ in range(args.repeat)]
+            for name, (_, kind) in QUERIES.items()}
+
+    sizes = {}
+    timings = {}
+    paths = {name: os.path.join(args.workdir, f'attendance_{name}.db') for name in LAYOUTS}
+    try:
+        connections = {}
+        for name, layout in LAYOUTS.items():
+            build_time = build_database(paths[name], layout, args.source)
+            print(f'{name}: копирование и индексы {build_time:.1f} с')
+            connections[name] = conn = sqlite3.connect(paths[name])
+            sizes[name] = object_sizes(conn)
+            sizes[name]['file'] = os.path.getsize(paths[name])
+            # Прогрев кэша страниц
+            time_queries(conn, name, plan)
+        # Базы замеряются по очереди несколько раз, чтобы фоновая нагрузка
+        # одинаково влияла на обе; для каждого запроса берется лучший замер
+        for _ in range(args.rounds):
+            for name, conn in connections.items():
+                for query, result in time_queries(conn, name, plan).items():
+                    best = timings.setdefault(name, {}).get(query)
+                    if best is None or result['median_ms'] < best['median_ms']:
+                        timings[name][query] = result
+        for conn in connections.values():
+            conn.close()
+    finally:
+        if not args.keep:
+            for path in paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+    mb = 1024 * 1024
+    print(f"\n{'Объект':<32}{'text, МБ':>12}{'day, МБ':>12}{'разница':>10}")
+    for key in ['attendance', 'sqlite_autoindex_attendance_1', 'idx_attendance_lesson',
+                'idx_attendance_student_date', 'file']:
+        old, new = sizes['text'].get(key, 0), sizes['day'].get(key, 0)
+        print(f'{key:<32}{old / mb:>12.1f}{new / mb:>12.1f}{(new - old) / old * 100 if old else 0:>9.1f}%')
+
+    print(f"\n{'Запрос':<20}{'text p50/p95, мс':>20}{'day p50/p95, мс':>20}{'строк':>12}")
+    for name in QUERIES:
+        old, new = timings['text'][name], timings['day'][name]
+        if old['rows'] != new['rows']:
+            print(f'{name}: разное число строк ({old["rows"]} и {new["rows"]})')
+        print(f"{name:<20}{old['median_ms']:>11.3f}/{old['p95_ms']:<8.3f}"
+              f"{new['median_ms']:>11.3f}/{new['p95_ms']:<8.3f}{new['rows']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Пул долгоживущих соединений SQLite для сервера посещаемости"""
+import queue
+import sqlite3
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений с одной базой данных.
+
+    Соединения создаются лениво (не больше max_size), PRAGMA применяются
+    один раз при создании соединения. Перед выдачей соединение проверяется
+    запросом SELECT 1, сломанные соединения выбрасываются из пула.
+    connection_factory - класс соединения (подкласс sqlite3.Connection).
+    """
+
+    def __init__(self, db_path, max_size=8, timeout=10.0, pragmas=None, connection_factory=None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(pragmas or {})
+        self.connection_factory = connection_factory or sqlite3.Connection
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+
+        # Метрики пула
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+    def _create_connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               factory=self.connection_factory)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._size -= 1
+            self.discarded += 1
+
+    def acquire(self):
+        """Получение соединения из пула (создает новое, если есть место)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                with self._lock:
+                    can_create = self._size < self.max_size
+                    if can_create:
+                        self._size += 1
+                if can_create:
+                    try:
+                        conn = self._create_connection()
+                    except Exception:
+                        with self._lock:
+                            self._size -= 1
+                        raise
+                    with self._lock:
+                        self.created += 1
+                else:
+                    # Пул исчерпан - ждем возврата соединения
+                    started = time.perf_counter()
+                    with self._lock:
+                        self.waits += 1
+                    try:
+                        conn = self._idle.get(timeout=self.timeout)
+                    except queue.Empty:
+                        with self._lock:
+                            self.timeouts += 1
+                        raise PoolTimeout(f'Нет свободных соединений с {self.db_path}')
+                    finally:
+                        with self._lock:
+                            self.wait_time += time.perf_counter() - started
+
+            if self._is_healthy(conn):
+                with self._lock:
+                    self.checkouts += 1
+                return conn
+            self._discard(conn)
+
+    def release(self, conn):
+        """Возврат соединения в пул (незавершенная транзакция откатывается)"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Закрытие всех простаивающих соединений"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        """Метрики пула"""
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                'db': self.db_path,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 6),
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'discarded': self.discarded,
+            }
@@ -0,0 +1,85 @@
+"""Профили настроек SQLite (PRAGMA) для баз сервера посещаемости"""
+import os
+import sqlite3
+
+# Параметры, которые действуют на всю базу (сохраняются в файле)
+DATABASE_PRAGMAS = ('journal_mode',)
+
+PRAGMA_PROFILES = {
+    # Максимальная надежность: fsync на каждый коммит
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+    },
+    # Режим по умолчанию: WAL + NORMAL, читатели не блокируются писателями
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+    },
+    # Массовая загрузка данных: без fsync и без автоматических checkpoint,
+    # после загрузки нужно вызвать checkpoint() вручную
+    'bulk-import': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'busy_timeout': 30000,
+        'cache_size': -256000,
+        'mmap_size': 1073741824,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 0,
+    },
+}
+
+DEFAULT_PROFILE = 'fast'
+
+
+def get_profile(name=None):
+    """Настройки профиля (имя берется из DB_PROFILE, если не указано).
+
+    Порог автоматического checkpoint можно переопределить
+    переменной окружения DB_WAL_AUTOCHECKPOINT (в страницах, 0 - выключить).
+    """
+    name = name or os.environ.get('DB_PROFILE', DEFAULT_PROFILE)
+    if name not in PRAGMA_PROFILES:
+        raise ValueError(f'Неизвестный профиль SQLite: {name}')
+    profile = dict(PRAGMA_PROFILES[name])
+    autocheckpoint = os.environ.get('DB_WAL_AUTOCHECKPOINT')
+    if autocheckpoint is not None:
+        profile['wal_autocheckpoint'] = int(autocheckpoint)
+    return profile
+
+
+def connection_pragmas(profile):
+    """PRAGMA, которые нужно выполнять на каждом новом соединении"""
+    return {name: value for name, value in profile.items() if name not in DATABASE_PRAGMAS}
+
+
+def configure_database(db_path, profile):
+    """Применение настроек уровня базы данных (режим журнала) при запуске"""
+    conn = sqlite3.connect(db_path)
+    try:
+        for name in DATABASE_PRAGMAS:
+            if name in profile:
+                conn.execute(f"PRAGMA {name}={profile[name]}")
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def checkpoint(db_path, mode='PASSIVE'):
+    """Перенос WAL в основной файл базы (PASSIVE, FULL, RESTART или TRUNCATE)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        busy, log_pages, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return {'busy': busy, 'log_pages': log_pages, 'checkpointed': checkpointed}
+    finally:
+        conn.close()
@@ -0,0 +1,90 @@
+"""Журнал медленных запросов и профилирование запросов сервера посещаемости"""
+import cProfile
+import datetime
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import uuid
+
+
+def explain_plan(conn, sql, params):
+    """EXPLAIN QUERY PLAN запроса (строки плана или текст ошибки)"""
+    try:
+        # Обычный курсор, чтобы сам EXPLAIN не попадал в замеры
+        cursor = sqlite3.Cursor(conn)
+        try:
+            return [row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        finally:
+            cursor.close()
+    except sqlite3.Error as e:
+        return [f'error: {e}']
+
+
+class SlowRequestLog:
+    """Журнал медленных запросов: одна JSON-строка на запрос"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+class RequestProfiler:
+    """Профилирование отдельных запросов через cProfile.
+
+    Запрос профилируется, если он выбран случайно с вероятностью sample_rate
+    или (при allow_header) передан заголовок X-Profile: 1. Одновременно
+    профилируется только один запрос. Результат - файл .prof (формат pstats),
+    его открывают snakeviz, а flameprof / gprof2dot строят по нему flame graph.
+    """
+
+    HEADER = 'X-Profile'
+
+    def __init__(self, directory, sample_rate=0.0, allow_header=False):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.allow_header
+
+    def start(self, request):
+        """Профилировщик для запроса или None"""
+        requested = self.allow_header and request.headers.get(self.HEADER) == '1'
+        if not (requested or random.random() < self.sample_rate):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Профилировщик уже включен другим инструментом
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile, name):
+        """Остановка профилировщика и сохранение файла; возвращает имя файла"""
+        try:
+            profile.disable()
+        finally:
+            self._busy.release()
+        os.makedirs(self.directory, exist_ok=True)
+        safe_name = re.sub(r'[^\w.-]+', '_', name or 'unmatched')
+        filename = f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{safe_name}-{uuid.uuid4().hex[:6]}.prof"
+        profile.dump_stats(os.path.join(self.directory, filename))
+        return filename
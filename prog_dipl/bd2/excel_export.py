@@ -0,0 +1,78 @@
+"""Выгрузка статистики посещаемости в Excel на сервере"""
+import xlsxwriter
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Колонки как в таблице статистики окна преподавателя
+TEXT_COLUMNS = [('surname', 'Фамилия'), ('name', 'Имя'), ('group_name', 'Группа'), ('subject_name', 'Предмет')]
+COUNT_COLUMNS = [('present', 'Присутствовал'), ('late', 'Опоздал'), ('sick', 'Болел'), ('absent', 'Отсутствовал')]
+PERCENT_HEADER = 'Посещаемость (%)'
+MAX_COLUMN_WIDTH = 60
+
+
+def write_statistics_workbook(path, rows, summary=''):
+    """Запись статистики в файл .xlsx за один проход по строкам.
+
+    rows - строки запроса статистики (можно передать курсор). Книга пишется
+    в режиме constant_memory: строки сразу сбрасываются на диск, в памяти
+    остаются только итоги и ширины колонок. Возвращает число строк.
+    """
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        sheet = workbook.add_worksheet('Статистика')
+        header_format = workbook.add_format({
+            'bold': True,
+            'border': 1,
+            'bg_color': '#D7E4BC',
+            'align': 'center',
+            'valign': 'vcenter'
+        })
+        percent_format = workbook.add_format({'num_format': '0.0%'})
+        total_format = workbook.add_format({'bold': True, 'bg_color': '#f0f0f0'})
+        total_percent_format = workbook.add_format({'bold': True, 'bg_color': '#f0f0f0', 'num_format': '0.0%'})
+
+        headers = [header for _, header in TEXT_COLUMNS + COUNT_COLUMNS] + [PERCENT_HEADER]
+        widths = [len(header) for header in headers]
+        for col, header in enumerate(headers):
+            sheet.write_string(0, col, header, header_format)
+
+        # Ширины колонок и итоги считаются по ходу записи
+        totals = [0] * len(COUNT_COLUMNS)
+        total_lessons = 0
+        count = 0
+        for count, row in enumerate(rows, start=1):
+            for col, (key, _) in enumerate(TEXT_COLUMNS):
+                value = row[key] or ''
+                sheet.write_string(count, col, value)
+                widths[col] = max(widths[col], len(value))
+            values = [row[key] or 0 for key, _ in COUNT_COLUMNS]
+            for offset, value in enumerate(values):
+                sheet.write_number(count, len(TEXT_COLUMNS) + offset, value)
+                totals[offset] += value
+            total = row['total'] or 0
+            total_lessons += total
+            sheet.write_number(count, len(headers) - 1, (values[0] + values[1]) / total if total else 0,
+                               percent_format)
+
+        # Итоговая строка
+        total_row = count + 1
+        sheet.write_string(total_row, 0, 'ИТОГО', total_format)
+        for col in range(1, len(TEXT_COLUMNS)):
+            sheet.write_blank(total_row, col, None, total_format)
+        for offset, value in enumerate(totals):
+            sheet.write_number(total_row, len(TEXT_COLUMNS) + offset, value, total_format)
+        total_records = sum(totals)
+        total_percent = (totals[0] + totals[1]) / total_records if total_records else 0
+        sheet.write_number(total_row, len(headers) - 1, total_percent, total_percent_format)
+
+        # Информация о периоде и фильтрах
+        if summary:
+            sheet.write_string(total_row + 1, 0, summary)
+        sheet.write_string(total_row + 2, 0,
+                           f"Всего пар: {total_lessons} | Посещаемость: {round(total_percent * 100, 1)}%")
+
+        for col, width in enumerate(widths):
+            sheet.set_column(col, col, min(width + 2, MAX_COLUMN_WIDTH))
+    finally:
+        workbook.close()
+    return count
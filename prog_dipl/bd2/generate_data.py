@@ -0,0 +1,179 @@
+"""Генератор тестовой базы университета произвольного размера.
+
+Схема таблиц берется из preloaded_university.db, пользователи - из
+preloaded_user.db. Результат: <output>/databases/university.db и user.db,
+параметры набора данных сохраняются в <output>/dataset.json (их читает
+benchmark.py). Миграции и сводные таблицы сервер строит при первом запуске.
+
+Пример (около 1,5 млн отметок):
+    python generate_data.py --output bench --groups 200 --students-per-group 25 --days 120
+    cd bench && python ../run_server.py
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import sqlite3
+import time
+
+from db_settings import get_profile, connection_pragmas, configure_database, checkpoint
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_UNIVERSITY_DB = os.path.join(BASE_DIR, 'preloaded_university.db')
+TEMPLATE_USER_DB = os.path.join(BASE_DIR, 'preloaded_user.db')
+
+SURNAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+            'Соколов', 'Михайлов', 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев',
+            'Лебедев', 'Семенов', 'Егоров', 'Павлов', 'Козлов', 'Степанов']
+NAMES = ['Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артем',
+         'Илья', 'Кирилл', 'Михаил', 'Никита', 'Матвей', 'Роман', 'Егор', 'Арсений']
+MIDDLE_NAMES = ['Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Алексеевич',
+                'Иванович', 'Петрович', 'Михайлович', 'Николаевич', 'Викторович']
+# Доли статусов посещаемости
+STATUS_WEIGHTS = {'present': 0.80, 'late': 0.07, 'sick': 0.06, 'absent': 0.07}
+# Размер пачки вставки отметок
+INSERT_CHUNK = 50000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Генерация тестовой базы посещаемости')
+    parser.add_argument('--output', default='bench', help='папка для databases/ и dataset.json')
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--students-per-group', type=int, default=25)
+    parser.add_argument('--subjects', type=int, default=30)
+    parser.add_argument('--days', type=int, default=90, help='число календарных дней с отметками')
+    parser.add_argument('--end-date', default=datetime.date.today().isoformat(),
+                        help='последний день с отметками (YYYY-MM-DD)')
+    parser.add_argument('--lessons-per-day', type=int, default=3, choices=range(1, 5))
+    parser.add_argument('--fill', type=float, default=1.0,
+                        help='доля занятий, по которым проставлена посещаемость (0..1)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--force', action='store_true', help='перезаписать существующие базы')
+    return parser.parse_args(argv)
+
+
+def create_schema(conn, template_path):
+    """Таблицы и индексы как в шаблонной базе"""
+    template = sqlite3.connect(template_path)
+    try:
+        ddl = [row[0] for row in template.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY type = 'index'"
+        )]
+    finally:
+        template.close()
+    for sql in ddl:
+        conn.execute(sql)
+
+
+def school_days(end_date, days):
+    """Дни с занятиями (без воскресений) за последние days дней"""
+    end = datetime.date.fromisoformat(end_date)
+    start = end - datetime.timedelta(days=days - 1)
+    return [
+        (start + datetime.timedelta(days=offset)).isoformat()
+        for offset in range(days)
+        if (start + datetime.timedelta(days=offset)).weekday() != 6
+    ]
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    db_folder = os.path.join(args.output, 'databases')
+    university_path = os.path.join(db_folder, 'university.db')
+    user_path = os.path.join(db_folder, 'user.db')
+    if os.path.exists(university_path) and not args.force:
+        raise SystemExit(f'{university_path} уже существует (используйте --force)')
+    os.makedirs(db_folder, exist_ok=True)
+    for path in (university_path, user_path):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    shutil.copyfile(TEMPLATE_USER_DB, user_path)
+
+    profile = get_profile('bulk-import')
+    configure_database(university_path, profile)
+    conn = sqlite3.connect(university_path)
+    for name, value in connection_pragmas(profile).items():
+        conn.execute(f"PRAGMA {name}={value}")
+    started = time.perf_counter()
+
+    with conn:
+        create_schema(conn, TEMPLATE_UNIVERSITY_DB)
+        conn.executemany(
+            "INSERT INTO subjects (id, name, description) VALUES (?, ?, ?)",
+            [(i, f'Предмет {i}', f'Описание предмета {i}') for i in range(1, args.subjects + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO groups (id, name, course) VALUES (?, ?, ?)",
+            [(i, f'ГР-{i:04d}', 1 + i % 4) for i in range(1, args.groups + 1)]
+        )
+        students = []
+        groups = {}
+        for group_id in range(1, args.groups + 1):
+            size = max(1, round(args.students_per_group * rng.uniform(0.8, 1.2)))
+            for _ in range(size):
+                student_id = len(students) + 1
+                students.append((
+                    student_id, rng.choice(SURNAMES), rng.choice(NAMES), rng.choice(MIDDLE_NAMES),
+                    group_id, int(rng.random() < 0.15)
+                ))
+                groups.setdefault(group_id, []).append(student_id)
+        conn.executemany(
+            "INSERT INTO students (id, surname, name, middle_name, group_id, is_nonresident) "
+            "VALUES (?, ?, ?, ?, ?, ?)", students
+        )
+
+    days = school_days(args.end_date, args.days)
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+
+    def attendance_rows():
+        for day in days:
+            weekday = datetime.date.fromisoformat(day).weekday()
+            for group_id, student_ids in groups.items():
+                for lesson in range(1, args.lessons_per_day + 1):
+                    if rng.random() >= args.fill:
+                        continue
+                    # Расписание: предмет зависит от группы, дня недели и номера пары
+                    subject_id = 1 + (group_id * 7 + weekday * args.lessons_per_day + lesson) % args.subjects
+                    for student_id, status in zip(student_ids, rng.choices(statuses, weights, k=len(student_ids))):
+                        yield (student_id, day, lesson, subject_id, status)
+
+    rows = attendance_rows()
+    total = 0
+    while True:
+        chunk = [row for _, row in zip(range(INSERT_CHUNK), rows)]
+        if not chunk:
+            break
+        with conn:
+            conn.executemany(
+                "INSERT INTO attendance (student_id, date, lesson_number, subject_id, status) "
+                "VALUES (?, ?, ?, ?, ?)", chunk
+            )
+        total += len(chunk)
+    conn.execute("ANALYZE")
+    conn.close()
+    checkpoint(university_path, 'TRUNCATE')
+
+    dataset = {
+        'groups': args.groups,
+        'students': len(students),
+        'subjects': args.subjects,
+        'attendance': total,
+        'start_date': days[0] if days else args.end_date,
+        'end_date': args.end_date,
+        'lessons_per_day': args.lessons_per_day,
+        'seed': args.seed,
+    }
+    with open(os.path.join(args.output, 'dataset.json'), 'w', encoding='utf-8') as f:
+        json.dump(dataset, f, ensure_ascii=False, indent=2)
+    print(f"Групп: {args.groups}, студентов: {len(students)}, отметок: {total} "
+          f"за {time.perf_counter() - started:.1f} с -> {university_path}")
+    return dataset
+
+
+if __name__ == '__main__':
+    generate(parse_args())
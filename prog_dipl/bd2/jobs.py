@@ -0,0 +1,447 @@
+"""Фоновые задания построения отчетов и расписания их запуска"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+# Относительные периоды отчетов по расписанию
+REPORT_PERIODS = ('previous_day', 'previous_week', 'previous_month')
+
+JOB_MIGRATION_STEPS = [
+    """
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            result_path TEXT,
+            error TEXT,
+            schedule_id INTEGER,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs(status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_report_jobs_params ON report_jobs(kind, params)",
+    """
+        CREATE TABLE IF NOT EXISTS report_schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            cron TEXT NOT NULL,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            next_run TEXT,
+            last_run TEXT
+        )
+    """,
+]
+
+
+def timestamp(moment=None):
+    return (moment or datetime.datetime.now()).isoformat(timespec='seconds')
+
+
+class CronSchedule:
+    """Расписание в формате cron: 'минута час день месяц день_недели'.
+
+    Поддерживаются *, списки (1,15), диапазоны (1-5) и шаг (*/10, 8-18/2).
+    День недели 0-7, 0 и 7 - воскресенье. Если заданы и день месяца, и день
+    недели, достаточно совпадения любого из них (как в cron).
+    """
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f'Расписание должно состоять из 5 полей: {expression}')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            sorted(self._parse(part, low, high)) for part, (low, high) in zip(parts, self.FIELDS)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(part, low, high):
+        values = set()
+        for item in part.split(','):
+            try:
+                step = 1
+                if '/' in item:
+                    item, step = item.split('/', 1)
+                    step = int(step)
+                if item == '*':
+                    start, end = low, high
+                elif '-' in item:
+                    start, end = map(int, item.split('-', 1))
+                else:
+                    start = int(item)
+                    end = high if step > 1 else start
+            except ValueError:
+                raise ValueError(f'Недопустимое поле расписания: {part}') from None
+            if step < 1 or not low <= start <= end <= high:
+                raise ValueError(f'Недопустимое поле расписания: {part}')
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day):
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return in_week
+        if self.any_weekday:
+            return in_month
+        return in_month or in_week
+
+    def next_after(self, moment):
+        """Ближайшее время запуска строго после moment"""
+        start = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        day = start.date()
+        # 29 февраля в нужный день недели бывает раз в несколько лет
+        for _ in range(366 * 8):
+            if day.month in self.months and self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime.datetime.combine(day, datetime.time(hour, minute))
+                        if candidate >= start:
+                            return candidate
+            day += datetime.timedelta(days=1)
+        raise ValueError(f'Расписание никогда не срабатывает: {self.expression}')
+
+
+def resolve_period(params, today):
+    """Параметры отчета с датами: period заменяется периодом относительно today"""
+    params = dict(params)
+    period = params.pop('period', None)
+    if period is None:
+        return params
+    if period == 'previous_day':
+        start = end = today - datetime.timedelta(days=1)
+    elif period == 'previous_week':
+        start = today - datetime.timedelta(days=today.weekday() + 7)
+        end = start + datetime.timedelta(days=6)
+    elif period == 'previous_month':
+        end = today.replace(day=1) - datetime.timedelta(days=1)
+        start = end.replace(day=1)
+    else:
+        raise ValueError(f"Неизвестный период: {period} (допустимо: {', '.join(REPORT_PERIODS)})")
+    params['start_date'] = start.isoformat()
+    params['end_date'] = end.isoformat()
+    return params
+
+
+class JobQueue:
+    """Очередь заданий в таблице report_jobs.
+
+    handlers: вид задания -> (расширение файла, функция(params, path, progress)).
+    Рабочие потоки захватывают задания одним UPDATE, поэтому очередь могут
+    обслуживать несколько процессов сервера. Поток расписания ставит в очередь
+    задания report_schedules, время которых наступило, и удаляет старые
+    результаты. Одинаковое задание, которое ждет, выполняется или выполнено
+    не раньше reuse_seconds назад, повторно не ставится.
+    """
+
+    def __init__(self, pool, handlers, result_dir, workers=2, poll_interval=5.0,
+                 reuse_seconds=3600, result_ttl=7 * 86400, stale_seconds=3600):
+        self.pool = pool
+        self.handlers = handlers
+        self.result_dir = os.path.abspath(result_dir)
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.reuse_seconds = reuse_seconds
+        self.result_ttl = result_ttl
+        self.stale_seconds = stale_seconds
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+    def _execute(self, func):
+        """func(conn) в транзакции на соединении из пула"""
+        conn = self.pool.acquire()
+        try:
+            with conn:
+                return func(conn)
+        finally:
+            self.pool.release(conn)
+
+    @staticmethod
+    def _row_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        return job
+
+    # --- Задания ---
+
+    def _submit(self, conn, kind, params, schedule_id=None, force=False):
+        if kind not in self.handlers:
+            raise ValueError(f"Неизвестный вид задания: {kind} (допустимо: {', '.join(self.handlers)})")
+        params_json = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        if not force:
+            reuse_after = timestamp(datetime.datetime.now() - datetime.timedelta(seconds=self.reuse_seconds))
+            existing = conn.execute("""
+                SELECT * FROM report_jobs
+                WHERE kind = ? AND params = ?
+                  AND (status IN ('queued', 'running') OR (status = 'done' AND finished_at >= ?))
+                ORDER BY id DESC LIMIT 1
+            """, (kind, params_json, reuse_after)).fetchone()
+            if existing:
+                return self._row_dict(existing), False
+        job_id = conn.execute(
+            "INSERT INTO report_jobs (kind, params, schedule_id, created_at) VALUES (?, ?, ?, ?)",
+            (kind, params_json, schedule_id, timestamp())
+        ).lastrowid
+        return self._row_dict(conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()), True
+
+    def submit(self, kind, params, force=False):
+        """Постановка задания в очередь: (задание, создано ли новое)"""
+        job, created = self._execute(lambda conn: self._submit(conn, kind, params, force=force))
+        if created:
+            with self._wakeup:
+                self._wakeup.notify()
+        return job, created
+
+    def get(self, job_id):
+        return self._execute(lambda conn: self._row_dict(
+            conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()))
+
+    def list(self, status=None, limit=50):
+        def query(conn):
+            if status:
+                rows = conn.execute("SELECT * FROM report_jobs WHERE status = ? ORDER BY id DESC LIMIT ?",
+                                    (status, limit))
+            else:
+                rows = conn.execute("SELECT * FROM report_jobs ORDER BY id DESC LIMIT ?", (limit,))
+            return [self._row_dict(row) for row in rows]
+        return self._execute(query)
+
+    def remove(self, job_id):
+        """Отмена ожидающего задания или удаление завершенного вместе с файлом.
+
+        Возвращает задание до изменения (None, если его нет); выполняющееся
+        задание не трогается.
+        """
+        def remove_job(conn):
+            job = self._row_dict(conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone())
+            if job is None or job['status'] == 'running':
+                return job
+            if job['status'] == 'queued':
+                conn.execute("UPDATE report_jobs SET status = 'cancelled', finished_at = ? "
+                             "WHERE id = ? AND status = 'queued'", (timestamp(), job_id))
+            else:
+                conn.execute("DELETE FROM report_jobs WHERE id = ?", (job_id,))
+            return job
+        job = self._execute(remove_job)
+        if job and job['status'] not in ('queued', 'running'):
+            self._remove_file(job['result_path'])
+        return job
+
+    @staticmethod
+    def _remove_file(path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _claim(self):
+        return self._execute(lambda conn: self._row_dict(conn.execute("""
+            UPDATE report_jobs SET status = 'running', started_at = ?
+            WHERE id = (SELECT id FROM report_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+              AND status = 'queued'
+            RETURNING *
+        """, (timestamp(),)).fetchone()))
+
+    def _run(self, job):
+        extension, handler = self.handlers[job['kind']]
+        os.makedirs(self.result_dir, exist_ok=True)
+        path = os.path.join(self.result_dir, f"{job['id']}.{extension}")
+        last_update = [0.0]
+
+        def progress(done, total=None):
+            # Прогресс записывается в базу не чаще раза в секунду
+            if time.monotonic() - last_update[0] >= 1:
+                last_update[0] = time.monotonic()
+                self._execute(lambda conn: conn.execute(
+                    "UPDATE report_jobs SET progress = ?, total = ? WHERE id = ?", (done, total, job['id'])))
+
+        try:
+            handler(job['params'], path, progress)
+        except Exception as e:
+            self._remove_file(path)
+            self._mark_failed(job['id'], e)
+            return
+        self._execute(lambda conn: conn.execute(
+            "UPDATE report_jobs SET status = 'done', result_path = ?, finished_at = ?, "
+            "progress = COALESCE(total, progress) WHERE id = ?", (path, timestamp(), job['id'])))
+
+    def _mark_failed(self, job_id, error):
+        self._execute(lambda conn: conn.execute(
+            "UPDATE report_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+            (str(error), timestamp(), job_id)))
+
+    # --- Расписания ---
+
+    def _validate_schedule(self, kind, params, cron):
+        if kind not in self.handlers:
+            raise ValueError(f"Неизвестный вид задания: {kind} (допустимо: {', '.join(self.handlers)})")
+        resolve_period(params, datetime.date.today())
+        return CronSchedule(cron)
+
+    def add_schedule(self, name, kind, params, cron, enabled=True):
+        schedule = self._validate_schedule(kind, params, cron)
+        next_run = timestamp(schedule.next_after(datetime.datetime.now()))
+
+        def insert(conn):
+            schedule_id = conn.execute(
+                "INSERT INTO report_schedules (name, kind, params, cron, enabled, next_run) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, kind, json.dumps(params, sort_keys=True, ensure_ascii=False), cron, int(enabled), next_run)
+            ).lastrowid
+            return self._row_dict(conn.execute("SELECT * FROM report_schedules WHERE id = ?", (schedule_id,)).fetchone())
+        return self._execute(insert)
+
+    def list_schedules(self):
+        return self._execute(lambda conn: [
+            self._row_dict(row) for row in conn.execute("SELECT * FROM report_schedules ORDER BY id")])
+
+    def update_schedule(self, schedule_id, **fields):
+        """Изменение расписания (name, kind, params, cron, enabled); None, если его нет"""
+        def update(conn):
+            current = self._row_dict(
+                conn.execute("SELECT * FROM report_schedules WHERE id = ?", (schedule_id,)).fetchone())
+            if current is None:
+                return None
+            current.update({key: value for key, value in fields.items() if value is not None})
+            schedule = self._validate_schedule(current['kind'], current['params'], current['cron'])
+            conn.execute(
+                "UPDATE report_schedules SET name = ?, kind = ?, params = ?, cron = ?, enabled = ?, next_run = ? "
+                "WHERE id = ?",
+                (current['name'], current['kind'], json.dumps(current['params'], sort_keys=True, ensure_ascii=False),
+                 current['cron'], int(current['enabled']), timestamp(schedule.next_after(datetime.datetime.now())),
+                 schedule_id)
+            )
+            return self._row_dict(conn.execute("SELECT * FROM report_schedules WHERE id = ?", (schedule_id,)).fetchone())
+        return self._execute(update)
+
+    def delete_schedule(self, schedule_id):
+        return self._execute(lambda conn: conn.execute(
+            "DELETE FROM report_schedules WHERE id = ?", (schedule_id,)).rowcount > 0)
+
+    def run_due_schedules(self, now=None):
+        """Постановка в очередь заданий расписаний, время которых наступило"""
+        now = now or datetime.datetime.now()
+        due = self._execute(lambda conn: conn.execute(
+            "SELECT * FROM report_schedules WHERE enabled = 1 AND next_run <= ?", (timestamp(now),)).fetchall())
+        submitted = []
+        for row in due:
+            schedule = self._row_dict(row)
+
+            def fire(conn):
+                next_run = timestamp(CronSchedule(schedule['cron']).next_after(now))
+                # Расписание запускает только тот процесс, который первым сдвинул next_run
+                claimed = conn.execute(
+                    "UPDATE report_schedules SET next_run = ?, last_run = ? WHERE id = ? AND next_run = ?",
+                    (next_run, timestamp(now), schedule['id'], schedule['next_run'])
+                ).rowcount
+                if claimed:
+                    params = resolve_period(schedule['params'], now.date())
+                    return self._submit(conn, schedule['kind'], params, schedule_id=schedule['id'])[0]
+
+            try:
+                job = self._execute(fire)
+            except Exception as e:
+                logger.exception('Ошибка запуска расписания %s', schedule['id'])
+                continue
+            if job:
+                submitted.append(job)
+        if submitted:
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return submitted
+
+    def cleanup(self):
+        """Удаление заданий и файлов старше result_ttl"""
+        cutoff = timestamp(datetime.datetime.now() - datetime.timedelta(seconds=self.result_ttl))
+
+        def delete_old(conn):
+            rows = conn.execute(
+                "DELETE FROM report_jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ? "
+                "RETURNING result_path", (cutoff,)).fetchall()
+            return [row[0] for row in rows]
+        for path in self._execute(delete_old):
+            self._remove_file(path)
+
+    # --- Рабочие потоки ---
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except Exception:
+                logger.exception('Ошибка выбора задания из очереди')
+                job = None
+            if job:
+                try:
+                    self._run(job)
+                except Exception as e:
+                    # Ошибка записи статуса (база заблокирована, нет соединения в пуле)
+                    # не должна останавливать рабочий поток
+                    logger.exception('Ошибка выполнения задания %s', job['id'])
+                    try:
+                        self._mark_failed(job['id'], e)
+                    except Exception:
+                        logger.exception('Не удалось отметить задание %s как failed', job['id'])
+                continue
+            with self._wakeup:
+                self._wakeup.wait(self.poll_interval)
+
+    def _scheduler_loop(self):
+        last_cleanup = 0.0
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.run_due_schedules()
+                if time.monotonic() - last_cleanup >= 3600:
+                    last_cleanup = time.monotonic()
+                    self.cleanup()
+            except Exception:
+                logger.exception('Ошибка обработки расписаний')
+
+    def start(self):
+        """Запуск рабочих потоков в текущем процессе (повторный вызов ничего не делает)"""
+        if self._pid == os.getpid() or not self.workers:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Задания, оставшиеся 'running' после аварийной остановки, выполняются заново
+            stale = timestamp(datetime.datetime.now() - datetime.timedelta(seconds=self.stale_seconds))
+            self._execute(lambda conn: conn.execute(
+                "UPDATE report_jobs SET status = 'queued', started_at = NULL "
+                "WHERE status = 'running' AND started_at < ?", (stale,)))
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self._worker_loop, name=f'report-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._scheduler_loop, name='report-scheduler', daemon=True))
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def stop(self, timeout=5):
+        """Остановка потоков (текущие задания дорабатывают до timeout)"""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._pid = None
@@ -0,0 +1,377 @@
+"""Метрики сервера посещаемости в текстовом формате Prometheus"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (секунды)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_collected(collected):
+    """Строки для значений коллекторов [(имя, тип, описание, [(словарь меток, значение)])]"""
+    lines = []
+    for name, metric_type, help_text, samples in collected:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+    return lines
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':  # os.kill на Windows завершает процесс
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(values, labels, value):
+        """Добавление значения другого процесса к values"""
+        values[labels] = values.get(labels, 0) + value
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted((self.samples() if values is None else values).items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # labels -> [счетчики по корзинам, сумма, количество]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            return {labels: [list(counts), total, count] for labels, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def merge(values, labels, value):
+        """Добавление корзин, суммы и количества другого процесса к values"""
+        entry = values.get(labels)
+        if entry is None:
+            values[labels] = [list(value[0]), value[1], value[2]]
+        else:
+            entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+            entry[1] += value[1]
+            entry[2] += value[2]
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted((self.samples() if values is None else values).items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket'
+                             f'{_format_labels(self.labelnames, labels, [("le", _format_value(bound))])} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {total!r}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик; collectors - функции, возвращающие значения в момент запроса.
+
+    Коллектор возвращает список (имя, тип, описание, [(словарь меток, значение)]).
+
+    С multiprocess_dir (несколько процессов gunicorn) каждый процесс раз
+    в flush_interval секунд записывает свои значения в файл metrics_<pid>.json
+    этого каталога, а render() объединяет файлы всех процессов: счетчики
+    и гистограммы складываются, значения gauge коллекторов выводятся
+    с меткой pid (только для работающих процессов). Файлы завершившихся
+    процессов остаются, чтобы счетчики не уменьшались при их перезапуске.
+    """
+
+    SNAPSHOT_PREFIX = 'metrics_'
+
+    def __init__(self, multiprocess_dir=None, flush_interval=5.0):
+        self.metrics = []
+        self.collectors = []
+        self.multiprocess_dir = multiprocess_dir
+        self.flush_interval = flush_interval
+        self._flush_lock = threading.Lock()
+        self._flush_pid = None
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=REQUEST_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def _collect(self):
+        return [item for collector in self.collectors for item in collector()]
+
+    def render(self):
+        if self.multiprocess_dir:
+            return self._render_multiprocess()
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        lines += _render_collected(self._collect())
+        return '\n'.join(lines) + '\n'
+
+    # --- Объединение метрик нескольких процессов ---
+
+    def snapshot(self):
+        """Значения метрик и коллекторов текущего процесса (в виде для JSON)"""
+        return {
+            'metrics': {metric.name: [[list(labels), value] for labels, value in metric.samples().items()]
+                        for metric in self.metrics},
+            'collected': self._collect(),
+        }
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.multiprocess_dir, f'{self.SNAPSHOT_PREFIX}{pid}.json')
+
+    def write_snapshot(self):
+        """Запись значений текущего процесса в каталог метрик"""
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f'{path}.tmp', path)
+
+    def read_snapshots(self):
+        """{pid: значения} всех процессов; значения текущего берутся из памяти"""
+        snapshots = {}
+        names = os.listdir(self.multiprocess_dir) if os.path.isdir(self.multiprocess_dir) else []
+        for name in names:
+            if not (name.startswith(self.SNAPSHOT_PREFIX) and name.endswith('.json')):
+                continue
+            try:
+                pid = int(name[len(self.SNAPSHOT_PREFIX):-len('.json')])
+                if pid == os.getpid():
+                    continue
+                with open(os.path.join(self.multiprocess_dir, name), encoding='utf-8') as f:
+                    snapshots[pid] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        snapshots[os.getpid()] = self.snapshot()
+        return snapshots
+
+    def clear_snapshots(self):
+        """Удаление файлов прошлого запуска (в главном процессе до запуска рабочих)"""
+        if not self.multiprocess_dir or not os.path.isdir(self.multiprocess_dir):
+            return
+        for name in os.listdir(self.multiprocess_dir):
+            if name.startswith(self.SNAPSHOT_PREFIX):
+                os.remove(os.path.join(self.multiprocess_dir, name))
+
+    def _render_multiprocess(self):
+        snapshots = self.read_snapshots()
+        lines = []
+        for metric in self.metrics:
+            values = {}
+            for snapshot in snapshots.values():
+                for labels, value in snapshot['metrics'].get(metric.name, []):
+                    metric.merge(values, tuple(labels), value)
+            lines += metric.render(values)
+
+        # имя -> (тип, описание, {метки: значение})
+        collected = {}
+        for pid, snapshot in sorted(snapshots.items()):
+            alive = pid == os.getpid() or _pid_alive(pid)
+            for name, metric_type, help_text, samples in snapshot['collected']:
+                values = collected.setdefault(name, (metric_type, help_text, {}))[2]
+                for labels, value in samples:
+                    if metric_type == 'counter':
+                        key = tuple(labels.items())
+                        values[key] = values.get(key, 0) + value
+                    elif alive:
+                        values[tuple(labels.items()) + (('pid', pid),)] = value
+        lines += _render_collected([
+            (name, metric_type, help_text, [(dict(key), value) for key, value in sorted(values.items())])
+            for name, (metric_type, help_text, values) in collected.items()
+        ])
+        return '\n'.join(lines) + '\n'
+
+    def start_flush(self):
+        """Запуск периодической записи значений (один поток в каждом процессе)"""
+        if not self.multiprocess_dir or self._flush_pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._flush_pid == os.getpid():
+                return
+            self._flush_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except Exception:
+                logger.exception('Ошибка записи метрик в %s', self.multiprocess_dir)
+
+
+# --- Замер времени запросов SQLite ---
+
+_VERB_RE = re.compile(r'\s*([A-Za-z]+)')
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+
+
+def statement_name(sql):
+    """Короткое имя запроса: команда и первая упомянутая таблица ('SELECT students')"""
+    verb = _VERB_RE.match(sql)
+    if not verb:
+        return 'OTHER'
+    table = _TABLE_RE.search(sql)
+    return f'{verb.group(1).upper()} {table.group(1)}' if table else verb.group(1).upper()
+
+
+def traced_connection_factory(on_statement):
+    """Класс соединения, сообщающий о каждом выполненном запросе.
+
+    on_statement(sql, params, seconds, connection) вызывается, когда результат
+    запроса прочитан полностью (или курсор закрыт / использован для нового
+    запроса); время включает выполнение и чтение строк.
+    """
+
+    class TracedCursor(sqlite3.Cursor):
+        _trace = None
+
+        def _start(self, sql, params):
+            self._finish()
+            self._trace = [sql, params, 0.0]
+
+        def _add(self, started, exhausted=False):
+            if self._trace is not None:
+                self._trace[2] += time.perf_counter() - started
+                if exhausted:
+                    self._finish()
+
+        def _finish(self):
+            trace, self._trace = self._trace, None
+            if trace is not None:
+                on_statement(*trace, self.connection)
+
+        def execute(self, sql, parameters=()):
+            self._start(sql, parameters)
+            started = time.perf_counter()
+            try:
+                return super().execute(sql, parameters)
+            finally:
+                self._add(started, exhausted=self.description is None)
+
+        def executemany(self, sql, seq_of_parameters):
+            self._start(sql, None)
+            started = time.perf_counter()
+            try:
+                return super().executemany(sql, seq_of_parameters)
+            finally:
+                self._add(started, exhausted=True)
+
+        def fetchone(self):
+            started = time.perf_counter()
+            row = super().fetchone()
+            self._add(started, exhausted=row is None)
+            return row
+
+        def fetchmany(self, size=None):
+            started = time.perf_counter()
+            rows = super().fetchmany(self.arraysize if size is None else size)
+            self._add(started, exhausted=len(rows) < (self.arraysize if size is None else size))
+            return rows
+
+        def fetchall(self):
+            started = time.perf_counter()
+            rows = super().fetchall()
+            self._add(started, exhausted=True)
+            return rows
+
+        def __next__(self):
+            started = time.perf_counter()
+            try:
+                row = super().__next__()
+            except StopIteration:
+                self._add(started, exhausted=True)
+                raise
+            self._add(started)
+            return row
+
+        def close(self):
+            self._finish()
+            super().close()
+
+        def __del__(self):
+            self._finish()
+
+    class TracedConnection(sqlite3.Connection):
+        def cursor(self, factory=TracedCursor):
+            return super().cursor(factory)
+
+        def execute(self, sql, parameters=()):
+            return self.cursor().execute(sql, parameters)
+
+        def executemany(self, sql, seq_of_parameters):
+            return self.cursor().executemany(sql, seq_of_parameters)
+
+    return TracedConnection
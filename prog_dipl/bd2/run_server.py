@@ -0,0 +1,143 @@
+"""Запуск сервера посещаемости в рабочем режиме (без отладчика Werkzeug).
+
+gunicorn (Linux): несколько процессов с пулом потоков в каждом, плавный
+перезапуск процессов по SIGHUP, перезапуск зависших запросов по таймауту.
+waitress (Windows или если gunicorn не установлен): один процесс с пулом потоков.
+
+Параметры задаются в командной строке или переменными окружения:
+    python run_server.py --workers 4 --threads 8 --port 5000
+    SERVER_WORKERS=4 SERVER_THREADS=8 DB_PROFILE=fast python run_server.py
+
+Сервер запускается из папки bd2 (базы ищутся в ./databases). При нескольких
+процессах метрики /metrics суммируются через каталог METRICS_DIR (./metrics).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Сервер учета посещаемости')
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'waitress'),
+                        default=os.environ.get('SERVER_BACKEND', 'auto'),
+                        help='WSGI-сервер (auto: gunicorn, если доступен, иначе waitress)')
+    parser.add_argument('--host', default=os.environ.get('SERVER_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=env_int('SERVER_PORT', 5000))
+    parser.add_argument('--workers', type=int, default=env_int('SERVER_WORKERS', multiprocessing.cpu_count()),
+                        help='число процессов (только gunicorn)')
+    parser.add_argument('--threads', type=int, default=env_int('SERVER_THREADS', 8),
+                        help='число потоков в каждом процессе')
+    parser.add_argument('--timeout', type=int, default=env_int('SERVER_TIMEOUT', 30),
+                        help='таймаут запроса в секундах')
+    parser.add_argument('--graceful-timeout', type=int, default=env_int('SERVER_GRACEFUL_TIMEOUT', 30),
+                        help='время на завершение текущих запросов при перезапуске')
+    parser.add_argument('--keepalive', type=int, default=env_int('SERVER_KEEPALIVE', 5),
+                        help='время ожидания следующего запроса по keep-alive соединению')
+    parser.add_argument('--max-requests', type=int, default=env_int('SERVER_MAX_REQUESTS', 0),
+                        help='перезапуск процесса после N запросов (0 - не перезапускать)')
+    parser.add_argument('--db-profile', default=None,
+                        help='профиль настроек SQLite: durable, fast или bulk-import')
+    return parser.parse_args(argv)
+
+
+def prepare_environment(args, server):
+    """Настройки, которые servbd читает при импорте"""
+    if args.db_profile:
+        os.environ['DB_PROFILE'] = args.db_profile
+    os.environ['SERVER_PROCESSES'] = str(args.workers if server == 'gunicorn' else 1)
+    # Каждому потоку - свое соединение из пула процесса
+    os.environ.setdefault('DB_POOL_SIZE', str(args.threads))
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class AttendanceServer(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for name, value in self.options.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            from servbd import app
+            return app
+
+    def post_fork(server, worker):
+        # Соединения SQLite нельзя использовать в нескольких процессах:
+        # рабочий процесс открывает собственные
+        import servbd
+        from stats_cache import SharedStatisticsCache
+        for pool in servbd.db_pools.values():
+            pool.close_all()
+        if isinstance(servbd.stats_cache, SharedStatisticsCache):
+            servbd.stats_cache.reset()
+        # Главный поток рабочего процесса (в главном процессе до fork Qt не запускается)
+        servbd.init_pdf_reports()
+
+    def on_starting(server):
+        # Метрики прошлого запуска не попадают в суммы /metrics
+        import servbd
+        if servbd.metrics.multiprocess_dir:
+            servbd.metrics.clear_snapshots()
+
+    def worker_exit(server, worker):
+        # Последние значения завершающегося процесса остаются в сумме /metrics
+        import servbd
+        if servbd.metrics.multiprocess_dir:
+            servbd.metrics.write_snapshot()
+
+    AttendanceServer({
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': args.keepalive,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        # Приложение (и миграции) загружается один раз в главном процессе
+        'preload_app': True,
+        'post_fork': post_fork,
+        'on_starting': on_starting,
+        'worker_exit': worker_exit,
+    }).run()
+
+
+def run_waitress(args):
+    from waitress import serve
+    from servbd import app, init_pdf_reports
+
+    if args.workers > 1:
+        print('waitress работает в одном процессе, --workers игнорируется', file=sys.stderr)
+    init_pdf_reports()
+    serve(app, host=args.host, port=args.port, threads=args.threads,
+          channel_timeout=args.timeout, ident='attendance')
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = args.server
+    if server == 'auto':
+        try:
+            import gunicorn  # noqa: F401
+            server = 'gunicorn'
+        except ImportError:
+            server = 'waitress'
+    prepare_environment(args, server)
+    if server == 'gunicorn':
+        run_gunicorn(args)
+    else:
+        run_waitress(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,35 @@
-from flask import Flask, request, jsonify
+from flask import (Flask, request, jsonify, g, make_response, has_request_context, stream_with_context,
+                   send_file, url_for)
+from flask.json.provider import DefaultJSONProvider
 import sqlite3
 import os
+import re
+import sys
+import atexit
+import time
+import datetime
+import functools
+import tempfile
+import gzip
+import zlib
+from db_pool import ConnectionPool
+from db_settings import get_profile, connection_pragmas, configure_database, checkpoint
+from metrics import MetricsRegistry, SQL_BUCKETS, statement_name, traced_connection_factory
+from diagnostics import SlowRequestLog, RequestProfiler, explain_plan
+from excel_export import XLSX_MIMETYPE, write_statistics_workbook
+from jobs import JobQueue, JOB_MIGRATION_STEPS, JOB_STATUSES, resolve_period
+from stats_cache import MemoryStatisticsCache, SharedStatisticsCache, cache_key
+
+try:
+    import msgpack
+except ImportError:  # Формат msgpack доступен, только если установлен пакет
+    msgpack = None
+# Модуль PDF-отчетов общий с клиентом и лежит в папке prog_dipl
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from pdf_report import render_statistics_pdf, ensure_gui_application
+except ImportError:  # PDF-отчеты строятся через PyQt5, если он установлен
+    render_statistics_pdf = None
 
 app = Flask(__name__)
 
@@ -11,20 +40,809 @@ USER_DB_PATH = os.path.join(DB_FOLDER, 'user.db')
 if not os.path.exists(DB_FOLDER):
     os.makedirs(DB_FOLDER)
 
+ATTENDANCE_STATUSES = ('present', 'late', 'sick', 'absent')
+# Ограничение на число параметров в одном запросе SQLite
+SQL_PARAMS_CHUNK = 500
+# Максимальный размер страницы в /api/get_students
+STUDENTS_PAGE_MAX = 1000
+
+# Пулы соединений: по одному на каждую базу данных
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+# Метрики Prometheus на /metrics (включаются переменной METRICS_ENABLED=1)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0').lower() in ('1', 'true', 'yes')
+# Журнал медленных запросов: запросы дольше SLOW_REQUEST_MS (0 - выключен)
+# записываются с запросами SQL, а для SQL дольше SLOW_STATEMENT_MS - с планом
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 0))
+SLOW_STATEMENT_MS = float(os.environ.get('SLOW_STATEMENT_MS', 50))
+SLOW_LOG_PATH = os.environ.get('SLOW_LOG_PATH', os.path.join('logs', 'slow_requests.log'))
+# Сколько запросов SQL одного HTTP-запроса сохраняется в журнале
+SLOW_LOG_MAX_STATEMENTS = 100
+# Профилирование: доля случайных запросов и/или по заголовку X-Profile: 1
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_HEADER = os.environ.get('PROFILE_HEADER', '0').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+# Фоновые задания отчетов: число рабочих потоков (0 - задания только ставятся
+# в очередь), папка для файлов и сколько дней их хранить
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+REPORTS_DIR = os.environ.get('REPORTS_DIR', 'reports')
+JOB_RESULT_TTL_DAYS = float(os.environ.get('JOB_RESULT_TTL_DAYS', 7))
+# Одинаковый отчет, построенный не раньше стольких секунд назад, не строится заново
+JOB_REUSE_SECONDS = int(os.environ.get('JOB_REUSE_SECONDS', 3600))
+# Число процессов сервера (задает run_server.py)
+SERVER_PROCESSES = int(os.environ.get('SERVER_PROCESSES', 1))
+# Кэш статистики: memory - в памяти процесса, shared - общий файл SQLite
+# для нескольких процессов сервера, off - выключен. В памяти процесса кэш
+# сбрасывается только в процессе, который сохранил отметки, поэтому при
+# нескольких процессах по умолчанию используется shared
+STATS_CACHE = os.environ.get('STATS_CACHE', 'shared' if SERVER_PROCESSES > 1 else 'memory').lower()
+STATS_CACHE_PATH = os.environ.get('STATS_CACHE_PATH', os.path.join(DB_FOLDER, 'stats_cache.db'))
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', 300))
+# Каталог, через который процессы сервера объединяют метрики /metrics
+# (по умолчанию - при нескольких процессах), и период записи в него (с)
+METRICS_DIR = os.environ.get('METRICS_DIR', 'metrics' if SERVER_PROCESSES > 1 else '')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+STATS_CACHE_SIZE = int(os.environ.get('STATS_CACHE_SIZE', 256))
+# Результаты длиннее стольких строк не кэшируются
+STATS_CACHE_MAX_ROWS = int(os.environ.get('STATS_CACHE_MAX_ROWS', 20000))
+# --- Миграции схемы ---
+# Каждая миграция: (версия, описание, список SQL-команд или функций conn -> None).
+# Миграции применяются по возрастанию версии при запуске сервера,
+# номер последней примененной хранится в таблице schema_version.
+UNIVERSITY_MIGRATIONS = [
+    (1, 'Покрывающий индекс посещаемости по занятию', [
+        """CREATE INDEX IF NOT EXISTS idx_attendance_lesson
+           ON attendance(date, lesson_number, subject_id, student_id, status)""",
+    ]),
+    (2, 'Покрывающий индекс посещаемости по студенту и дате', [
+        """CREATE INDEX IF NOT EXISTS idx_attendance_student_date
+           ON attendance(student_id, date, lesson_number, subject_id, status)""",
+    ]),
+    (3, 'Индекс студентов по группе', [
+        """CREATE INDEX IF NOT EXISTS idx_students_group
+           ON students(group_id, surname, name)""",
+    ]),
+]
+
+# Даты занятий хранятся номером дня от 1970-01-01 (attendance.day); дата
+# в виде 'YYYY-MM-DD' доступна для чтения в вычисляемой колонке attendance.date
+DAY_EPOCH = datetime.date(1970, 1, 1)
+DAY_TO_ISO_SQL = "date({day} * 86400, 'unixepoch')"
+ISO_TO_DAY_SQL = "CAST(julianday({date}) - 2440587.5 AS INTEGER)"
+
+def day_number(value):
+    """Номер дня для даты 'YYYY-MM-DD'"""
+    try:
+        return (datetime.date.fromisoformat(value) - DAY_EPOCH).days
+    except (TypeError, ValueError):
+        raise ValueError(f'Некорректная дата: {value}')
+
+# Сводные таблицы посещаемости: (таблица, колонка периода, ее тип, выражение от строки посещаемости).
+# subject_id = 0 обозначает занятия без предмета.
+ATTENDANCE_ROLLUPS = (
+    ('attendance_daily', 'day', 'INTEGER', '{row}.day'),
+    ('attendance_monthly', 'month', 'TEXT', "strftime('%Y-%m', {row}.day * 86400, 'unixepoch')"),
+)
+# Сводные таблицы до перехода на номера дней (миграция 4)
+TEXT_DATE_ROLLUPS = (
+    ('attendance_daily', 'day', 'TEXT', '{row}.date'),
+    ('attendance_monthly', 'month', 'TEXT', 'substr({row}.date, 1, 7)'),
+)
+
+def _rollup_apply_sql(table, period_column, period_type, period_expr, row, sign):
+    """SQL для прибавления (sign='+') или вычитания (sign='-') строки посещаемости"""
+    counters = ', '.join(
+        f"{sign}({row}.status = '{status}')" for status in ATTENDANCE_STATUSES
+    )
+    updates = ', '.join(
+        f"{status} = {status} + excluded.{status}" for status in ATTENDANCE_STATUSES
+    )
+    return f"""
+        INSERT INTO {table} ({period_column}, student_id, subject_id, {', '.join(ATTENDANCE_STATUSES)})
+        VALUES ({period_expr.format(row=row)}, {row}.student_id, COALESCE({row}.subject_id, 0), {counters})
+        ON CONFLICT({period_column}, student_id, subject_id) DO UPDATE SET {updates};
+    """
+
+def _rollup_cleanup_sql(table, period_column, period_type, period_expr, row):
+    """SQL для удаления опустевших строк сводной таблицы"""
+    empty = ' AND '.join(f"{status} = 0" for status in ATTENDANCE_STATUSES)
+    return f"""
+        DELETE FROM {table}
+        WHERE {period_column} = {period_expr.format(row=row)}
+          AND student_id = {row}.student_id
+          AND subject_id = COALESCE({row}.subject_id, 0)
+          AND {empty};
+    """
+
+def _rollup_migration_steps(rollups, date_column):
+    """Создание сводных таблиц, триггеров их обновления и первичное заполнение"""
+    steps = []
+    for table, period_column, period_type, period_expr in rollups:
+        counters = ',\n'.join(f"    {status} INTEGER NOT NULL DEFAULT 0" for status in ATTENDANCE_STATUSES)
+        steps.append(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {period_column} {period_type} NOT NULL,
+                student_id INTEGER NOT NULL,
+                subject_id INTEGER NOT NULL,
+            {counters},
+                PRIMARY KEY ({period_column}, student_id, subject_id)
+            ) WITHOUT ROWID
+        """)
+        steps.append(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table}_student
+            ON {table}(student_id, {period_column})
+        """)
+        sums = ', '.join(f"SUM(status = '{status}')" for status in ATTENDANCE_STATUSES)
+        steps.append(f"""
+            INSERT INTO {table} ({period_column}, student_id, subject_id, {', '.join(ATTENDANCE_STATUSES)})
+            SELECT {period_expr.format(row='attendance')}, student_id, COALESCE(subject_id, 0), {sums}
+            FROM attendance
+            GROUP BY 1, 2, 3
+        """)
+    insert_body = ''.join(_rollup_apply_sql(*rollup, 'NEW', '+') for rollup in rollups)
+    delete_body = ''.join(
+        _rollup_apply_sql(*rollup, 'OLD', '-') + _rollup_cleanup_sql(*rollup, 'OLD')
+        for rollup in rollups
+    )
+    steps.append(f"CREATE TRIGGER IF NOT EXISTS trg_attendance_rollup_insert AFTER INSERT ON attendance BEGIN {insert_body} END")
+    steps.append(f"CREATE TRIGGER IF NOT EXISTS trg_attendance_rollup_delete AFTER DELETE ON attendance BEGIN {delete_body} END")
+    steps.append(
+        "CREATE TRIGGER IF NOT EXISTS trg_attendance_rollup_update "
+        f"AFTER UPDATE OF student_id, {date_column}, subject_id, status ON attendance "
+        f"BEGIN {delete_body}{insert_body} END"
+    )
+    return steps
+
+UNIVERSITY_MIGRATIONS.append(
+    (4, 'Сводные таблицы посещаемости по дням и месяцам', _rollup_migration_steps(TEXT_DATE_ROLLUPS, 'date'))
+)
+
+# Справочники, изменения которых отдаются клиентам через /api/sync: таблица -> колонки
+SYNC_TABLES = {
+    'groups': ('id', 'name', 'course'),
+    'students': ('id', 'surname', 'name', 'middle_name', 'group_id', 'is_nonresident'),
+    'subjects': ('id', 'name', 'description'),
+}
+
+def _sync_migration_steps(tables):
+    """Счетчик изменений и версии строк таблиц, обновляемые триггерами.
+
+    Любая запись в справочник увеличивает общий счетчик sync_state.version
+    и запоминает его в row_versions. Удаленные строки остаются в
+    row_versions с пометкой deleted, чтобы клиенты узнали об удалении.
+    """
+    steps = [
+        """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS row_versions (
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                created_version INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (table_name, row_id)
+            ) WITHOUT ROWID
+        """,
+        """
+            CREATE INDEX IF NOT EXISTS idx_row_versions_table
+            ON row_versions(table_name, version)
+        """,
+        # Существующие строки считаются добавленными в версии 1
+        "INSERT OR IGNORE INTO sync_state (id, version) VALUES (1, 1)",
+    ]
+    bump = "UPDATE sync_state SET version = version + 1 WHERE id = 1;"
+    current = "(SELECT version FROM sync_state WHERE id = 1)"
+    for table in tables:
+        steps.append(f"""
+            INSERT OR IGNORE INTO row_versions (table_name, row_id, version, created_version)
+            SELECT '{table}', id, 1, 1 FROM {table}
+        """)
+        steps.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_insert AFTER INSERT ON {table} BEGIN
+                {bump}
+                INSERT INTO row_versions (table_name, row_id, version, created_version, deleted)
+                VALUES ('{table}', NEW.id, {current}, {current}, 0)
+                ON CONFLICT(table_name, row_id) DO UPDATE SET
+                    version = excluded.version, created_version = excluded.created_version, deleted = 0;
+            END
+        """)
+        steps.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_update AFTER UPDATE ON {table} BEGIN
+                {bump}
+                INSERT INTO row_versions (table_name, row_id, version, created_version, deleted)
+                VALUES ('{table}', NEW.id, {current}, {current}, 0)
+                ON CONFLICT(table_name, row_id) DO UPDATE SET version = excluded.version, deleted = 0;
+            END
+        """)
+        steps.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_delete AFTER DELETE ON {table} BEGIN
+                {bump}
+                UPDATE row_versions SET version = {current}, deleted = 1
+                WHERE table_name = '{table}' AND row_id = OLD.id;
+            END
+        """)
+    return steps
+
+UNIVERSITY_MIGRATIONS.append(
+    (5, 'Версии изменений справочников для синхронизации', _sync_migration_steps(SYNC_TABLES))
+)
+
+UNIVERSITY_MIGRATIONS.append(
+    (6, 'Задания и расписания построения отчетов', JOB_MIGRATION_STEPS)
+)
+
+def _day_number_migration_steps():
+    """Перевод attendance.date (TEXT) в номер дня attendance.day (INTEGER).
+
+    Таблица пересоздается с теми же id. Дата 'YYYY-MM-DD' остается
+    вычисляемой колонкой date (VIRTUAL, на диске не хранится), индексы и
+    сводные таблицы строятся заново по номеру дня. Некорректная дата
+    в старой таблице прерывает миграцию (day NOT NULL).
+    """
+    steps = [
+        "DROP TABLE IF EXISTS attendance_daily",
+        "DROP TABLE IF EXISTS attendance_monthly",
+        f"""
+            CREATE TABLE attendance_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                lesson_number INTEGER NOT NULL,
+                subject_id INTEGER,
+                status TEXT NOT NULL CHECK(status IN ('present', 'late', 'sick', 'absent')),
+                date TEXT GENERATED ALWAYS AS ({DAY_TO_ISO_SQL.format(day='day')}) VIRTUAL,
+                UNIQUE(student_id, day, lesson_number)
+            )
+        """,
+        f"""
+            INSERT INTO attendance_new (id, student_id, day, lesson_number, subject_id, status)
+            SELECT id, student_id, {ISO_TO_DAY_SQL.format(date='date')}, lesson_number, subject_id, status
+            FROM attendance
+            ORDER BY id
+        """,
+        # Счетчик AUTOINCREMENT не должен уменьшиться (id удаленных строк не выдаются повторно)
+        """
+            UPDATE sqlite_sequence
+            SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('attendance', 'attendance_new'))
+            WHERE name = 'attendance_new'
+        """,
+        # Вместе с таблицей удаляются ее индексы и триггеры сводных таблиц
+        "DROP TABLE attendance",
+        "ALTER TABLE attendance_new RENAME TO attendance",
+        """CREATE INDEX IF NOT EXISTS idx_attendance_lesson
+           ON attendance(day, lesson_number, subject_id, student_id, status)""",
+        """CREATE INDEX IF NOT EXISTS idx_attendance_student_date
+           ON attendance(student_id, day, lesson_number, subject_id, status)""",
+    ]
+    return steps + _rollup_migration_steps(ATTENDANCE_ROLLUPS, 'day') + ["ANALYZE attendance"]
+
+UNIVERSITY_MIGRATIONS.append(
+    (7, 'Даты посещаемости номерами дней', _day_number_migration_steps())
+)
+
+USER_MIGRATIONS = [
+    (1, 'Версии изменений пользователей', _sync_migration_steps(('users_data',))),
+]
+
+def run_migrations(db_path, migrations):
+    """Применение недостающих миграций к базе (каждая в своей транзакции)"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+        applied = []
+        for version, description, steps in sorted(migrations, key=lambda m: m[0]):
+            if version <= current:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            # Миграцию мог уже применить другой процесс сервера
+            if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                conn.execute("COMMIT")
+                continue
+            try:
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (version, description)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append(version)
+        return applied
+    finally:
+        conn.close()
+
+# Профиль настроек SQLite: durable, fast или bulk-import (переменная DB_PROFILE)
+DB_PROFILE = get_profile()
+for _db_path in (UNIVERSITY_DB_PATH, USER_DB_PATH):
+    configure_database(_db_path, DB_PROFILE)
+run_migrations(UNIVERSITY_DB_PATH, UNIVERSITY_MIGRATIONS)
+run_migrations(USER_DB_PATH, USER_MIGRATIONS)
+
+# --- Метрики ---
+
+metrics = MetricsRegistry(METRICS_DIR if METRICS_ENABLED else None, METRICS_FLUSH_SECONDS)
+http_requests = metrics.counter(
+    'http_requests_total', 'Число обработанных запросов', ('route', 'method', 'status'))
+http_errors = metrics.counter(
+    'http_request_errors_total', 'Число ответов с кодом 5xx', ('route',))
+http_duration = metrics.histogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ('route', 'method', 'status'))
+sql_duration = metrics.histogram(
+    'sqlite_statement_duration_seconds', 'Время выполнения запросов SQLite (с чтением строк)',
+    ('statement',), buckets=SQL_BUCKETS)
+
+slow_log = SlowRequestLog(SLOW_LOG_PATH)
+profiler = RequestProfiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_HEADER)
+
+def record_statement(sql, params, seconds, conn):
+    """Учет выполненного запроса SQLite в метриках и журнале медленных запросов"""
+    in_request = has_request_context()
+    if METRICS_ENABLED:
+        endpoint = (request.endpoint or 'unmatched') if in_request else 'background'
+        sql_duration.observe((f'{endpoint}:{statement_name(sql)}',), seconds)
+    if SLOW_REQUEST_MS and in_request:
+        g.sql_time = g.get('sql_time', 0.0) + seconds
+        statements = g.setdefault('sql_statements', [])
+        if len(statements) < SLOW_LOG_MAX_STATEMENTS:
+            statement = {'sql': ' '.join(sql.split()), 'params': params, 'ms': round(seconds * 1000, 3)}
+            if seconds * 1000 >= SLOW_STATEMENT_MS and params is not None:
+                statement['plan'] = explain_plan(conn, sql, params)
+            statements.append(statement)
+        g.sql_count = g.get('sql_count', 0) + 1
+
+# Замер запросов SQL нужен только метрикам и журналу медленных запросов
+TRACE_SQL = METRICS_ENABLED or SLOW_REQUEST_MS > 0
+db_pools = {
+    path: ConnectionPool(path, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                         pragmas=connection_pragmas(DB_PROFILE),
+                         connection_factory=traced_connection_factory(record_statement) if TRACE_SQL else None)
+    for path in (UNIVERSITY_DB_PATH, USER_DB_PATH)
+}
+
+def collect_database_metrics():
+    """Состояние пулов соединений и размеры файлов баз"""
+    pool_metrics = [
+        ('size', 'db_pool_connections', 'gauge', 'Открыто соединений'),
+        ('idle', 'db_pool_idle_connections', 'gauge', 'Свободных соединений'),
+        ('in_use', 'db_pool_in_use_connections', 'gauge', 'Занятых соединений'),
+        ('checkouts', 'db_pool_checkouts_total', 'counter', 'Выдано соединений'),
+        ('waits', 'db_pool_waits_total', 'counter', 'Ожиданий свободного соединения'),
+        ('wait_time', 'db_pool_wait_seconds_total', 'counter', 'Суммарное время ожидания соединения'),
+        ('timeouts', 'db_pool_timeouts_total', 'counter', 'Отказов по таймауту ожидания'),
+    ]
+    stats = [pool.stats() for pool in db_pools.values()]
+    result = []
+    for key, name, metric_type, help_text in pool_metrics:
+        result.append((name, metric_type, help_text,
+                       [({'db': os.path.basename(item['db'])}, item[key]) for item in stats]))
+    sizes = []
+    for db_path in db_pools:
+        for suffix, kind in (('', 'db'), ('-wal', 'wal')):
+            size = os.path.getsize(db_path + suffix) if os.path.exists(db_path + suffix) else 0
+            sizes.append(({'db': os.path.basename(db_path), 'file': kind}, size))
+    result.append(('sqlite_file_size_bytes', 'gauge', 'Размер файла базы и журнала WAL', sizes))
+    return result
+
+metrics.add_collector(collect_database_metrics)
+
+def create_statistics_cache():
+    """Кэш статистики по настройке STATS_CACHE (None - кэш выключен)"""
+    if STATS_CACHE == 'shared':
+        return SharedStatisticsCache(STATS_CACHE_PATH, max_entries=STATS_CACHE_SIZE, ttl=STATS_CACHE_TTL)
+    if STATS_CACHE == 'memory':
+        return MemoryStatisticsCache(max_entries=STATS_CACHE_SIZE, ttl=STATS_CACHE_TTL)
+    return None
+
+stats_cache = create_statistics_cache()
+
+def collect_cache_metrics():
+    """Счетчики кэша статистики"""
+    stats = stats_cache.stats()
+    labels = {'backend': stats['backend']}
+    return [
+        ('stats_cache_hits_total', 'counter', 'Попаданий в кэш статистики', [(labels, stats['hits'])]),
+        ('stats_cache_misses_total', 'counter', 'Промахов кэша статистики', [(labels, stats['misses'])]),
+        ('stats_cache_invalidations_total', 'counter', 'Записей кэша, удаленных при сохранении посещаемости',
+         [(labels, stats['invalidations'])]),
+        ('stats_cache_entries', 'gauge', 'Записей в кэше статистики', [(labels, stats['entries'])]),
+    ]
+
+if stats_cache is not None:
+    metrics.add_collector(collect_cache_metrics)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if METRICS_ENABLED:
+        metrics.start_flush()
+    if profiler.enabled:
+        g.profile = profiler.start(request)
+
+@app.after_request
+def record_request_metrics(response):
+    """Учет запроса в метриках (для потоковых ответов - время до начала передачи)"""
+    started = g.pop('request_started', None)
+    if started is None or not METRICS_ENABLED:
+        return response
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = (route, request.method, str(response.status_code))
+    http_requests.inc(labels)
+    http_duration.observe(labels, time.perf_counter() - started)
+    if response.status_code >= 500:
+        http_errors.inc((route,))
+    return response
+
+@app.teardown_request
+def stop_profiler(exc):
+    """Остановка профилировщика, если запрос завершился исключением"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.finish(profile, request.endpoint)
+
+@app.after_request
+def log_slow_request(response):
+    """Запись медленного запроса в журнал и сохранение профиля.
+
+    Время разбито на SQL, сериализацию ответа и остальное (код обработчика,
+    сжатие), чтобы было видно, где тратится время.
+    """
+    profile = g.pop('profile', None)
+    if profile is not None:
+        response.headers['X-Profile-File'] = profiler.finish(profile, request.endpoint)
+    started = g.get('request_started')
+    if not SLOW_REQUEST_MS or started is None:
+        return response
+    total = time.perf_counter() - started
+    if total * 1000 < SLOW_REQUEST_MS:
+        return response
+    sql_time = g.get('sql_time', 0.0)
+    serialize_time = g.get('serialize_time', 0.0)
+    slow_log.write({
+        'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+        'route': request.url_rule.rule if request.url_rule else 'unmatched',
+        'method': request.method,
+        'args': request.args.to_dict(flat=False),
+        'content_length': request.content_length,
+        'status': response.status_code,
+        'total_ms': round(total * 1000, 3),
+        'sql_ms': round(sql_time * 1000, 3),
+        'serialize_ms': round(serialize_time * 1000, 3),
+        'other_ms': round((total - sql_time - serialize_time) * 1000, 3),
+        'sql_count': g.get('sql_count', 0),
+        'statements': g.get('sql_statements', []),
+    })
+    return response
+
+@atexit.register
+def checkpoint_databases():
+    """Перенос WAL в основные файлы баз при остановке сервера"""
+    for pool in db_pools.values():
+        pool.close_all()
+    for db_path in db_pools:
+        try:
+            checkpoint(db_path, 'TRUNCATE')
+        except sqlite3.Error:
+            pass
+
 def get_db_connection(db_path):
-    """Получение соединения с базой данных"""
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Получение соединения с базой данных из пула.
+
+    В пределах одного запроса возвращается одно и то же соединение,
+    в пул оно возвращается в release_db_connections.
+    """
+    connections = g.setdefault('db_connections', {})
+    if db_path not in connections:
+        connections[db_path] = db_pools[db_path].acquire()
+    return connections[db_path]
+
+@app.teardown_appcontext
+def release_db_connections(exc):
+    """Возврат соединений в пул по окончании запроса (в том числе при ошибке)"""
+    for db_path, conn in g.pop('db_connections', {}).items():
+        db_pools[db_path].release(conn)
+
+
+# --- Форматы ответа и сжатие ---
+
+# Колоночный JSON: список строк передается как имена колонок и массив значений
+# на каждую колонку, без повторения ключей в каждой строке
+COLUMNAR_MIMETYPE = 'application/x-columnar+json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Ответы меньше этого размера (в байтах) не сжимаются
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+# Потоковый ответ: одна JSON-строка на запись, строки читаются из базы пачками
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 500
+# Размер части при передаче файлов отчетов
+FILE_CHUNK_SIZE = 64 * 1024
+
+def response_format():
+    """Формат тела ответа по заголовку Accept: json, columnar или msgpack"""
+    offered = {'application/json': 'json', COLUMNAR_MIMETYPE: 'columnar'}
+    if msgpack is not None:
+        offered[MSGPACK_MIMETYPE] = 'msgpack'
+    best = request.accept_mimetypes.best_match(list(offered), default='application/json')
+    return offered[best]
+
+def response_encoding():
+    """Сжатие по заголовку Accept-Encoding: gzip, deflate или None"""
+    return request.accept_encodings.best_match(['gzip', 'deflate'])
+
+def is_rows(obj):
+    return (isinstance(obj, list) and obj and isinstance(obj[0], dict)
+            and all(isinstance(row, dict) and row.keys() == obj[0].keys() for row in obj))
+
+def to_columns(rows):
+    columns = list(rows[0])
+    return {'columns': columns, 'data': [[row[column] for row in rows] for column in columns]}
+
+class NegotiatedJSONProvider(DefaultJSONProvider):
+    """jsonify в формате, который клиент запросил заголовком Accept"""
+
+    def response(self, *args, **kwargs):
+        if not has_request_context():
+            return super().response(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return self._negotiated_response(self._prepare_response_obj(args, kwargs))
+        finally:
+            # Время сериализации для журнала медленных запросов
+            g.serialize_time = g.get('serialize_time', 0.0) + time.perf_counter() - started
+
+    def _negotiated_response(self, obj):
+        fmt = response_format()
+        if fmt == 'msgpack':
+            return self._app.response_class(msgpack.packb(obj, use_bin_type=True), mimetype=MSGPACK_MIMETYPE)
+        if fmt == 'columnar' and is_rows(obj):
+            return self._app.response_class(f"{self.dumps(to_columns(obj))}\n", mimetype=COLUMNAR_MIMETYPE)
+        return super().response(obj)
+
+app.json = NegotiatedJSONProvider(app)
+
+@app.after_request
+def compress_response(response):
+    """Сжатие gzip/deflate, если клиент его поддерживает"""
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    encoding = response_encoding()
+    if (encoding is None or response.status_code != 200 or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == 'gzip':
+        body = gzip.compress(body, COMPRESS_LEVEL)
+    else:
+        body = zlib.compress(body, COMPRESS_LEVEL)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
 
+def wants_ndjson():
+    """Клиент явно запросил потоковый ответ NDJSON"""
+    return NDJSON_MIMETYPE in request.accept_mimetypes.values()
+
+def compress_stream(chunks, encoding):
+    """Сжатие потокового ответа по частям (каждая часть доступна клиенту сразу)"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+def ndjson_lines(rows):
+    return ''.join(app.json.dumps(row, separators=(',', ':')) + '\n' for row in rows).encode()
+
+def ndjson_response(chunks, on_close=None):
+    """Потоковый ответ NDJSON (со сжатием, если клиент его принимает)"""
+    encoding = response_encoding()
+    if encoding:
+        chunks = compress_stream(chunks, encoding)
+    response = app.response_class(stream_with_context(chunks), mimetype=NDJSON_MIMETYPE)
+    if on_close is not None:
+        response.call_on_close(on_close)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def stream_list(rows):
+    """Ответ NDJSON из готового списка строк"""
+    return ndjson_response(ndjson_lines(rows[i:i + STREAM_BATCH_SIZE])
+                           for i in range(0, len(rows), STREAM_BATCH_SIZE))
+
+def stream_rows(cursor, db_path, on_complete=None, collect_limit=0):
+    """Ответ NDJSON из курсора: строки читаются fetchmany и отправляются по мере чтения.
+
+    Код ответа отправляется до чтения строк, поэтому ошибка при чтении
+    передается последней строкой {"error": ...}. Контекст запроса
+    завершается раньше, чем передача, поэтому соединение возвращается
+    в пул только после закрытия ответа. Если строк не больше collect_limit,
+    после успешной передачи их список передается в on_complete.
+    """
+    conn = g.db_connections.pop(db_path)
+
+    def release():
+        cursor.close()
+        db_pools[db_path].release(conn)
+
+    def generate():
+        collected = [] if on_complete is not None else None
+        try:
+            while True:
+                rows = [dict(row) for row in cursor.fetchmany(STREAM_BATCH_SIZE)]
+                if not rows:
+                    break
+                if collected is not None:
+                    collected.extend(rows)
+                    if len(collected) > collect_limit:
+                        collected = None
+                yield ndjson_lines(rows)
+        except Exception as e:
+            yield (app.json.dumps({'error': str(e)}) + '\n').encode()
+            return
+        if collected is not None:
+            on_complete(collected)
+
+    return ndjson_response(generate(), on_close=release)
+
+def send_temporary_file(path, mimetype, download_name):
+    """Передача временного файла частями; файл удаляется после закрытия ответа"""
+    def read_chunks():
+        with open(path, 'rb') as f:
+            while chunk := f.read(FILE_CHUNK_SIZE):
+                yield chunk
+
+    def remove():
+        if os.path.exists(path):
+            os.remove(path)
+
+    response = app.response_class(read_chunks(), mimetype=mimetype)
+    response.headers['Content-Length'] = str(os.path.getsize(path))
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    response.call_on_close(remove)
+    return response
+
+def representation_suffix():
+    """Часть ETag, различающая форматы и сжатие одного и того же ответа"""
+    fmt = response_format()
+    encoding = response_encoding()
+    return (f'-{fmt}' if fmt != 'json' else '') + (f'-{encoding}' if encoding else '')
+
+# --- Условные GET-запросы ---
+
+def table_version(conn, table):
+    """Номер последнего изменения таблицы (0, если изменений не было)"""
+    return conn.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM row_versions WHERE table_name = ?", (table,)
+    ).fetchone()[0]
+
+def conditional_get(db_path, *tables, cache_control='no-cache'):
+    """ETag по версиям таблиц и ответ 304, если у клиента актуальная копия.
+
+    Версия читается до выполнения запроса, поэтому при одновременной записи
+    клиент может получить более новые данные со старым ETag - тогда при
+    следующем запросе ETag не совпадет и данные просто загрузятся заново.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                conn = get_db_connection(db_path)
+                etag = '-'.join(f'{table}.{table_version(conn, table)}' for table in tables)
+                etag += representation_suffix()
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
 
 @app.route('/api/ping', methods=['GET'])
 def ping():
     return jsonify({'status': 'ok'})
+
+@app.route('/api/pool_stats', methods=['GET'])
+def pool_stats():
+    """Метрики пулов соединений"""
+    return jsonify([pool.stats() for pool in db_pools.values()])
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    """Счетчики кэша статистики (попадания, промахи, инвалидации)"""
+    if stats_cache is None:
+        return jsonify({'backend': 'off'})
+    return jsonify(stats_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Метрики в текстовом формате Prometheus (при METRICS_DIR - сумма по всем процессам)"""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Метрики отключены (METRICS_ENABLED)'}), 404
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
 # --- API Маршруты ---
 
+# --- Синхронизация справочников ---
+
+@app.route('/api/sync', methods=['GET'])
+def sync():
+    """Изменения групп, студентов и предметов после версии since.
+
+    Для каждой таблицы возвращаются добавленные (inserted), измененные
+    (updated) строки и id удаленных (deleted), а также текущая версия,
+    которую клиент передает в следующем запросе. Если since больше
+    версии сервера (база пересоздана), возвращаются все строки и full=true.
+    """
+    try:
+        since = int_arg('since') or 0
+    except ValueError:
+        return jsonify({'error': 'Некорректная версия'}), 400
+    if since < 0:
+        return jsonify({'error': 'Некорректная версия'}), 400
+
+    try:
+        conn = get_db_connection(UNIVERSITY_DB_PATH)
+        # Все выборки читают один снимок базы
+        conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT version FROM sync_state WHERE id = 1").fetchone()[0]
+            full = since > version
+            if full:
+                since = 0
+
+            changes = {}
+            for table, columns in SYNC_TABLES.items():
+                rows = conn.execute(f"""
+                    SELECT v.created_version, {', '.join('t.' + column for column in columns)}
+                    FROM row_versions v
+                    JOIN {table} t ON t.id = v.row_id
+                    WHERE v.table_name = ? AND v.version > ? AND v.deleted = 0
+                    ORDER BY t.id
+                """, (table, since)).fetchall()
+                deleted = conn.execute("""
+                    SELECT row_id FROM row_versions
+                    WHERE table_name = ? AND version > ? AND deleted = 1
+                    ORDER BY row_id
+                """, (table, since)).fetchall()
+                changes[table] = {
+                    'inserted': [dict(zip(columns, row[1:])) for row in rows if row[0] > since],
+                    'updated': [dict(zip(columns, row[1:])) for row in rows if row[0] <= since],
+                    'deleted': [row[0] for row in deleted],
+                }
+        finally:
+            conn.commit()
+        return jsonify({'version': version, 'full': full, 'changes': changes})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # --- Группы ---
 @app.route('/api/get_universities', methods=['GET'])
+@conditional_get(UNIVERSITY_DB_PATH, 'groups', 'students')
 def get_groups():
     try:
         conn = get_db_connection(UNIVERSITY_DB_PATH)
@@ -40,7 +858,6 @@ def get_groups():
         """)
         
         groups = [dict(row) for row in cursor.fetchall()]
-        conn.close()
         return jsonify(groups)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -60,13 +877,11 @@ def add_group():
         
         cursor.execute("SELECT 1 FROM groups WHERE name=?", (name,))
         if cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Группа с таким названием уже существует'}), 400
         
         cursor.execute("INSERT INTO groups (name, course) VALUES (?, ?)", (name, course))
         conn.commit()
         group_id = cursor.lastrowid
-        conn.close()
         
         return jsonify({'message': 'Группа добавлена', 'id': group_id}), 201
     except Exception as e:
@@ -81,7 +896,6 @@ def delete_group(group_id):
         # Проверяем существование группы
         cursor.execute("SELECT 1 FROM groups WHERE id=?", (group_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Группа не найдена'}), 404
         
         # Проверяем наличие студентов в группе
@@ -89,7 +903,6 @@ def delete_group(group_id):
         student_count = cursor.fetchone()[0]
         
         if student_count > 0:
-            conn.close()
             return jsonify({
                 'error': 'В группе есть студенты',
                 'student_count': student_count
@@ -97,7 +910,6 @@ def delete_group(group_id):
         
         cursor.execute("DELETE FROM groups WHERE id=?", (group_id,))
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Группа удалена'}), 200
     except Exception as e:
@@ -120,12 +932,10 @@ def transfer_group():
         # Проверяем существование групп
         cursor.execute("SELECT 1 FROM groups WHERE id=?", (old_group_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Исходная группа не найдена'}), 404
             
         cursor.execute("SELECT 1 FROM groups WHERE id=?", (new_group_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Новая группа не найдена'}), 404
         
         # Переводим студентов
@@ -136,7 +946,6 @@ def transfer_group():
         """, (new_group_id, old_group_id))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Студенты переведены'}), 200
     except Exception as e:
@@ -144,37 +953,87 @@ def transfer_group():
 
 # --- Студенты ---
 
+def int_arg(name):
+    """Целочисленный параметр строки запроса (None, если не задан)"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return int(value)
+
 @app.route('/api/get_students', methods=['GET'])
 @app.route('/api/get_students/<int:group_id>', methods=['GET'])
+@conditional_get(UNIVERSITY_DB_PATH, 'groups', 'students')
 def get_students(group_id=None):
-    """Получение студентов (всех или конкретной группы)"""
+    """Получение студентов (всех или конкретной группы).
+
+    Фильтры в строке запроса: group_id, course, is_nonresident,
+    name (начало фамилии). Постраничная выборка: after_id и limit -
+    в этом режиме студенты упорядочены по id, а следующий after_id
+    возвращается в заголовке X-Next-After-Id.
+    """
+    try:
+        if group_id is None:
+            group_id = int_arg('group_id')
+        course = int_arg('course')
+        is_nonresident = int_arg('is_nonresident')
+        name_prefix = request.args.get('name')
+        after_id = int_arg('after_id')
+        limit = int_arg('limit')
+    except ValueError:
+        return jsonify({'error': 'Некорректные параметры фильтра'}), 400
+    if limit is not None and not 0 < limit <= STUDENTS_PAGE_MAX:
+        return jsonify({'error': f'limit должен быть от 1 до {STUDENTS_PAGE_MAX}'}), 400
+
     try:
         conn = get_db_connection(UNIVERSITY_DB_PATH)
         cursor = conn.cursor()
         
+        conditions = []
+        params = []
         if group_id:
+            conditions.append('s.group_id = ?')
+            params.append(group_id)
+        if course is not None:
+            conditions.append('g.course = ?')
+            params.append(course)
+        if is_nonresident is not None:
+            conditions.append('s.is_nonresident = ?')
+            params.append(is_nonresident)
+        if name_prefix:
+            escaped = name_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("s.surname LIKE ? ESCAPE '\\'")
+            params.append(escaped + '%')
+        if after_id is not None:
+            conditions.append('s.id > ?')
+            params.append(after_id)
+
+        paginated = after_id is not None or limit is not None
+        if paginated:
+            order = 's.id'
+        elif group_id:
             # Для конкретной группы
-            cursor.execute("""
-                SELECT s.id, s.surname, s.name, s.middle_name, 
-                       s.is_nonresident, g.name as group_name
-                FROM students s
-                JOIN groups g ON s.group_id = g.id
-                WHERE s.group_id = ?
-                ORDER BY s.surname, s.name
-            """, (group_id,))
+            order = 's.surname, s.name'
         else:
-            # Все студенты
-            cursor.execute("""
-                SELECT s.id, s.surname, s.name, s.middle_name, 
-                       s.is_nonresident, g.name as group_name
-                FROM students s
-                JOIN groups g ON s.group_id = g.id
-                ORDER BY g.name, s.surname, s.name
-            """)
+            order = 'g.name, s.surname, s.name'
+
+        query = f"""
+            SELECT s.id, s.surname, s.name, s.middle_name, 
+                   s.is_nonresident, g.name as group_name
+            FROM students s
+            JOIN groups g ON s.group_id = g.id
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY {order}
+        """
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        cursor.execute(query, params)
         
         students = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return jsonify(students)
+        response = jsonify(students)
+        if limit is not None and len(students) == limit:
+            response.headers['X-Next-After-Id'] = str(students[-1]['id'])
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -197,7 +1056,6 @@ def add_student():
         # Проверяем существование группы
         cursor.execute("SELECT 1 FROM groups WHERE id=?", (group_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Группа не найдена'}), 404
         
         cursor.execute("""
@@ -208,7 +1066,6 @@ def add_student():
         
         conn.commit()
         student_id = cursor.lastrowid
-        conn.close()
         
         return jsonify({
             'message': 'Студент добавлен',
@@ -226,12 +1083,10 @@ def delete_student(student_id):
         # Проверяем существование студента
         cursor.execute("SELECT 1 FROM students WHERE id=?", (student_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Студент не найден'}), 404
         
         cursor.execute("DELETE FROM students WHERE id=?", (student_id,))
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Студент удален'}), 200
     except Exception as e:
@@ -257,7 +1112,6 @@ def update_student_nonresident():
         """, (is_nonresident, student_id))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Статус обновлен'}), 200
     except Exception as e:
@@ -279,13 +1133,11 @@ def transfer_student():
         # Проверяем существование студента
         cursor.execute("SELECT 1 FROM students WHERE id=?", (student_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Студент не найден'}), 404
             
         # Проверяем существование новой группы
         cursor.execute("SELECT 1 FROM groups WHERE id=?", (new_group_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Группа не найдена'}), 404
         
         cursor.execute("""
@@ -295,7 +1147,6 @@ def transfer_student():
         """, (new_group_id, student_id))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Студент переведен'}), 200
     except Exception as e:
@@ -304,6 +1155,7 @@ def transfer_student():
 # --- Предметы ---
 
 @app.route('/api/subjects', methods=['GET'])
+@conditional_get(UNIVERSITY_DB_PATH, 'subjects')
 def get_subjects():
     try:
         conn = get_db_connection(UNIVERSITY_DB_PATH)
@@ -311,7 +1163,6 @@ def get_subjects():
         
         cursor.execute("SELECT id, name, description FROM subjects")
         subjects = [dict(row) for row in cursor.fetchall()]
-        conn.close()
         
         return jsonify(subjects)
     except Exception as e:
@@ -332,7 +1183,6 @@ def add_subject():
         
         cursor.execute("SELECT 1 FROM subjects WHERE name=?", (name,))
         if cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Предмет с таким названием уже существует'}), 400
         
         cursor.execute("""
@@ -342,7 +1192,6 @@ def add_subject():
         
         conn.commit()
         subject_id = cursor.lastrowid
-        conn.close()
         
         return jsonify({
             'message': 'Предмет добавлен',
@@ -364,7 +1213,6 @@ def update_subject(subject_id):
         # Проверяем существование предмета
         cursor.execute("SELECT 1 FROM subjects WHERE id=?", (subject_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Предмет не найден'}), 404
         # Проверяем уникальность нового имени
         cursor.execute("""
@@ -372,7 +1220,6 @@ def update_subject(subject_id):
             WHERE name = ? AND id != ?
         """, (name, subject_id))
         if cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Предмет с таким названием уже существует'}), 400
         cursor.execute("""
             UPDATE subjects 
@@ -380,7 +1227,6 @@ def update_subject(subject_id):
             WHERE id = ?
         """, (name, description, subject_id))
         conn.commit()
-        conn.close()
         return jsonify({'message': 'Предмет обновлен'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -394,12 +1240,10 @@ def delete_subject(subject_id):
         # Проверяем существование предмета
         cursor.execute("SELECT 1 FROM subjects WHERE id=?", (subject_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Предмет не найден'}), 404
         
         cursor.execute("DELETE FROM subjects WHERE id=?", (subject_id,))
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Предмет удален'}), 200
     except Exception as e:
@@ -414,6 +1258,11 @@ def get_attendance():
     group_id = request.args.get('group_id')
     subject_id = request.args.get('subject_id')
     
+    try:
+        day = day_number(date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         conn = get_db_connection(UNIVERSITY_DB_PATH)
         cursor = conn.cursor()
@@ -421,9 +1270,9 @@ def get_attendance():
         query = """
             SELECT a.student_id, a.status 
             FROM attendance a
-            WHERE a.date = ? AND a.lesson_number = ?
+            WHERE a.day = ? AND a.lesson_number = ?
         """
-        params = [date, lesson_number]
+        params = [day, lesson_number]
         
         if group_id:
             query += ' AND a.student_id IN (SELECT id FROM students WHERE group_id = ?)'
@@ -435,7 +1284,6 @@ def get_attendance():
         
         cursor.execute(query, params)
         result = {str(row['student_id']): row['status'] for row in cursor.fetchall()}
-        conn.close()
         
         return jsonify(result)
     except Exception as e:
@@ -453,70 +1301,596 @@ def save_attendance():
     if not all([student_id, date, lesson_number, status]):
         return jsonify({'error': 'Missing required fields'}), 400
     
+    try:
+        day = day_number(date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         conn = get_db_connection(UNIVERSITY_DB_PATH)
         cursor = conn.cursor()
         
         cursor.execute("""
-            INSERT OR REPLACE INTO attendance 
-            (student_id, date, lesson_number, subject_id, status)
+            INSERT INTO attendance 
+            (student_id, day, lesson_number, subject_id, status)
             VALUES (?, ?, ?, ?, ?)
-        """, (student_id, date, lesson_number, subject_id, status))
+            ON CONFLICT(student_id, day, lesson_number)
+            DO UPDATE SET subject_id = excluded.subject_id, status = excluded.status
+        """, (student_id, day, lesson_number, subject_id, status))
         
         conn.commit()
-        conn.close()
+        student = conn.execute("SELECT group_id FROM students WHERE id = ?", (student_id,)).fetchone()
+        invalidate_statistics([date], [student['group_id']] if student else [])
         return jsonify({'message': 'Attendance saved'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/get_statistics', methods=['GET'])
-def get_statistics():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    group_id = request.args.get('group_id')
-    subject_id = request.args.get('subject_id')
-    lesson_number = request.args.get('lesson_number')
+def is_int(value):
+    """Целое число JSON (True/False не считаются числами)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+@app.route('/api/attendance/batch', methods=['POST'])
+def save_attendance_batch():
+    """Пакетное сохранение посещаемости за одно занятие (одна транзакция).
+
+    Ошибки занятия (дата, номер пары, предмет) - ответ 400, ошибки
+    отдельных записей (студент, статус) - в results без сохранения записи.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Ожидается объект JSON'}), 400
+    date = data.get('date')
+    lesson_number = data.get('lesson_number')
+    subject_id = data.get('subject_id')
+    records = data.get('records')
+
+    if not date or not lesson_number or not isinstance(records, list):
+        return jsonify({'error': 'Missing required fields'}), 400
+    if not is_int(lesson_number) or lesson_number < 1:
+        return jsonify({'error': 'Номер пары должен быть положительным целым числом'}), 400
+    if subject_id is not None and not is_int(subject_id):
+        return jsonify({'error': 'subject_id должен быть целым числом'}), 400
+    try:
+        day = day_number(date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         conn = get_db_connection(UNIVERSITY_DB_PATH)
         cursor = conn.cursor()
-        query = """
+
+        # Одним запросом на пачку проверяем, какие студенты существуют (и их группы)
+        student_ids = {rec.get('student_id') for rec in records
+                       if isinstance(rec, dict) and is_int(rec.get('student_id'))}
+        existing = {}
+        id_list = list(student_ids)
+        for i in range(0, len(id_list), SQL_PARAMS_CHUNK):
+            chunk = id_list[i:i + SQL_PARAMS_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"SELECT id, group_id FROM students WHERE id IN ({placeholders})", chunk)
+            existing.update((row['id'], row['group_id']) for row in cursor.fetchall())
+
+        rows = []
+        results = []
+        for rec in records:
+            rec = rec if isinstance(rec, dict) else {}
+            student_id = rec.get('student_id')
+            status = rec.get('status')
+            if not is_int(student_id):
+                results.append({'student_id': student_id, 'saved': False, 'error': 'Некорректный студент'})
+            elif status not in ATTENDANCE_STATUSES:
+                results.append({'student_id': student_id, 'saved': False, 'error': 'Некорректный статус'})
+            elif student_id not in existing:
+                results.append({'student_id': student_id, 'saved': False, 'error': 'Студент не найден'})
+            else:
+                rows.append((student_id, day, lesson_number, subject_id, status))
+                results.append({'student_id': student_id, 'saved': True})
+
+        # Все строки ведомости записываются в одной транзакции
+        with conn:
+            conn.executemany("""
+                INSERT INTO attendance
+                (student_id, day, lesson_number, subject_id, status)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(student_id, day, lesson_number)
+                DO UPDATE SET subject_id = excluded.subject_id, status = excluded.status
+            """, rows)
+        if rows:
+            invalidate_statistics([date], {existing[row[0]] for row in rows})
+
+        return jsonify({
+            'message': 'Attendance saved',
+            'saved': len(rows),
+            'failed': len(results) - len(rows),
+            'results': results
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def invalidate_statistics(dates, group_ids):
+    """Удаление из кэша статистики, затронутой отметками за даты в группах"""
+    if stats_cache is not None:
+        stats_cache.invalidate(set(dates), set(group_ids))
+
+def reference_version(conn):
+    """Версия справочников: меняется при любой записи в группы, студентов и предметы"""
+    return conn.execute("SELECT version FROM sync_state WHERE id = 1").fetchone()[0]
+
+def cache_statistics(key, ref_version, generation, rows):
+    if len(rows) <= STATS_CACHE_MAX_ROWS:
+        stats_cache.put(key, ref_version, rows, generation)
+
+def validate_period(start_date, end_date):
+    """Проверка периода статистики (ValueError с текстом для ответа 400)"""
+    if not start_date or not end_date:
+        raise ValueError('Не указан период')
+    day_number(start_date)
+    day_number(end_date)
+
+def statistics_filters():
+    """Период и фильтры статистики из строки запроса.
+
+    Фильтры - целые числа или None (не задан или пустой), по ним строятся
+    и ключ кэша, и запрос. ValueError с текстом для ответа 400.
+    """
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    validate_period(start_date, end_date)
+    numbers = []
+    for name in ('group_id', 'subject_id', 'lesson_number'):
+        try:
+            numbers.append(int_arg(name))
+        except ValueError:
+            raise ValueError(f'{name} должен быть целым числом') from None
+    return (start_date, end_date, *numbers)
+
+def _next_month_start(day):
+    """Первое число месяца, следующего за датой"""
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+def build_statistics_query(start_date, end_date, group_id=None, subject_id=None, lesson_number=None):
+    """Построение запроса статистики посещаемости.
+
+    Без фильтра по номеру пары статистика собирается из сводных таблиц:
+    полные месяцы периода берутся из attendance_monthly, неполные месяцы
+    по краям периода - из attendance_daily. С фильтром по паре (сводные
+    таблицы ее не хранят) запрос идет по исходной таблице attendance.
+    Даты периода - 'YYYY-MM-DD' (ValueError для других значений).
+    """
+    if lesson_number is not None:
+        return build_raw_statistics_query(start_date, end_date, group_id, subject_id, lesson_number)
+    start = DAY_EPOCH + datetime.timedelta(days=day_number(start_date))
+    end = DAY_EPOCH + datetime.timedelta(days=day_number(end_date))
+
+    # Диапазоны сводных таблиц: (таблица, колонка, начало, конец)
+    buckets = []
+    if start <= end:
+        # Первый и последний дни периода, покрытого целыми месяцами
+        first_full = start if start.day == 1 else _next_month_start(start)
+        last_full = end if (end + datetime.timedelta(days=1)).day == 1 \
+            else end.replace(day=1) - datetime.timedelta(days=1)
+        if first_full <= last_full:
+            buckets.append(('attendance_monthly', 'month',
+                            first_full.strftime('%Y-%m'), last_full.strftime('%Y-%m')))
+            if start < first_full:
+                buckets.append(('attendance_daily', 'day',
+                                (start - DAY_EPOCH).days, (first_full - DAY_EPOCH).days - 1))
+            if last_full < end:
+                buckets.append(('attendance_daily', 'day',
+                                (last_full - DAY_EPOCH).days + 1, (end - DAY_EPOCH).days))
+        else:
+            buckets.append(('attendance_daily', 'day', (start - DAY_EPOCH).days, (end - DAY_EPOCH).days))
+
+    params = []
+    parts = []
+    for table, period_column, period_start, period_end in buckets:
+        conditions = [f'{period_column} BETWEEN ? AND ?']
+        params.extend([period_start, period_end])
+        if subject_id is not None:
+            conditions.append('subject_id = ?')
+            params.append(subject_id)
+        if group_id is not None:
+            conditions.append('student_id IN (SELECT id FROM students WHERE group_id = ?)')
+            params.append(group_id)
+        parts.append(f"""
+            SELECT student_id, subject_id, present, late, sick, absent
+            FROM {table}
+            WHERE {' AND '.join(conditions)}
+        """)
+    if not parts:
+        # Пустой период: все счетчики нулевые
+        parts.append("""
+            SELECT NULL as student_id, NULL as subject_id,
+                   0 as present, 0 as late, 0 as sick, 0 as absent
+            WHERE 0
+        """)
+
+    # Студенты с данными берутся из агрегированных сводных таблиц, студенты
+    # без отметок за период добавляются отдельной строкой с нулями
+    # (так же, как LEFT JOIN в запросе по исходной таблице)
+    group_condition = ''
+    if group_id is not None:
+        group_condition = 'AND s.group_id = ?'
+        params.extend([group_id, group_id])
+
+    query = f"""
+        WITH b AS (
+            SELECT student_id, subject_id,
+                   SUM(present) as present, SUM(late) as late,
+                   SUM(sick) as sick, SUM(absent) as absent
+            FROM ({' UNION ALL '.join(parts)})
+            GROUP BY student_id, subject_id
+        )
+        SELECT * FROM (
             SELECT 
                 s.id,
                 s.surname,
                 s.name,
                 g.name as group_name,
                 sub.name as subject_name,
-                SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present,
-                SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late,
-                SUM(CASE WHEN a.status = 'sick' THEN 1 ELSE 0 END) as sick,
-                SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent,
-                COUNT(a.id) as total
-            FROM students s
+                SUM(b.present) as present,
+                SUM(b.late) as late,
+                SUM(b.sick) as sick,
+                SUM(b.absent) as absent,
+                SUM(b.present + b.late + b.sick + b.absent) as total
+            FROM b
+            JOIN students s ON s.id = b.student_id
             JOIN groups g ON g.id = s.group_id
-            LEFT JOIN attendance a ON s.id = a.student_id
-                AND a.date BETWEEN ? AND ?
-                AND (? IS NULL OR a.lesson_number = ?)
-                AND (? IS NULL OR a.subject_id = ?)
-            LEFT JOIN subjects sub ON a.subject_id = sub.id
-            WHERE (? IS NULL OR s.group_id = ?)
+            LEFT JOIN subjects sub ON b.subject_id = sub.id
+            WHERE 1 {group_condition}
             GROUP BY s.id, s.surname, s.name, g.name, sub.name
-            ORDER BY g.name, s.surname, s.name
-        """
-        cursor.execute(query, (
-            start_date, end_date,
-            lesson_number, lesson_number,
-            subject_id, subject_id,
-            group_id, group_id
-        ))
+            UNION ALL
+            SELECT s.id, s.surname, s.name, g.name, NULL, 0, 0, 0, 0, 0
+            FROM students s
+            JOIN groups g ON g.id = s.group_id
+            WHERE s.id NOT IN (SELECT student_id FROM b) {group_condition}
+        )
+        ORDER BY group_name, surname, name
+    """
+    return query, params
+
+def build_raw_statistics_query(start_date, end_date, group_id=None, subject_id=None, lesson_number=None):
+    """Построение запроса статистики по исходной таблице посещаемости.
+
+    Условия добавляются только для заданных фильтров, чтобы SQLite
+    мог использовать индексы по group_id и по посещаемости.
+    """
+    attendance_conditions = ['a.day BETWEEN ? AND ?']
+    params = [day_number(start_date), day_number(end_date)]
+    if lesson_number is not None:
+        attendance_conditions.append('a.lesson_number = ?')
+        params.append(lesson_number)
+    if subject_id is not None:
+        attendance_conditions.append('a.subject_id = ?')
+        params.append(subject_id)
+
+    where = ''
+    if group_id is not None:
+        where = 'WHERE s.group_id = ?'
+        params.append(group_id)
+
+    query = f"""
+        SELECT 
+            s.id,
+            s.surname,
+            s.name,
+            g.name as group_name,
+            sub.name as subject_name,
+            SUM(CASE WHEN a.status = 'present' THEN 1 ELSE 0 END) as present,
+            SUM(CASE WHEN a.status = 'late' THEN 1 ELSE 0 END) as late,
+            SUM(CASE WHEN a.status = 'sick' THEN 1 ELSE 0 END) as sick,
+            SUM(CASE WHEN a.status = 'absent' THEN 1 ELSE 0 END) as absent,
+            COUNT(a.id) as total
+        FROM students s
+        JOIN groups g ON g.id = s.group_id
+        LEFT JOIN attendance a ON s.id = a.student_id
+            AND {' AND '.join(attendance_conditions)}
+        LEFT JOIN subjects sub ON a.subject_id = sub.id
+        {where}
+        GROUP BY s.id, s.surname, s.name, g.name, sub.name
+        ORDER BY g.name, s.surname, s.name
+    """
+    return query, params
+
+@app.route('/api/get_statistics', methods=['GET'])
+def get_statistics():
+    """Статистика посещаемости по студентам и предметам.
+
+    С заголовком Accept: application/x-ndjson ответ передается потоком
+    (по строке JSON на запись), без построения всего списка в памяти.
+    Результаты до STATS_CACHE_MAX_ROWS строк кэшируются (см. stats_cache).
+    Период обязателен: без него, с некорректной датой или фильтром - ответ 400.
+    """
+    try:
+        start_date, end_date, group_id, subject_id, lesson_number = statistics_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        conn = get_db_connection(UNIVERSITY_DB_PATH)
+        key = cache_key(start_date, end_date, group_id, subject_id, lesson_number) if stats_cache else None
+        if key is not None:
+            # Поколение кэша запоминается до запроса: если отметки запишут,
+            # пока он выполняется, результат не попадет в кэш
+            generation = stats_cache.generation()
+            ref_version = reference_version(conn)
+            stats = stats_cache.get(key, ref_version)
+            if stats is not None:
+                return stream_list(stats) if wants_ndjson() else jsonify(stats)
+        cursor = conn.cursor()
+        query, params = build_statistics_query(start_date, end_date, group_id, subject_id, lesson_number)
+        cursor.execute(query, params)
+        if wants_ndjson():
+            if key is None:
+                return stream_rows(cursor, UNIVERSITY_DB_PATH)
+            return stream_rows(cursor, UNIVERSITY_DB_PATH,
+                               functools.partial(cache_statistics, key, ref_version, generation),
+                               STATS_CACHE_MAX_ROWS)
         stats = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        if key is not None:
+            cache_statistics(key, ref_version, generation, stats)
         return jsonify(stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def statistics_summary(conn, start_date, end_date, group_id, subject_id, lesson_number):
+    """Строка с периодом и фильтрами для отчета (как в окне статистики)"""
+    def name(table, row_id):
+        row = conn.execute(f"SELECT name FROM {table} WHERE id = ?", (row_id,)).fetchone() if row_id else None
+        return row['name'] if row else 'Все'
+
+    def day(value):
+        return datetime.date.fromisoformat(value).strftime('%d.%m.%Y')
+
+    return (f"Период: {day(start_date)} - {day(end_date)} | Группа: {name('groups', group_id)} | "
+            f"Предмет: {name('subjects', subject_id)} | "
+            f"Пара: {f'Пара {lesson_number}' if lesson_number else 'Все пары'}")
+
+@app.route('/api/export/statistics.xlsx', methods=['GET'])
+def export_statistics_excel():
+    """Статистика посещаемости файлом Excel (параметры как у get_statistics).
+
+    Книга строится из курсора в режиме constant_memory во временном файле,
+    который передается частями и удаляется после отправки.
+    """
+    try:
+        start_date, end_date, group_id, subject_id, lesson_number = statistics_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        conn = get_db_connection(UNIVERSITY_DB_PATH)
+        summary = statistics_summary(conn, start_date, end_date, group_id, subject_id, lesson_number)
+        query, params = build_statistics_query(start_date, end_date, group_id, subject_id, lesson_number)
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            write_statistics_workbook(path, conn.execute(query, params), summary)
+        except Exception:
+            os.remove(path)
+            raise
+        return send_temporary_file(path, XLSX_MIMETYPE, f'statistics_{start_date}_{end_date}.xlsx')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- Фоновые задания отчетов ---
+
+REPORT_PARAMS = ('start_date', 'end_date', 'group_id', 'subject_id', 'lesson_number', 'period')
+
+def validate_report_params(params):
+    """Проверка параметров отчета: даты (или period) и фильтры get_statistics"""
+    if not isinstance(params, dict):
+        raise ValueError('params должен быть объектом')
+    unknown = set(params) - set(REPORT_PARAMS)
+    if unknown:
+        raise ValueError(f"Неизвестные параметры: {', '.join(sorted(unknown))}")
+    if 'period' not in params:
+        validate_period(params.get('start_date'), params.get('end_date'))
+    for name in ('group_id', 'subject_id', 'lesson_number'):
+        value = params.get(name)
+        if value is not None and (isinstance(value, bool) or not re.fullmatch(r'\d+', str(value))):
+            raise ValueError(f'{name} должен быть целым числом')
+
+def statistics_report_handler(write):
+    """Задание отчета: статистика по параметрам и запись файла функцией write"""
+    def handler(params, path, progress):
+        pool = db_pools[UNIVERSITY_DB_PATH]
+        conn = pool.acquire()
+        try:
+            filters = [params.get(name) for name in REPORT_PARAMS[:5]]
+            summary = statistics_summary(conn, *filters)
+            query, query_params = build_statistics_query(*filters)
+            write(path, conn.execute(query, query_params), summary, progress)
+        finally:
+            pool.release(conn)
+    return handler
+
+report_handlers = {
+    'statistics_xlsx': ('xlsx', statistics_report_handler(
+        lambda path, rows, summary, progress: write_statistics_workbook(path, rows, summary))),
+}
+if render_statistics_pdf is not None:
+    report_handlers['statistics_pdf'] = ('pdf', statistics_report_handler(
+        lambda path, rows, summary, progress: render_statistics_pdf(path, rows, summary, progress=progress)))
+
+job_queue = JobQueue(db_pools[UNIVERSITY_DB_PATH], report_handlers, REPORTS_DIR, workers=JOB_WORKERS,
+                     reuse_seconds=JOB_REUSE_SECONDS, result_ttl=JOB_RESULT_TTL_DAYS * 86400)
+atexit.register(job_queue.stop)
+
+def init_pdf_reports():
+    """Подготовка PDF-отчетов: вызывается в главном потоке процесса, который
+    обрабатывает запросы, до запуска потоков сервера (QGuiApplication нельзя
+    создавать в рабочих потоках)"""
+    if render_statistics_pdf is not None:
+        ensure_gui_application()
+
+@app.before_request
+def start_job_workers():
+    """Потоки заданий запускаются в процессе, который обрабатывает запросы
+    (после fork рабочих процессов gunicorn)"""
+    job_queue.start()
+
+def job_response(job):
+    if job['status'] == 'done':
+        job['result_url'] = url_for('get_job_result', job_id=job['id'])
+    job.pop('result_path', None)
+    return job
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Постановка отчета в очередь: {"kind": "statistics_xlsx", "params": {...}, "force": false}.
+
+    Если такой же отчет уже ждет, строится или недавно построен,
+    возвращается существующее задание (200 вместо 201).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        params = data.get('params') or {}
+        validate_report_params(params)
+        if 'period' in params:
+            params = resolve_period(params, datetime.date.today())
+        job, created = job_queue.submit(data.get('kind'), params, force=bool(data.get('force')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    response = jsonify(job_response(job))
+    response.status_code = 201 if created else 200
+    response.headers['Location'] = url_for('get_job', job_id=job['id'])
+    return response
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    status = request.args.get('status')
+    if status and status not in JOB_STATUSES:
+        return jsonify({'error': f"Недопустимый статус: {status}"}), 400
+    try:
+        limit = min(int_arg('limit') or 50, 500)
+        return jsonify([job_response(job) for job in job_queue.list(status, limit)])
+    except ValueError:
+        return jsonify({'error': 'limit должен быть числом'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = job_queue.get(job_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if job is None:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/api/jobs/<int:job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Файл построенного отчета"""
+    try:
+        job = job_queue.get(job_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if job is None:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Отчет не готов (статус {job['status']})"}), 409
+    if not os.path.exists(job['result_path']):
+        return jsonify({'error': 'Файл отчета удален'}), 410
+    params = job['params']
+    extension = os.path.splitext(job['result_path'])[1]
+    return send_file(job['result_path'], as_attachment=True,
+                     download_name=f"statistics_{params.get('start_date')}_{params.get('end_date')}{extension}")
+
+@app.route('/api/jobs/<int:job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Отмена ожидающего задания или удаление завершенного"""
+    try:
+        job = job_queue.remove(job_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if job is None:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    if job['status'] == 'running':
+        return jsonify({'error': 'Задание уже выполняется'}), 409
+    return jsonify({'message': 'Задание отменено' if job['status'] == 'queued' else 'Задание удалено'})
+
+@app.route('/api/report_schedules', methods=['GET'])
+def list_report_schedules():
+    try:
+        return jsonify(job_queue.list_schedules())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/report_schedules', methods=['POST'])
+def add_report_schedule():
+    """Расписание отчета: {"name": ..., "kind": ..., "params": {"period": "previous_week", ...},
+    "cron": "0 6 * * 1"} - каждый понедельник в 6:00 за прошлую неделю"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('name') or not data.get('cron'):
+        return jsonify({'error': 'Не указаны name или cron'}), 400
+    try:
+        params = data.get('params') or {}
+        validate_report_params(params)
+        schedule = job_queue.add_schedule(data['name'], data.get('kind'), params, data['cron'],
+                                          enabled=bool(data.get('enabled', True)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(schedule), 201
+
+@app.route('/api/report_schedules/<int:schedule_id>', methods=['PUT'])
+def update_report_schedule(schedule_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        if 'params' in data:
+            validate_report_params(data['params'])
+        schedule = job_queue.update_schedule(
+            schedule_id, **{key: data.get(key) for key in ('name', 'kind', 'params', 'cron', 'enabled')})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if schedule is None:
+        return jsonify({'error': 'Расписание не найдено'}), 404
+    return jsonify(schedule)
+
+@app.route('/api/report_schedules/<int:schedule_id>', methods=['DELETE'])
+def delete_report_schedule(schedule_id):
+    try:
+        deleted = job_queue.delete_schedule(schedule_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if not deleted:
+        return jsonify({'error': 'Расписание не найдено'}), 404
+    return jsonify({'message': 'Расписание удалено'})
+
+@app.route('/api/export/statistics.pdf', methods=['GET'])
+def export_statistics_pdf():
+    """Статистика посещаемости PDF-отчетом (параметры как у get_statistics).
+
+    Отчет строится без экрана (QT_QPA_PLATFORM=offscreen) постранично
+    из курсора во временном файле.
+    """
+    if render_statistics_pdf is None:
+        return jsonify({'error': 'PDF-отчеты недоступны: не установлен PyQt5'}), 501
+    try:
+        start_date, end_date, group_id, subject_id, lesson_number = statistics_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        conn = get_db_connection(UNIVERSITY_DB_PATH)
+        summary = statistics_summary(conn, start_date, end_date, group_id, subject_id, lesson_number)
+        query, params = build_statistics_query(start_date, end_date, group_id, subject_id, lesson_number)
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        # Файл удаляется в render_statistics_pdf, если построение не удалось
+        render_statistics_pdf(path, conn.execute(query, params), summary)
+        return send_temporary_file(path, 'application/pdf', f'statistics_{start_date}_{end_date}.pdf')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # --- Пользователи ---
 
 @app.route('/api/get_users', methods=['GET'])
+@conditional_get(USER_DB_PATH, 'users_data', cache_control='private, no-cache')
 def get_users():
     try:
         conn = get_db_connection(USER_DB_PATH)
@@ -524,7 +1898,6 @@ def get_users():
         
         cursor.execute("SELECT username, password, role FROM users_data")
         users = [dict(row) for row in cursor.fetchall()]
-        conn.close()
         
         return jsonify(users)
     except Exception as e:
@@ -546,7 +1919,6 @@ def register():
         
         cursor.execute("SELECT 1 FROM users_data WHERE username=?", (username,))
         if cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Пользователь с таким логином уже существует'}), 400
         
         cursor.execute("""
@@ -555,7 +1927,6 @@ def register():
         """, (username, password, role))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Пользователь успешно создан'}), 201
     except Exception as e:
@@ -570,7 +1941,6 @@ def delete_user(username):
         # Проверяем существование пользователя
         cursor.execute("SELECT 1 FROM users_data WHERE username=?", (username,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({'error': 'Пользователь не найден'}), 404
         
         # Проверяем, не пытаемся ли удалить последнего администратора
@@ -581,12 +1951,10 @@ def delete_user(username):
         user_role = cursor.fetchone()[0]
         
         if admin_count == 1 and user_role == 'admin':
-            conn.close()
             return jsonify({'error': 'Нельзя удалить последнего администратора'}), 400
         
         cursor.execute("DELETE FROM users_data WHERE username=?", (username,))
         conn.commit()
-        conn.close()
         
         return jsonify({'message': 'Пользователь удален'}), 200
     except Exception as e:
@@ -611,7 +1979,6 @@ def auth():
         """, (username, password))
         
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             return jsonify({'role': result['role']})
@@ -620,5 +1987,65 @@ def auth():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# --- Проверка планов запросов ---
+
+def hot_queries():
+    """Горячие запросы API и таблицы (псевдонимы), которые нельзя сканировать целиком"""
+    statistics_query, statistics_params = build_statistics_query('2024-01-01', '2024-01-31', 1, 1, 1)
+    rollup_query, rollup_params = build_statistics_query('2024-01-15', '2024-03-10', 1, 1)
+    return {
+        'get_attendance': ("""
+            SELECT a.student_id, a.status
+            FROM attendance a
+            WHERE a.day = ? AND a.lesson_number = ?
+             AND a.student_id IN (SELECT id FROM students WHERE group_id = ?)
+             AND a.subject_id = ?
+        """, [day_number('2024-01-01'), 1, 1, 1], {'a', 'students'}),
+        'get_statistics': (statistics_query, statistics_params, {'a', 's'}),
+        'get_statistics_rollup': (rollup_query, rollup_params,
+                                  {'s', 'attendance_daily', 'attendance_monthly'}),
+        'get_students_by_group': ("""
+            SELECT s.id, s.surname, s.name, s.middle_name,
+                   s.is_nonresident, g.name as group_name
+            FROM students s
+            JOIN groups g ON s.group_id = g.id
+            WHERE s.group_id = ?
+            ORDER BY s.surname, s.name
+        """, [1], {'s'}),
+        'get_groups': ("""
+            SELECT g.id, g.name, g.course, COUNT(s.id) as students_count
+            FROM groups g
+            LEFT JOIN students s ON s.group_id = g.id
+            GROUP BY g.id
+            ORDER BY g.name
+        """, [], {'s'}),
+        'delete_group_count': ("SELECT COUNT(*) FROM students WHERE group_id=?", [1], {'students'}),
+        'transfer_group': ("UPDATE students SET group_id = ? WHERE group_id = ?", [2, 1], {'students'}),
+    }
+
+def check_query_plans(conn):
+    """EXPLAIN QUERY PLAN для горячих запросов.
+
+    Возвращает {имя запроса: список строк плана с полным сканированием}.
+    Пустые списки означают, что все запросы используют индексы.
+    """
+    problems = {}
+    for name, (query, params, tables) in hot_queries().items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        problems[name] = [
+            detail for detail in plan
+            if (match := re.match(r'SCAN (\w+)', detail)) and match.group(1) in tables
+        ]
+    return problems
+
 if __name__ == '__main__':
+    if '--check-plans' in sys.argv:
+        conn = sqlite3.connect(UNIVERSITY_DB_PATH)
+        full_scans = check_query_plans(conn)
+        conn.close()
+        for name, scans in full_scans.items():
+            print(f"{name}: {'OK' if not scans else '; '.join(scans)}")
+        sys.exit(1 if any(full_scans.values()) else 0)
+    # Отладочный запуск; рабочий режим - run_server.py
+    init_pdf_reports()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""ASGI-вариант сервера посещаемости.
+
+Соединения обслуживает цикл событий, поэтому простаивающие keep-alive
+соединения и частые /api/ping не занимают потоков. /api/ping отвечает
+прямо в цикле событий, остальные маршруты выполняются обработчиками
+servbd (те же адреса и JSON) в ограниченном пуле потоков для работы с SQLite.
+
+Запуск (нужен ASGI-сервер, например uvicorn):
+    uvicorn servbd_asgi:app --host 0.0.0.0 --port 5000
+    DB_EXECUTOR_THREADS=8 python servbd_asgi.py
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import servbd
+
+# Модуль импортируется в главном потоке до запуска цикла событий
+servbd.init_pdf_reports()
+
+# Потоки для запросов к базе (по умолчанию - по числу соединений в пуле)
+DB_EXECUTOR_THREADS = int(os.environ.get('DB_EXECUTOR_THREADS', servbd.DB_POOL_SIZE))
+
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_THREADS, thread_name_prefix='db')
+
+# Частей ответа в очереди на отправку: если клиент читает медленно,
+# поток обработчика ждет, а не накапливает весь ответ в памяти
+RESPONSE_QUEUE_SIZE = 8
+# Как часто ожидающий поток проверяет, не отключился ли клиент (секунды)
+PUSH_CHECK_INTERVAL = 0.5
+
+logger = logging.getLogger(__name__)
+
+# Тот же ответ, что возвращает jsonify в servbd.ping
+PING_BODY = b'{"status":"ok"}\n'
+
+
+def build_environ(scope, body):
+    """WSGI-окружение для запроса ASGI"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ[name] = value
+        elif name == 'CONTENT_LENGTH':
+            # Длина берется по фактически полученному телу
+            continue
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def run_wsgi(environ, loop, queue, disconnected):
+    """Выполнение запроса Flask в потоке пула; части ответа передаются в очередь.
+
+    Очередь ограничена: поток ждет, пока цикл событий отправит предыдущие
+    части. После отключения клиента (событие disconnected) чтение ответа
+    прекращается, а close() ответа освобождает курсор и соединение с базой.
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    def push(message):
+        """Передача части в очередь (False, если клиент уже отключился)"""
+        if disconnected.is_set():
+            return False
+        future = asyncio.run_coroutine_threadsafe(queue.put(message), loop)
+        while True:
+            try:
+                future.result(timeout=PUSH_CHECK_INTERVAL)
+                return True
+            except FutureTimeoutError:
+                if disconnected.is_set():
+                    future.cancel()
+                    return False
+
+    try:
+        result = servbd.app(environ, start_response)
+        try:
+            started = False
+            for chunk in result:
+                if disconnected.is_set():
+                    return
+                if not started:
+                    if not push(('start', response['status'], response['headers'])):
+                        return
+                    started = True
+                if chunk and not push(('body', chunk)):
+                    return
+            if not started:
+                push(('start', response['status'], response['headers']))
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        push(('end',))
+    except Exception as e:
+        push(('error', e))
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return bytes(body)
+
+
+async def send_json(send, body, status=200):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            db_executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    if scope['path'] == '/api/ping' and scope['method'] == 'GET':
+        # Проверка связи не обращается к базе и не занимает поток
+        await send_json(send, PING_BODY)
+        return
+
+    body = await read_body(receive)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=RESPONSE_QUEUE_SIZE)
+    disconnected = threading.Event()
+    loop.run_in_executor(db_executor, run_wsgi, build_environ(scope, body), loop, queue, disconnected)
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # Части ответа (в том числе потоковые) отправляются по мере готовности;
+    # при отключении клиента поток с обработчиком останавливается
+    disconnect = asyncio.ensure_future(wait_disconnect())
+    started = False
+    try:
+        while True:
+            next_message = asyncio.ensure_future(queue.get())
+            await asyncio.wait({next_message, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            # Очередь может быть не пуста, поэтому отключение проверяется первым
+            if disconnect.done():
+                next_message.cancel()
+                return
+            message = next_message.result()
+            if message[0] == 'start':
+                started = True
+                await send({'type': 'http.response.start', 'status': message[1], 'headers': message[2]})
+            elif message[0] == 'body':
+                await send({'type': 'http.response.body', 'body': message[1], 'more_body': True})
+            elif message[0] == 'end':
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            else:
+                logger.error('Ошибка обработки %s', scope['path'], exc_info=message[1])
+                if started:
+                    await send({'type': 'http.response.body', 'body': b''})
+                else:
+                    await send_json(send, json.dumps({'error': str(message[1])}).encode(), status=500)
+                return
+    finally:
+        # Ответ отправлен, клиент отключился или отправка не удалась
+        disconnected.set()
+        disconnect.cancel()
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=os.environ.get('SERVER_HOST', '0.0.0.0'),
+                port=int(os.environ.get('SERVER_PORT', 5000)))
@@ -0,0 +1,245 @@
+"""Кэш результатов статистики посещаемости.
+
+Ключ - фильтры запроса (start_date, end_date, group_id, subject_id,
+lesson_number). Запись хранит версию справочников (sync_state.version),
+при которой получен результат: изменение студентов, групп или предметов
+делает все записи устаревшими. Запись отметок удаляет только записи, в
+период которых попадает дата, а группа совпадает (или не задана).
+
+MemoryStatisticsCache - LRU в памяти процесса, SharedStatisticsCache -
+общий файл SQLite для нескольких процессов сервера.
+"""
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def iso_date(value):
+    """Дата в виде 'YYYY-MM-DD' (fromisoformat принимает и другие записи, например '20250601')"""
+    return datetime.date.fromisoformat(value).isoformat()
+
+
+def cache_key(start_date, end_date, group_id=None, subject_id=None, lesson_number=None):
+    """Ключ кэша; None, если фильтры некорректны (такой запрос не кэшируется).
+
+    Даты приводятся к 'YYYY-MM-DD', чтобы их можно было сравнивать как строки.
+    """
+    try:
+        dates = (iso_date(start_date), iso_date(end_date))
+        numbers = tuple(int(value) if value not in (None, '') else None
+                        for value in (group_id, subject_id, lesson_number))
+    except (TypeError, ValueError):
+        return None
+    return dates + numbers
+
+
+def is_affected(key, dates, group_ids):
+    """Затрагивает ли запись отметок за dates в группах group_ids результат по ключу"""
+    start_date, end_date, group_id = key[:3]
+    return ((group_id is None or group_id in group_ids)
+            and any(start_date <= day <= end_date for day in dates))
+
+
+class CacheCounters:
+    """Счетчики попаданий, промахов и удаленных при инвалидации записей"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._counter_lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def counters(self):
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+
+
+class MemoryStatisticsCache(CacheCounters):
+    """LRU с ограничением времени жизни записей в памяти процесса"""
+
+    def __init__(self, max_entries=256, ttl=300):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def generation(self):
+        """Номер, меняющийся при каждой инвалидации (передается в put)"""
+        return self._generation
+
+    def get(self, key, ref_version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] < time.monotonic() or entry[1] != ref_version):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self.count('hits' if entry is not None else 'misses')
+        return entry[2] if entry is not None else None
+
+    def put(self, key, ref_version, rows, generation):
+        """Сохранение результата, если с начала запроса не было инвалидаций"""
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl, ref_version, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, dates, group_ids):
+        dates = {iso_date(day) for day in dates}
+        with self._lock:
+            self._generation += 1
+            stale = [key for key in self._entries if is_affected(key, dates, group_ids)]
+            for key in stale:
+                del self._entries[key]
+        self.count('invalidations', len(stale))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return dict(self.counters(), backend='memory', entries=size, max_entries=self.max_entries, ttl=self.ttl)
+
+
+class SharedStatisticsCache(CacheCounters):
+    """Кэш в файле SQLite, общий для всех процессов сервера на машине.
+
+    Вытесняются записи, к которым дольше всего не обращались; счетчики
+    попаданий и промахов ведутся в каждом процессе отдельно.
+    """
+
+    # Как часто (в записях) удалять лишние записи
+    PRUNE_EVERY = 32
+
+    def __init__(self, path, max_entries=1024, ttl=300):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._puts = 0
+        conn = self._connection()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stats_cache (
+                    key TEXT PRIMARY KEY,
+                    start_date TEXT NOT NULL,
+                    end_date TEXT NOT NULL,
+                    group_id INTEGER,
+                    ref_version INTEGER NOT NULL,
+                    rows TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_stats_cache_used ON stats_cache(used_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    generation INTEGER NOT NULL
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO cache_state (id, generation) VALUES (1, 0)")
+
+    def reset(self):
+        """Забыть соединения, унаследованные от родительского процесса (после fork)"""
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Содержимое кэша можно потерять, поэтому fsync не нужен
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def generation(self):
+        return self._connection().execute("SELECT generation FROM cache_state WHERE id = 1").fetchone()[0]
+
+    def get(self, key, ref_version):
+        conn = self._connection()
+        key_text = json.dumps(key)
+        row = conn.execute(
+            "SELECT rows FROM stats_cache WHERE key = ? AND ref_version = ? AND expires_at >= ?",
+            (key_text, ref_version, time.time())
+        ).fetchone()
+        if row is None:
+            self.count('misses')
+            return None
+        with conn:
+            conn.execute("UPDATE stats_cache SET used_at = ? WHERE key = ?", (time.time(), key_text))
+        self.count('hits')
+        return json.loads(row[0])
+
+    def put(self, key, ref_version, rows, generation):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            current = conn.execute("SELECT generation FROM cache_state WHERE id = 1").fetchone()[0]
+            if current != generation:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO stats_cache "
+                "(key, start_date, end_date, group_id, ref_version, rows, expires_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (json.dumps(key), key[0], key[1], key[2], ref_version,
+                 json.dumps(rows, ensure_ascii=False), now + self.ttl, now)
+            )
+            self._puts += 1
+            if self._puts % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM stats_cache WHERE expires_at < ?", (now,))
+                conn.execute("""
+                    DELETE FROM stats_cache WHERE key IN (
+                        SELECT key FROM stats_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+        return True
+
+    def invalidate(self, dates, group_ids):
+        dates = sorted({iso_date(day) for day in dates})
+        if not dates:
+            return
+        conn = self._connection()
+        day_condition = ' OR '.join(['(start_date <= ? AND end_date >= ?)'] * len(dates))
+        group_condition = ''
+        params = [value for day in dates for value in (day, day)]
+        if group_ids:
+            group_condition = f" OR group_id IN ({','.join('?' * len(group_ids))})"
+            params += sorted(group_ids)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE cache_state SET generation = generation + 1 WHERE id = 1")
+            removed = conn.execute(
+                f"DELETE FROM stats_cache WHERE ({day_condition}) AND (group_id IS NULL{group_condition})", params
+            ).rowcount
+        self.count('invalidations', removed)
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE cache_state SET generation = generation + 1 WHERE id = 1")
+            conn.execute("DELETE FROM stats_cache")
+
+    def stats(self):
+        size = self._connection().execute("SELECT COUNT(*) FROM stats_cache").fetchone()[0]
+        return dict(self.counters(), backend='shared', entries=size, max_entries=self.max_entries, ttl=self.ttl)
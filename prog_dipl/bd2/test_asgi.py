@@ -0,0 +1,108 @@
+"""Тесты ASGI-варианта сервера: передача ответа частями и отключение клиента"""
+import asyncio
+import importlib
+import os
+import threading
+import types
+
+import pytest
+
+
+@pytest.fixture
+def servbd_asgi(servbd, monkeypatch):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    module = importlib.import_module('servbd_asgi')
+    monkeypatch.setattr(module, 'RESPONSE_QUEUE_SIZE', 2)
+    monkeypatch.setattr(module, 'PUSH_CHECK_INTERVAL', 0.05)
+    return module
+
+
+class SlowResponse:
+    """WSGI-ответ из count частей; считает выданные части и закрытие"""
+
+    def __init__(self, count):
+        self.count = count
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def __call__(self, environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/x-ndjson')])
+        return self
+
+    def __iter__(self):
+        for i in range(self.count):
+            self.produced += 1
+            yield b'{"row":%d}\n' % i
+
+    def close(self):
+        self.closed.set()
+
+
+def scope(path='/api/statistics'):
+    return {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': []}
+
+
+def run_app(servbd_asgi, monkeypatch, response, send, disconnect):
+    """Запрос к приложению ASGI; receive отдает http.disconnect после события disconnect"""
+    monkeypatch.setattr(servbd_asgi, 'servbd', types.SimpleNamespace(app=response))
+
+    async def main():
+        messages = iter([{'type': 'http.request', 'body': b''}])
+
+        async def receive():
+            message = next(messages, None)
+            if message is not None:
+                return message
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        await asyncio.wait_for(servbd_asgi.app(scope(), receive, send), 5)
+
+    asyncio.run(main())
+
+
+def test_response_is_sent_in_order(servbd_asgi, monkeypatch):
+    response = SlowResponse(50)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    run_app(servbd_asgi, monkeypatch, response, send, asyncio.Event())
+    assert sent[0]['status'] == 200
+    assert b''.join(message.get('body', b'') for message in sent[1:]) == b''.join(
+        b'{"row":%d}\n' % i for i in range(50))
+    assert not sent[-1].get('more_body')
+    assert response.closed.wait(1)
+
+
+def test_slow_client_limits_buffered_chunks(servbd_asgi, monkeypatch):
+    response = SlowResponse(1000)
+    produced = []
+
+    async def send(message):
+        if message['type'] == 'http.response.body' and message.get('more_body'):
+            # Клиент не читает ответ: поток обработчика должен остановиться
+            await asyncio.sleep(0.3)
+            produced.append(response.produced)
+            raise ConnectionError('клиент отключился')
+
+    with pytest.raises(ConnectionError):
+        run_app(servbd_asgi, monkeypatch, response, send, asyncio.Event())
+    # Части в очереди, одна в send и одна в ожидающем put
+    assert produced[0] <= servbd_asgi.RESPONSE_QUEUE_SIZE + 3
+    assert response.closed.wait(1)
+    assert response.produced < response.count
+
+
+def test_disconnect_stops_handler(servbd_asgi, monkeypatch):
+    response = SlowResponse(1000)
+
+    async def send(message):
+        await asyncio.sleep(0.01)
+        disconnect.set()
+
+    disconnect = asyncio.Event()
+    run_app(servbd_asgi, monkeypatch, response, send, disconnect)
+    assert response.closed.wait(1)
+    assert response.produced < response.count
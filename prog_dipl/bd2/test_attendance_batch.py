@@ -0,0 +1,69 @@
+"""Тесты пакетного сохранения посещаемости (/api/attendance/batch)"""
+import pytest
+
+from conftest import connect
+
+
+def lesson_rows(servbd, date, lesson_number):
+    conn = connect(servbd.UNIVERSITY_DB_PATH)
+    try:
+        return [tuple(row) for row in conn.execute(
+            "SELECT student_id, date, subject_id, status, typeof(lesson_number) FROM attendance "
+            "WHERE day = ? AND lesson_number = ?", (servbd.day_number(date), lesson_number))]
+    finally:
+        conn.close()
+
+
+def test_attendance_batch_reports_row_errors(servbd, client):
+    response = client.post('/api/attendance/batch', json={
+        'date': '2025-06-02',
+        'lesson_number': 1,
+        'subject_id': 8,
+        'records': [
+            {'student_id': 2, 'status': 'late'},
+            {'student_id': 2, 'status': 'unknown'},
+            {'student_id': 999999, 'status': 'present'},
+            'не запись',
+            {'student_id': [2], 'status': 'present'},
+            {'student_id': {'id': 2}, 'status': 'present'},
+            {'student_id': '2', 'status': 'present'},
+        ],
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['saved'], body['failed']) == (1, 6)
+    assert [row['saved'] for row in body['results']] == [True] + [False] * 6
+    assert body['results'][1]['error'] == 'Некорректный статус'
+    assert body['results'][2]['error'] == 'Студент не найден'
+    assert {row['error'] for row in body['results'][3:]} == {'Некорректный студент'}
+    assert lesson_rows(servbd, '2025-06-02', 1) == [(2, '2025-06-02', 8, 'late', 'integer')]
+
+
+@pytest.mark.parametrize('body', [
+    [{'student_id': 2, 'status': 'late'}],
+    'строка',
+    {'date': '2025-06-02', 'lesson_number': 1},
+    {'date': '02.06.2025', 'lesson_number': 1, 'records': []},
+    {'date': '2025-06-02', 'lesson_number': 'x', 'records': [{'student_id': 2, 'status': 'late'}]},
+    {'date': '2025-06-02', 'lesson_number': 0, 'records': []},
+    {'date': '2025-06-02', 'lesson_number': -1, 'records': []},
+    {'date': '2025-06-02', 'lesson_number': 1.5, 'records': []},
+    {'date': '2025-06-02', 'lesson_number': True, 'records': []},
+    {'date': '2025-06-02', 'lesson_number': 2, 'subject_id': 'x', 'records': []},
+    {'date': '2025-06-02', 'lesson_number': 2, 'subject_id': [8], 'records': []},
+])
+def test_attendance_batch_rejects_request(servbd, client, body):
+    response = client.post('/api/attendance/batch', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert lesson_rows(servbd, '2025-06-02', 2) == []
+
+
+def test_attendance_batch_updates_existing_marks(servbd, client):
+    records = [{'student_id': 2, 'status': 'absent'}]
+    for status in ('absent', 'sick'):
+        records[0]['status'] = status
+        response = client.post('/api/attendance/batch', json={
+            'date': '2025-06-03', 'lesson_number': 3, 'records': records})
+        assert response.get_json()['saved'] == 1
+    assert lesson_rows(servbd, '2025-06-03', 3) == [(2, '2025-06-03', None, 'sick', 'integer')]
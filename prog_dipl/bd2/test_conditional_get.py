@@ -0,0 +1,42 @@
+"""Тесты условных GET-запросов справочников (ETag и ответ 304)"""
+import pytest
+
+
+@pytest.mark.parametrize('url', ['/api/get_universities', '/api/get_students/2', '/api/subjects', '/api/get_users'])
+def test_matching_etag_returns_not_modified(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert 'no-cache' in response.headers['Cache-Control']
+
+    cached = client.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == etag
+
+    assert client.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_write_changes_etag(client):
+    etag = client.get('/api/subjects').headers['ETag']
+    assert client.get('/api/get_universities', headers={'If-None-Match': etag}).status_code == 200
+
+    response = client.post('/api/subjects/add', json={'name': 'Предмет ETag'})
+    assert response.status_code == 201
+    changed = client.get('/api/subjects', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert 'Предмет ETag' in [subject['name'] for subject in changed.get_json()]
+
+    # Изменение предметов не меняет ETag групп
+    groups_etag = client.get('/api/get_universities').headers['ETag']
+    client.put(f"/api/subjects/{response.get_json()['id']}", json={'name': 'Предмет ETag 2'})
+    assert client.get('/api/get_universities', headers={'If-None-Match': groups_etag}).status_code == 304
+
+
+def test_etag_depends_on_representation(client):
+    plain = client.get('/api/subjects').headers['ETag']
+    columnar = client.get('/api/subjects', headers={'Accept': 'application/x-columnar+json'})
+    assert columnar.headers['ETag'] != plain
+    assert client.get('/api/subjects', headers={'If-None-Match': plain,
+                                                'Accept': 'application/x-columnar+json'}).status_code == 200
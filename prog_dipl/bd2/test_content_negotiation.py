@@ -0,0 +1,61 @@
+"""Тесты форматов ответа (Accept) и сжатия (Accept-Encoding)"""
+import gzip
+import json
+import zlib
+
+import pytest
+
+from conftest import connect
+
+
+@pytest.fixture(scope='module')
+def subjects(servbd):
+    """Список предметов больше порога сжатия"""
+    conn = connect(servbd.UNIVERSITY_DB_PATH)
+    try:
+        with conn:
+            conn.executemany("INSERT INTO subjects (name, description) VALUES (?, ?)",
+                             [(f'Формат {i}', 'Описание предмета ' * 3) for i in range(40)])
+    finally:
+        conn.close()
+    return servbd.app.test_client().get('/api/subjects').get_json()
+
+
+def test_columnar_format(servbd, client, subjects):
+    response = client.get('/api/subjects', headers={'Accept': servbd.COLUMNAR_MIMETYPE})
+    assert response.mimetype == servbd.COLUMNAR_MIMETYPE
+    body = json.loads(response.data)
+    assert body['columns'] == ['id', 'name', 'description']
+    rows = [dict(zip(body['columns'], values)) for values in zip(*body['data'])]
+    assert rows == subjects
+    assert 'Accept' in response.vary
+
+
+def test_columnar_format_keeps_objects(servbd, client):
+    response = client.get('/api/ping', headers={'Accept': servbd.COLUMNAR_MIMETYPE})
+    assert response.get_json() == {'status': 'ok'}
+
+
+@pytest.mark.parametrize('encoding, decompress', [('gzip', gzip.decompress), ('deflate', zlib.decompress)])
+def test_large_response_is_compressed(client, subjects, encoding, decompress):
+    response = client.get('/api/subjects', headers={'Accept-Encoding': encoding})
+    assert response.headers['Content-Encoding'] == encoding
+    assert json.loads(decompress(response.data)) == subjects
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_small_response_is_not_compressed(client):
+    response = client.get('/api/ping', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == {'status': 'ok'}
+
+
+def test_msgpack_format(servbd, client, subjects):
+    response = client.get('/api/subjects', headers={'Accept': servbd.MSGPACK_MIMETYPE})
+    if servbd.msgpack is None:
+        # Без пакета msgpack сервер отвечает JSON
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == subjects
+    else:
+        assert response.mimetype == servbd.MSGPACK_MIMETYPE
+        assert servbd.msgpack.unpackb(response.data) == subjects
@@ -0,0 +1,57 @@
+"""Тесты хранения дат посещаемости номерами дней (миграция 7)"""
+import datetime
+
+import pytest
+
+from conftest import connect, make_university_db
+
+
+def test_day_number_migration_round_trip(servbd, tmp_path):
+    path = str(tmp_path / 'university.db')
+    before = [m for m in servbd.UNIVERSITY_MIGRATIONS if m[0] < 7]
+    assert 7 not in make_university_db(servbd, path, before)
+
+    dates = ['1970-01-01', '1999-12-31', '2024-02-29', '2025-01-31', '2025-02-01']
+    conn = connect(path)
+    with conn:
+        conn.executemany("INSERT INTO attendance (student_id, date, lesson_number, subject_id, status) "
+                         "VALUES (2, ?, 1, 8, 'late')", [(date,) for date in dates])
+        deleted = conn.execute("INSERT INTO attendance (student_id, date, lesson_number, status) "
+                               "VALUES (2, '2025-06-01', 1, 'absent')").lastrowid
+        conn.execute("DELETE FROM attendance WHERE id = ?", (deleted,))
+    expected = [tuple(row) for row in conn.execute(
+        "SELECT id, student_id, date, lesson_number, subject_id, status FROM attendance ORDER BY id")]
+    conn.close()
+
+    assert servbd.run_migrations(path, servbd.UNIVERSITY_MIGRATIONS) == [7]
+    conn = connect(path)
+    try:
+        migrated = conn.execute(
+            "SELECT id, student_id, date, lesson_number, subject_id, status, day FROM attendance ORDER BY id"
+        ).fetchall()
+        assert [tuple(row)[:6] for row in migrated] == expected
+        assert all(row['day'] == servbd.day_number(row['date']) for row in migrated)
+        # id удаленной до миграции строки повторно не выдается
+        with conn:
+            new_id = conn.execute("INSERT INTO attendance (student_id, day, lesson_number, status) "
+                                  "VALUES (2, ?, 2, 'present')", (servbd.day_number('2025-06-02'),)).lastrowid
+        assert new_id > deleted
+        # Сводные таблицы перестроены по номерам дней
+        daily = dict(conn.execute("SELECT day, SUM(present + late + sick + absent) FROM attendance_daily "
+                                  "GROUP BY day"))
+        counts = dict(conn.execute("SELECT day, COUNT(*) FROM attendance GROUP BY day"))
+        assert daily == counts
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('value', ['1970-01-01', '2024-02-29', '2025-12-31'])
+def test_day_number_round_trip(servbd, value):
+    day = servbd.day_number(value)
+    assert (servbd.DAY_EPOCH + datetime.timedelta(days=day)).isoformat() == value
+
+
+@pytest.mark.parametrize('value', ['', None, '31.12.2025', '2025-02-30'])
+def test_day_number_rejects_bad_dates(servbd, value):
+    with pytest.raises(ValueError, match='Некорректная дата'):
+        servbd.day_number(value)
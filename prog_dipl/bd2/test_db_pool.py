@@ -0,0 +1,73 @@
+"""Тесты пула соединений SQLite и его использования в запросах сервера"""
+import sqlite3
+import threading
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2, timeout=0.2,
+                          pragmas={'journal_mode': 'WAL', 'busy_timeout': 1000})
+    yield pool
+    pool.close_all()
+
+
+def test_connections_are_reused_and_configured(pool):
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert isinstance(conn.execute("SELECT 1 AS one").fetchone(), sqlite3.Row)
+    pool.release(conn)
+    assert pool.acquire() is conn
+    stats = pool.stats()
+    assert (stats['created'], stats['checkouts'], stats['in_use']) == (1, 2, 1)
+
+
+def test_exhausted_pool_times_out(pool):
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    stats = pool.stats()
+    assert (stats['size'], stats['waits'], stats['timeouts']) == (2, 1, 1)
+    for conn in held:
+        pool.release(conn)
+
+
+def test_waiting_thread_gets_released_connection(pool):
+    held = [pool.acquire(), pool.acquire()]
+    result = {}
+    waiter = threading.Thread(target=lambda: result.setdefault('conn', pool.acquire()))
+    waiter.start()
+    pool.release(held[0])
+    waiter.join(1)
+    assert result['conn'] is held[0]
+    assert pool.stats()['timeouts'] == 0
+
+
+def test_release_rolls_back_and_broken_connection_is_replaced(pool):
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    pool.release(conn)
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    conn.close()
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert pool.stats()['discarded'] == 1
+
+
+def test_request_connections_return_to_pool(servbd, client):
+    university = servbd.db_pools[servbd.UNIVERSITY_DB_PATH]
+    before = university.stats()
+    for _ in range(5):
+        assert client.get('/api/get_universities').status_code == 200
+    after = university.stats()
+    assert after['checkouts'] - before['checkouts'] == 5
+    assert after['in_use'] == 0
+    assert after['created'] - before['created'] <= 1
+    assert {item['db'] for item in client.get('/api/pool_stats').get_json()} == set(servbd.db_pools)
@@ -0,0 +1,136 @@
+"""Тесты фоновых заданий отчетов (/api/jobs, /api/report_schedules)"""
+import datetime
+import os
+
+import pytest
+
+from jobs import CronSchedule, resolve_period
+
+
+def run_queued_jobs(servbd):
+    """Выполнение ожидающих заданий в текущем потоке (в тестах JOB_WORKERS=0)"""
+    while (job := servbd.job_queue._claim()) is not None:
+        servbd.job_queue._run(job)
+
+
+def submit(client, params, kind='statistics_xlsx', **extra):
+    return client.post('/api/jobs', json=dict({'kind': kind, 'params': params}, **extra))
+
+
+@pytest.mark.parametrize('body', [
+    {'kind': 'statistics_xlsx', 'params': {'start_date': '2025-05-01', 'end_date': '2025-05-31', 'group_id': 'abc'}},
+    {'kind': 'statistics_xlsx', 'params': {'start_date': '2025-05-01', 'end_date': '2025-05-31', 'group_id': True}},
+    {'kind': 'statistics_xlsx', 'params': {'start_date': '2025-05-01'}},
+    {'kind': 'statistics_xlsx', 'params': {'start_date': '2025-05-01', 'end_date': '2025-05-31', 'sort': 'name'}},
+    {'kind': 'statistics_xlsx', 'params': ['2025-05-01']},
+    {'kind': 'statistics_xlsx', 'params': {'period': 'next_year'}},
+    {'kind': 'statistics_doc', 'params': {'start_date': '2025-05-01', 'end_date': '2025-05-31'}},
+])
+def test_invalid_job_is_rejected(client, body):
+    response = client.post('/api/jobs', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_job_lifecycle(servbd, client):
+    params = {'start_date': '2025-05-01', 'end_date': '2025-05-31', 'group_id': 2}
+    response = submit(client, params)
+    assert response.status_code == 201
+    job = response.get_json()
+    assert job['status'] == 'queued'
+    assert response.headers['Location'].endswith(f"/api/jobs/{job['id']}")
+
+    # Такой же отчет не ставится повторно, пока он ждет или недавно построен
+    repeated = submit(client, params)
+    assert (repeated.status_code, repeated.get_json()['id']) == (200, job['id'])
+    assert client.get(f"/api/jobs/{job['id']}/result").status_code == 409
+
+    run_queued_jobs(servbd)
+    done = client.get(f"/api/jobs/{job['id']}").get_json()
+    assert done['status'] == 'done'
+    assert 'result_path' not in done
+    assert submit(client, params).get_json()['id'] == job['id']
+
+    result = client.get(done['result_url'], buffered=True)
+    assert result.status_code == 200
+    assert result.data[:2] == b'PK'
+    assert 'statistics_2025-05-01_2025-05-31.xlsx' in result.headers['Content-Disposition']
+    assert job['id'] in [item['id'] for item in client.get('/api/jobs?status=done').get_json()]
+
+    path = servbd.job_queue.get(job['id'])['result_path']
+    assert client.delete(f"/api/jobs/{job['id']}").get_json()['message'] == 'Задание удалено'
+    assert not os.path.exists(path)
+    assert client.get(f"/api/jobs/{job['id']}").status_code == 404
+    assert client.delete(f"/api/jobs/{job['id']}").status_code == 404
+
+
+def test_force_and_cancel(servbd, client):
+    params = {'start_date': '2025-06-01', 'end_date': '2025-06-30'}
+    first = submit(client, params).get_json()
+    forced = submit(client, params, force=True)
+    assert forced.status_code == 201
+    assert forced.get_json()['id'] != first['id']
+    for job in (first, forced.get_json()):
+        assert client.delete(f"/api/jobs/{job['id']}").get_json()['message'] == 'Задание отменено'
+        assert client.get(f"/api/jobs/{job['id']}").get_json()['status'] == 'cancelled'
+
+
+def test_failed_job_reports_error(servbd, client):
+    job = submit(client, {'start_date': '2025-07-01', 'end_date': '2025-07-31', 'subject_id': 8}).get_json()
+    servbd.job_queue._mark_failed(job['id'], ValueError('Диск заполнен'))
+    failed = client.get(f"/api/jobs/{job['id']}").get_json()
+    assert (failed['status'], failed['error']) == ('failed', 'Диск заполнен')
+
+
+def test_list_jobs_validation(client):
+    assert client.get('/api/jobs?status=lost').status_code == 400
+    assert client.get('/api/jobs?limit=x').status_code == 400
+
+
+def test_report_schedule(servbd, client):
+    response = client.post('/api/report_schedules', json={
+        'name': 'Неделя', 'kind': 'statistics_xlsx', 'params': {'period': 'previous_week', 'group_id': 2},
+        'cron': '0 6 * * 1'})
+    assert response.status_code == 201
+    schedule = response.get_json()
+    assert schedule['id'] in [item['id'] for item in client.get('/api/report_schedules').get_json()]
+
+    now = datetime.datetime(2031, 3, 12, 9, 30)  # Среда
+    jobs = servbd.job_queue.run_due_schedules(now)
+    job = next(job for job in jobs if job['schedule_id'] == schedule['id'])
+    assert job['params'] == {'start_date': '2031-03-03', 'end_date': '2031-03-09', 'group_id': 2}
+    # Следующий запуск - в следующий понедельник
+    assert not any(job['schedule_id'] == schedule['id'] for job in servbd.job_queue.run_due_schedules(now))
+    client.delete(f"/api/jobs/{job['id']}")
+
+    assert client.put(f"/api/report_schedules/{schedule['id']}", json={'cron': '61 * * * *'}).status_code == 400
+    updated = client.put(f"/api/report_schedules/{schedule['id']}", json={'enabled': False})
+    assert updated.status_code == 200
+    assert client.delete(f"/api/report_schedules/{schedule['id']}").status_code == 200
+    assert client.delete(f"/api/report_schedules/{schedule['id']}").status_code == 404
+
+
+@pytest.mark.parametrize('body', [
+    {'kind': 'statistics_xlsx', 'params': {'period': 'previous_day'}, 'cron': '0 6 * * 1'},
+    {'name': 'Нет', 'kind': 'statistics_xlsx', 'params': {'period': 'previous_day'}, 'cron': '0 6 * *'},
+    {'name': 'Нет', 'kind': 'statistics_xlsx', 'params': {'period': 'previous_day', 'lesson_number': 'x'},
+     'cron': '0 6 * * 1'},
+])
+def test_invalid_schedule_is_rejected(client, body):
+    assert client.post('/api/report_schedules', json=body).status_code == 400
+
+
+def test_cron_schedule_next_run():
+    schedule = CronSchedule('*/15 8-9 * * 1-5')
+    assert schedule.next_after(datetime.datetime(2025, 6, 6, 9, 50)) == datetime.datetime(2025, 6, 9, 8, 0)
+    assert schedule.next_after(datetime.datetime(2025, 6, 9, 8, 0)) == datetime.datetime(2025, 6, 9, 8, 15)
+
+
+@pytest.mark.parametrize('period, expected', [
+    ('previous_day', ('2025-06-10', '2025-06-10')),
+    ('previous_week', ('2025-06-02', '2025-06-08')),
+    ('previous_month', ('2025-05-01', '2025-05-31')),
+])
+def test_resolve_period(period, expected):
+    params = resolve_period({'period': period, 'group_id': 2}, datetime.date(2025, 6, 11))
+    assert params == {'start_date': expected[0], 'end_date': expected[1], 'group_id': 2}
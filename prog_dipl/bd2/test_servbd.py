@@ -0,0 +1,19 @@
+"""Тесты схемы: горячие запросы после миграций используют индексы.
+
+Запуск: python -m pytest prog_dipl/bd2 (фикстуры - в conftest.py)
+"""
+import sqlite3
+
+from conftest import make_university_db
+
+
+def test_hot_queries_use_indexes(servbd, tmp_path):
+    path = str(tmp_path / 'university.db')
+    make_university_db(servbd, path, servbd.UNIVERSITY_MIGRATIONS)
+    conn = sqlite3.connect(path)
+    try:
+        problems = servbd.check_query_plans(conn)
+    finally:
+        conn.close()
+    assert set(problems) == set(servbd.hot_queries())
+    assert not any(problems.values()), problems
@@ -0,0 +1,78 @@
+"""Тесты сводных таблиц посещаемости (attendance_daily, attendance_monthly)"""
+import datetime
+
+import pytest
+
+from conftest import connect, fill_attendance, make_university_db
+
+
+@pytest.mark.parametrize('start_date, end_date, filters', [
+    ('2025-01-01', '2025-03-31', {}),
+    ('2025-01-15', '2025-03-10', {}),
+    ('2025-02-01', '2025-02-28', {'group_id': 11}),
+    ('2025-01-20', '2025-02-05', {'subject_id': 21}),
+    ('2025-02-10', '2025-03-20', {'group_id': 12, 'subject_id': 20}),
+    ('2025-02-14', '2025-02-14', {}),
+    ('2025-03-01', '2025-02-01', {}),
+    ('2024-06-01', '2024-06-30', {'group_id': 10}),
+])
+def test_rollup_statistics_match_raw(servbd, tmp_path, start_date, end_date, filters):
+    path = str(tmp_path / 'university.db')
+    make_university_db(servbd, path, servbd.UNIVERSITY_MIGRATIONS)
+    conn = connect(path)
+    try:
+        fill_attendance(conn, servbd, datetime.date(2025, 1, 10), 75)
+        query, params = servbd.build_statistics_query(start_date, end_date, **filters)
+        rollup = [dict(row) for row in conn.execute(query, params)]
+        query, params = servbd.build_raw_statistics_query(start_date, end_date, **filters)
+        raw = [dict(row) for row in conn.execute(query, params)]
+    finally:
+        conn.close()
+
+    def key(row):
+        return row['group_name'], row['surname'], row['name'], row['id'], row['subject_name'] or ''
+    assert sorted(rollup, key=key) == sorted(raw, key=key)
+    assert raw
+
+
+def rollup_totals(conn):
+    """Счетчики сводных таблиц и те же счетчики, посчитанные по исходной таблице"""
+    totals = {}
+    for table, period in (('attendance_daily', 'day'),
+                          ('attendance_monthly', "strftime('%Y-%m', day * 86400, 'unixepoch')")):
+        rolled = conn.execute(f"""
+            SELECT {'day' if table == 'attendance_daily' else 'month'}, student_id, subject_id,
+                   present, late, sick, absent
+            FROM {table} ORDER BY 1, 2, 3
+        """).fetchall()
+        raw = conn.execute(f"""
+            SELECT {period}, student_id, COALESCE(subject_id, 0),
+                   SUM(status = 'present'), SUM(status = 'late'), SUM(status = 'sick'), SUM(status = 'absent')
+            FROM attendance GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+        """).fetchall()
+        totals[table] = ([tuple(row) for row in rolled], [tuple(row) for row in raw])
+    return totals
+
+
+def test_rollups_follow_attendance_changes(servbd, tmp_path):
+    path = str(tmp_path / 'university.db')
+    make_university_db(servbd, path, servbd.UNIVERSITY_MIGRATIONS)
+    conn = connect(path)
+    try:
+        fill_attendance(conn, servbd, datetime.date(2025, 1, 25), 20)
+        with conn:
+            conn.execute("UPDATE attendance SET status = 'absent' WHERE id % 3 = 0")
+            conn.execute("UPDATE attendance SET subject_id = 21 WHERE id % 5 = 0")
+            conn.execute("UPDATE attendance SET day = day + 10 WHERE id % 7 = 0 "
+                         "AND NOT EXISTS (SELECT 1 FROM attendance o WHERE o.student_id = attendance.student_id "
+                         "AND o.day = attendance.day + 10 AND o.lesson_number = attendance.lesson_number)")
+            conn.execute("DELETE FROM attendance WHERE id % 4 = 0")
+        for table, (rolled, raw) in rollup_totals(conn).items():
+            assert rolled == raw, table
+        # Строки с нулевыми счетчиками удаляются вместе с последней отметкой
+        with conn:
+            conn.execute("DELETE FROM attendance")
+        assert conn.execute("SELECT COUNT(*) FROM attendance_daily").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM attendance_monthly").fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,72 @@
+"""Тесты кэша статистики (get_statistics с включенным stats_cache)"""
+import pytest
+
+from stats_cache import MemoryStatisticsCache, SharedStatisticsCache
+
+PERIOD = {'start_date': '2025-05-01', 'end_date': '2025-07-31'}
+
+
+@pytest.fixture(params=['memory', 'shared'])
+def cache(servbd, monkeypatch, tmp_path, request):
+    if request.param == 'memory':
+        cache = MemoryStatisticsCache()
+    else:
+        cache = SharedStatisticsCache(str(tmp_path / 'stats_cache.db'))
+    monkeypatch.setattr(servbd, 'stats_cache', cache)
+    return cache
+
+
+def statistics(client, **filters):
+    response = client.get('/api/get_statistics', query_string=dict(PERIOD, **filters))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def uncached(servbd, client, monkeypatch, **filters):
+    with monkeypatch.context() as patch:
+        patch.setattr(servbd, 'stats_cache', None)
+        return statistics(client, **filters)
+
+
+def test_repeated_request_is_served_from_cache(servbd, client, cache):
+    first = statistics(client)
+    assert first
+    assert statistics(client) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize('name', ['group_id', 'subject_id', 'lesson_number'])
+def test_empty_filter_shares_unfiltered_result(servbd, client, monkeypatch, cache, name):
+    expected = uncached(servbd, client, monkeypatch)
+    assert statistics(client, **{name: ''}) == expected
+    assert statistics(client) == expected
+    assert cache.hits == 1
+
+
+def test_filtered_results_are_cached_separately(servbd, client, monkeypatch, cache):
+    for filters in ({'group_id': '2'}, {'lesson_number': '1'}, {'subject_id': '8'}, {}):
+        assert statistics(client, **filters) == uncached(servbd, client, monkeypatch, **filters)
+    assert cache.hits == 0
+    assert statistics(client, group_id=' 2') == statistics(client, group_id='2')
+
+
+@pytest.mark.parametrize('filters', [{'group_id': 'abc'}, {'subject_id': '1.5'}, {'lesson_number': 'x'}])
+def test_bad_filter_is_rejected(servbd, client, cache, filters):
+    response = client.get('/api/get_statistics', query_string=dict(PERIOD, **filters))
+    assert response.status_code == 400
+    assert 'должен быть целым числом' in response.get_json()['error']
+    assert cache.misses == 0
+
+
+def test_saving_attendance_invalidates_cache(servbd, client, monkeypatch, cache):
+    before = statistics(client, group_id='2')
+    statistics(client, group_id='2')
+    # Для каждого вида кэша - новая отметка (база общая для всех тестов)
+    date = '2025-07-15' if isinstance(cache, MemoryStatisticsCache) else '2025-07-16'
+    response = client.post('/api/attendance/batch', json={
+        'date': date, 'lesson_number': 4, 'records': [{'student_id': 2, 'status': 'sick'}]})
+    assert response.get_json()['saved'] == 1
+    after = statistics(client, group_id='2')
+    assert after != before
+    assert after == uncached(servbd, client, monkeypatch, group_id='2')
+    assert cache.invalidations >= 1
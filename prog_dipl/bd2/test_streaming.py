@@ -0,0 +1,52 @@
+"""Тесты потоковой передачи статистики (NDJSON)"""
+import gzip
+import json
+
+import pytest
+
+PERIOD = {'start_date': '2025-01-01', 'end_date': '2025-12-31'}
+NDJSON = {'Accept': 'application/x-ndjson'}
+
+
+def ndjson_rows(data):
+    lines = data.decode().splitlines()
+    assert all(lines)
+    return [json.loads(line) for line in lines]
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 500])
+def test_ndjson_matches_json(servbd, client, monkeypatch, batch_size):
+    monkeypatch.setattr(servbd, 'STREAM_BATCH_SIZE', batch_size)
+    expected = client.get('/api/get_statistics', query_string=PERIOD).get_json()
+    assert expected
+
+    # buffered: тестовый клиент читает и закрывает ответ, как сервер WSGI
+    response = client.get('/api/get_statistics', query_string=PERIOD, headers=NDJSON, buffered=True)
+    assert response.status_code == 200
+    assert response.mimetype == servbd.NDJSON_MIMETYPE
+    assert ndjson_rows(response.data) == expected
+
+
+def test_ndjson_is_compressed_on_the_fly(servbd, client):
+    expected = client.get('/api/get_statistics', query_string=PERIOD).get_json()
+    response = client.get('/api/get_statistics', query_string=PERIOD, buffered=True,
+                          headers=dict(NDJSON, **{'Accept-Encoding': 'gzip'}))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert ndjson_rows(gzip.decompress(response.data)) == expected
+
+
+def test_stream_returns_connection_to_pool(servbd, client):
+    pool = servbd.db_pools[servbd.UNIVERSITY_DB_PATH]
+    in_use = pool.stats()['in_use']
+    # Соединение занято, пока ответ передается, даже если клиент не дочитал его
+    response = client.get('/api/get_statistics', query_string=PERIOD, headers=NDJSON)
+    assert pool.stats()['in_use'] == in_use + 1
+    next(iter(response.response))
+    response.close()
+    assert pool.stats()['in_use'] == in_use
+
+
+def test_ndjson_request_errors_are_json(client):
+    response = client.get('/api/get_statistics', query_string={'start_date': '2025-01-01'}, headers=NDJSON)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
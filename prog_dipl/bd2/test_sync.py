@@ -0,0 +1,50 @@
+"""Тесты синхронизации справочников (/api/sync)"""
+from conftest import connect
+
+
+def sync(client, since):
+    response = client.get('/api/sync', query_string={'since': since})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_sync_from_zero_returns_all_rows(servbd, client):
+    body = sync(client, 0)
+    assert not body['full']
+    conn = connect(servbd.UNIVERSITY_DB_PATH)
+    try:
+        for table in servbd.SYNC_TABLES:
+            ids = [row[0] for row in conn.execute(f"SELECT id FROM {table} ORDER BY id")]
+            assert [row['id'] for row in body['changes'][table]['inserted']] == ids
+            assert body['changes'][table]['updated'] == body['changes'][table]['deleted'] == []
+    finally:
+        conn.close()
+
+
+def test_sync_returns_only_changes(servbd, client):
+    version = sync(client, 0)['version']
+    assert all(not any(changes.values()) for changes in sync(client, version)['changes'].values())
+
+    response = client.post('/api/add_group', json={'name': 'СИНХ-1', 'course': 2})
+    group_id = response.get_json()['id']
+    body = sync(client, version)
+    assert body['version'] > version
+    assert body['changes']['groups']['inserted'] == [{'id': group_id, 'name': 'СИНХ-1', 'course': 2}]
+    assert body['changes']['students'] == {'inserted': [], 'updated': [], 'deleted': []}
+
+    version = body['version']
+    assert client.delete(f'/api/delete_group/{group_id}').status_code == 200
+    body = sync(client, version)
+    assert body['changes']['groups'] == {'inserted': [], 'updated': [], 'deleted': [group_id]}
+
+
+def test_sync_after_newer_version_returns_everything(client):
+    current = sync(client, 0)
+    body = sync(client, current['version'] + 100)
+    assert body['full']
+    assert body['changes'] == current['changes']
+
+
+def test_sync_rejects_bad_version(client):
+    for since in ('abc', '-1'):
+        assert client.get('/api/sync', query_string={'since': since}).status_code == 400
@@ -0,0 +1,198 @@
+"""Локальный кэш клиента и очередь отложенной записи посещаемости"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from api_client import RequestRejected
+
+CACHE_PATH = os.environ.get(
+    'ATTENDANCE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.attendance_cache.db')
+)
+# Сколько последних открытых ведомостей хранить в кэше
+SHEETS_LIMIT = 50
+# Размер пачки при отправке очереди на сервер
+OUTBOX_BATCH_SIZE = 200
+
+
+class LocalCache:
+    """Справочники, ведомости и очередь изменений в локальной базе SQLite.
+
+    Доступ к базе идет из потока интерфейса и из рабочих потоков,
+    поэтому используется одно соединение под блокировкой.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # base_status - статус на сервере в момент правки (для поиска конфликтов)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    lesson_number INTEGER NOT NULL,
+                    subject_id INTEGER,
+                    status TEXT NOT NULL,
+                    base_status TEXT,
+                    created_at REAL NOT NULL,
+                    UNIQUE(student_id, date, lesson_number)
+                )
+            """)
+
+    # --- Справочники и ведомости ---
+
+    @staticmethod
+    def sheet_key(date, lesson_number, group_id=None, subject_id=None):
+        return f'sheet:{date}:{lesson_number}:{group_id or ""}:{subject_id or ""}'
+
+    def get(self, key):
+        """Сохраненный ответ сервера или None"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def put(self, key, data):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO cache_entries (key, data, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+            """, (key, json.dumps(data, ensure_ascii=False), time.time()))
+            if key.startswith('sheet:'):
+                # Храним только последние открытые ведомости
+                self._conn.execute("""
+                    DELETE FROM cache_entries
+                    WHERE key LIKE 'sheet:%' AND key NOT IN (
+                        SELECT key FROM cache_entries WHERE key LIKE 'sheet:%'
+                        ORDER BY updated_at DESC LIMIT ?
+                    )
+                """, (SHEETS_LIMIT,))
+
+    # --- Очередь отложенной записи ---
+
+    def enqueue(self, date, lesson_number, subject_id, records, base_statuses):
+        """Постановка отметок в очередь.
+
+        base_statuses - {student_id: статус на сервере при загрузке ведомости}.
+        При повторной правке той же отметки сохраняется исходный base_status.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO outbox
+                (student_id, date, lesson_number, subject_id, status, base_status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(student_id, date, lesson_number)
+                DO UPDATE SET subject_id = excluded.subject_id, status = excluded.status
+            """, [
+                (rec['student_id'], date, lesson_number, subject_id, rec['status'],
+                 base_statuses.get(rec['student_id']), now)
+                for rec in records
+            ])
+
+    def outbox_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def pending_for(self, date, lesson_number):
+        """Отложенные отметки занятия: {str(student_id): status}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT student_id, status FROM outbox WHERE date = ? AND lesson_number = ?",
+                (date, lesson_number)
+            ).fetchall()
+        return {str(row['student_id']): row['status'] for row in rows}
+
+    def pending_lessons(self):
+        """Очередь, сгруппированная по занятиям: [((date, lesson, subject_id), [строки])]"""
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(
+                "SELECT * FROM outbox ORDER BY date, lesson_number, subject_id, id"
+            )]
+        lessons = {}
+        for row in rows:
+            lessons.setdefault((row['date'], row['lesson_number'], row['subject_id']), []).append(row)
+        return list(lessons.items())
+
+    def remove(self, outbox_ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in outbox_ids])
+
+
+def replay_outbox(cache, api, batch_size=OUTBOX_BATCH_SIZE):
+    """Отправка очереди на сервер пачками по занятиям.
+
+    Перед отправкой отметки сверяются с сервером: если после правки
+    на сервере сохранили другой статус, отметка не отправляется и
+    возвращается как конфликт (на сервере остается его значение).
+    Отметки, которые сервер отклонил (ошибка записи в results или ответ
+    4xx на всю пачку: студент удален, некорректный статус), повтор не
+    исправит: они удаляются из очереди и возвращаются в rejected. При
+    обрыве связи или ошибке сервера (5xx) неотправленные отметки остаются
+    в очереди до следующей попытки.
+    """
+    api.ping()
+    sent = 0
+    conflicts = []
+    rejected = []
+    for (date, lesson_number, subject_id), rows in cache.pending_lessons():
+        server = api.get_attendance(date, lesson_number) or {}
+        to_send = []
+        done = []
+        for row in rows:
+            current = server.get(str(row['student_id']))
+            if current == row['status']:
+                done.append(row['id'])
+            elif current != row['base_status']:
+                conflicts.append({
+                    'student_id': row['student_id'],
+                    'date': date,
+                    'lesson_number': lesson_number,
+                    'local_status': row['status'],
+                    'server_status': current
+                })
+                done.append(row['id'])
+            else:
+                to_send.append(row)
+        cache.remove(done)
+
+        for i in range(0, len(to_send), batch_size):
+            chunk = to_send[i:i + batch_size]
+            try:
+                result = api.save_attendance_batch(
+                    date=date,
+                    lesson_number=lesson_number,
+                    records=[{'student_id': row['student_id'], 'status': row['status']} for row in chunk],
+                    subject_id=subject_id
+                )
+            except RequestRejected as e:
+                result = {'results': [{'saved': False, 'error': str(e)}] * len(chunk)}
+            sent += result.get('saved', 0)
+            # Результаты идут в порядке отправленных записей; строки без
+            # результата остаются в очереди
+            done = []
+            for row, row_result in zip(chunk, result.get('results', [])):
+                done.append(row['id'])
+                if not row_result.get('saved'):
+                    rejected.append({
+                        'student_id': row['student_id'],
+                        'date': date,
+                        'lesson_number': lesson_number,
+                        'local_status': row['status'],
+                        'error': row_result.get('error')
+                    })
+            cache.remove(done)
+    return {'sent': sent, 'conflicts': conflicts, 'rejected': rejected, 'remaining': cache.outbox_count()}
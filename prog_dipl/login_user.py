@@ -7,13 +7,12 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QTimer
 from user_window import UserWindow
 from admin_window import AdminScreen
-
-# URL вашего сервера
-SERVER_URL = 'http://127.0.0.1:5000'
+from api_client import SERVER_URL, get_session
 
 class LoginWindow(QWidget):
     def __init__(self):
         super().__init__()
+        self.http = get_session()
         self.setWindowTitle("Вход в систему — Авторизация")
         self.resize(400, 300)
         self.setup_ui()
@@ -98,7 +97,7 @@ class LoginWindow(QWidget):
     def check_server_connection(self):
         """Проверка соединения с сервером"""
         try:
-            response = requests.get(f"{SERVER_URL}/api/ping", timeout=2)
+            response = self.http.get(f"{SERVER_URL}/api/ping", timeout=2)
             if response.status_code == 200:
                 self.status_label.setText("✓ Соединение с сервером установлено")
                 self.status_label.setStyleSheet("color: green;")
@@ -121,7 +120,7 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, "Ошибка", "Пожалуйста, введите логин и пароль")
             return
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{SERVER_URL}/api/auth",
                 json={'username': username, 'password': password},
                 timeout=5
@@ -0,0 +1,204 @@
+"""PDF-отчет по статистике посещаемости.
+
+Строки разбиваются на страницы A4 (альбомная ориентация), шапка таблицы
+повторяется на каждой странице. Отчет рисуется через QPdfWriter/QPainter,
+поэтому может строиться в рабочем потоке клиента и на сервере без экрана
+(QT_QPA_PLATFORM=offscreen). Строки читаются по одной, в памяти хранится
+только текущая страница.
+
+Модуль общий для клиента (user_window.py) и сервера (bd2/servbd.py).
+QGuiApplication должна быть создана в главном потоке до построения отчета:
+у клиента это его QApplication, сервер вызывает ensure_gui_application()
+при запуске.
+"""
+import os
+import threading
+
+from PyQt5.QtCore import Qt, QMarginsF, QRectF
+from PyQt5.QtGui import QGuiApplication, QPdfWriter, QPainter, QFont, QColor, QPen, QPageSize, QPageLayout
+
+# Разрешение PDF (точек на дюйм): текст векторный, от разрешения зависит только точность координат
+PDF_RESOLUTION = 150
+FONT_FAMILY = 'Arial'
+FONT_SIZE = 9
+PAGE_MARGIN_MM = 12
+
+# Колонки: ключ строки, заголовок, относительная ширина, выравнивание
+COLUMNS = [
+    ('surname', 'Фамилия', 3, Qt.AlignLeft),
+    ('name', 'Имя', 2.5, Qt.AlignLeft),
+    ('group_name', 'Группа', 2, Qt.AlignLeft),
+    ('subject_name', 'Предмет', 4, Qt.AlignLeft),
+    ('present', 'Присутствовал', 1.6, Qt.AlignRight),
+    ('late', 'Опоздал', 1.3, Qt.AlignRight),
+    ('sick', 'Болел', 1.3, Qt.AlignRight),
+    ('absent', 'Отсутствовал', 1.6, Qt.AlignRight),
+    ('percent', 'Посещаемость (%)', 1.9, Qt.AlignRight),
+]
+COUNT_KEYS = ('present', 'late', 'sick', 'absent')
+# Цвета ячейки посещаемости: ниже 70% и ниже 90%
+PERCENT_COLORS = ((70, '#ffdddd'), (90, '#fff3cd'), (None, '#d4edda'))
+HEADER_COLOR = '#f2f2f2'
+
+_app = None
+
+
+class ReportCancelled(Exception):
+    """Построение отчета отменено пользователем"""
+
+
+def ensure_gui_application():
+    """QGuiApplication нужна для работы со шрифтами; на сервере создается без экрана.
+
+    Qt разрешает создавать ее только в главном потоке, поэтому из другого
+    потока без готового экземпляра вызывается RuntimeError.
+    """
+    global _app
+    if QGuiApplication.instance() is not None:
+        return
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError('PDF-отчеты недоступны: QGuiApplication не создана в главном потоке')
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    _app = QGuiApplication([])
+
+
+def attendance_percent(present, late, total):
+    return round((present + late) / total * 100, 1) if total else 0
+
+
+def percent_color(percent):
+    for limit, color in PERCENT_COLORS:
+        if limit is None or percent < limit:
+            return color
+
+
+class StatisticsPdfReport:
+    """Постраничная отрисовка таблицы статистики"""
+
+    def __init__(self, path, title, summary):
+        self.writer = QPdfWriter(path)
+        self.writer.setResolution(PDF_RESOLUTION)
+        self.writer.setPageSize(QPageSize(QPageSize.A4))
+        self.writer.setPageOrientation(QPageLayout.Landscape)
+        self.writer.setPageMargins(QMarginsF(*[PAGE_MARGIN_MM] * 4), QPageLayout.Millimeter)
+        self.writer.setTitle(title)
+        self.title = title
+        self.summary = summary
+
+        self.painter = QPainter(self.writer)
+        self.font = QFont(FONT_FAMILY, FONT_SIZE)
+        self.bold_font = QFont(FONT_FAMILY, FONT_SIZE, QFont.Bold)
+        self.title_font = QFont(FONT_FAMILY, FONT_SIZE * 2, QFont.Bold)
+        self.painter.setFont(self.font)
+
+        page = self.writer.pageLayout().paintRectPixels(PDF_RESOLUTION)
+        self.width = page.width()
+        self.height = page.height()
+        self.row_height = round(self.painter.fontMetrics().height() * 1.4)
+        self.padding = round(self.row_height * 0.25)
+        scale = self.width / sum(column[2] for column in COLUMNS)
+        self.column_x = []
+        x = 0
+        for column in COLUMNS:
+            self.column_x.append((x, column[2] * scale))
+            x += column[2] * scale
+
+        self.page_number = 0
+        self.y = 0
+
+    def start_page(self):
+        if self.page_number:
+            self.writer.newPage()
+        self.page_number += 1
+        self.y = 0
+        if self.page_number == 1:
+            self.painter.setFont(self.title_font)
+            title_height = round(self.painter.fontMetrics().height() * 1.5)
+            self.painter.drawText(QRectF(0, 0, self.width, title_height), Qt.AlignCenter, self.title)
+            self.y = title_height
+        self.painter.setFont(self.font)
+        # Номер страницы внизу
+        self.painter.drawText(QRectF(0, self.height - self.row_height, self.width, self.row_height),
+                              Qt.AlignRight | Qt.AlignVCenter, f'Страница {self.page_number}')
+        self.draw_row([column[1] for column in COLUMNS], font=self.bold_font, background=HEADER_COLOR)
+
+    def rows_left(self):
+        # Последняя строка страницы оставлена под номер страницы
+        return (self.height - self.row_height - self.y) // self.row_height
+
+    def draw_row(self, values, font=None, background=None, percent=None):
+        painter = self.painter
+        painter.setFont(font or self.font)
+        metrics = painter.fontMetrics()
+        for index, ((x, width), value) in enumerate(zip(self.column_x, values)):
+            cell = QRectF(x, self.y, width, self.row_height)
+            fill = percent_color(percent) if percent is not None and index == len(COLUMNS) - 1 else background
+            if fill:
+                painter.fillRect(cell, QColor(fill))
+            painter.setPen(QPen(QColor('#555555'), 1))
+            painter.drawRect(cell)
+            painter.setPen(QColor('#000000'))
+            text_rect = cell.adjusted(self.padding, 0, -self.padding, 0)
+            text = metrics.elidedText(str(value), Qt.ElideRight, int(text_rect.width()))
+            painter.drawText(text_rect, COLUMNS[index][3] | Qt.AlignVCenter, text)
+        self.y += self.row_height
+
+    def draw_text_line(self, text):
+        self.painter.setFont(self.font)
+        self.painter.drawText(QRectF(0, self.y, self.width, self.row_height), Qt.AlignLeft | Qt.AlignVCenter, text)
+        self.y += self.row_height
+
+    def finish(self):
+        self.painter.end()
+
+
+def render_statistics_pdf(path, rows, summary='', title='Статистика посещаемости',
+                          total_rows=None, progress=None, is_cancelled=None):
+    """Построение PDF-отчета по строкам статистики (словари или строки sqlite3).
+
+    progress(готово строк, всего строк) вызывается после каждой страницы;
+    если is_cancelled() возвращает True, построение прерывается с
+    ReportCancelled, а недописанный файл удаляется. Возвращает число страниц.
+    """
+    ensure_gui_application()
+    report = StatisticsPdfReport(path, title, summary)
+    try:
+        totals = dict.fromkeys(COUNT_KEYS, 0)
+        total_lessons = 0
+        done = 0
+        report.start_page()
+        for row in rows:
+            if report.rows_left() < 1:
+                if is_cancelled is not None and is_cancelled():
+                    raise ReportCancelled('Построение отчета отменено')
+                if progress is not None:
+                    progress(done, total_rows)
+                report.start_page()
+            counts = [row[key] or 0 for key in COUNT_KEYS]
+            total = row['total'] or 0
+            percent = attendance_percent(counts[0], counts[1], total)
+            report.draw_row([row['surname'], row['name'], row['group_name'], row['subject_name'] or '']
+                            + counts + [f'{percent}%'], percent=percent)
+            for key, value in zip(COUNT_KEYS, counts):
+                totals[key] += value
+            total_lessons += total
+            done += 1
+
+        # Итоговая строка и сводка (не разрываются между страницами)
+        if report.rows_left() < 3:
+            report.start_page()
+        total_percent = attendance_percent(totals['present'], totals['late'], sum(totals.values()))
+        report.draw_row(['ИТОГО', '', '', ''] + [totals[key] for key in COUNT_KEYS] + [f'{total_percent}%'],
+                        font=report.bold_font, background='#f0f0f0')
+        if summary:
+            report.draw_text_line(summary)
+        report.draw_text_line(f'Всего пар: {total_lessons} | Посещаемость: {total_percent}%')
+        report.finish()
+    except BaseException:
+        report.finish()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    if progress is not None:
+        progress(done, total_rows)
+    return report.page_number
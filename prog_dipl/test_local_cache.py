@@ -0,0 +1,76 @@
+"""Тесты очереди отложенной записи посещаемости (local_cache.replay_outbox)"""
+import pytest
+
+from api_client import RequestRejected
+from local_cache import LocalCache, replay_outbox
+
+
+class FakeApi:
+    """Сервер с посещаемостью в памяти; студент 2 удален, reject_all - ответ 400"""
+
+    def __init__(self, server=None, reject_all=False, fail=None):
+        self.server = server or {}
+        self.reject_all = reject_all
+        self.fail = fail
+        self.batches = []
+
+    def ping(self):
+        pass
+
+    def get_attendance(self, date, lesson_number):
+        return dict(self.server)
+
+    def save_attendance_batch(self, date, lesson_number, records, subject_id=None):
+        if self.fail:
+            raise self.fail
+        if self.reject_all:
+            raise RequestRejected('Server error: Некорректная дата')
+        self.batches.append(records)
+        results = []
+        for record in records:
+            if record['student_id'] == 2:
+                results.append({'student_id': 2, 'saved': False, 'error': 'Студент не найден'})
+            else:
+                self.server[str(record['student_id'])] = record['status']
+                results.append({'student_id': record['student_id'], 'saved': True})
+        return {'saved': sum(result['saved'] for result in results), 'results': results}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LocalCache(str(tmp_path / 'cache.db'))
+    cache.enqueue('2025-06-02', 1, None, [{'student_id': student_id, 'status': 'late'} for student_id in (1, 2, 3)],
+                  {})
+    return cache
+
+
+def test_rejected_rows_are_dropped_and_reported(cache):
+    api = FakeApi()
+    result = replay_outbox(cache, api)
+    assert result['sent'] == 2
+    assert [row['student_id'] for row in result['rejected']] == [2]
+    assert result['rejected'][0]['error'] == 'Студент не найден'
+    assert result['remaining'] == cache.outbox_count() == 0
+    # Повторная отправка не повторяет отклоненные отметки
+    assert replay_outbox(cache, api)['rejected'] == []
+    assert len(api.batches) == 1
+
+
+def test_rejected_batch_is_dropped(cache):
+    result = replay_outbox(cache, FakeApi(reject_all=True))
+    assert len(result['rejected']) == 3
+    assert cache.outbox_count() == 0
+
+
+def test_server_error_keeps_rows(cache):
+    with pytest.raises(RuntimeError):
+        replay_outbox(cache, FakeApi(fail=RuntimeError('Server error: 500')))
+    assert cache.outbox_count() == 3
+
+
+def test_conflicts_are_not_sent(cache):
+    api = FakeApi(server={'1': 'absent', '3': 'late'})
+    result = replay_outbox(cache, api)
+    assert [row['student_id'] for row in result['conflicts']] == [1]
+    assert [record['student_id'] for record in api.batches[0]] == [2]
+    assert cache.outbox_count() == 0
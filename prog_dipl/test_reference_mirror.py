@@ -0,0 +1,44 @@
+"""Тесты локальной копии справочников (api_client.ReferenceMirror)"""
+from api_client import ReferenceMirror
+
+
+def delta(version, full=False, **tables):
+    changes = {table: {'inserted': [], 'updated': [], 'deleted': []} for table in ReferenceMirror.TABLES}
+    for table, table_changes in tables.items():
+        changes[table].update(table_changes)
+    return {'version': version, 'full': full, 'changes': changes}
+
+
+GROUP = {'id': 1, 'name': 'ИС-1', 'course': 1}
+STUDENT = {'id': 5, 'surname': 'Иванов', 'name': 'Иван', 'middle_name': 'Иванович',
+           'group_id': 1, 'is_nonresident': 0}
+
+
+def test_mirror_applies_changes_after_known_version():
+    mirror = ReferenceMirror()
+    requested = []
+
+    def fetch(since):
+        requested.append(since)
+        return responses.pop(0)
+
+    responses = [
+        delta(3, groups={'inserted': [GROUP]}, students={'inserted': [STUDENT]}),
+        delta(3),
+        delta(5, groups={'updated': [dict(GROUP, name='ИС-2')]}, students={'deleted': [5]}),
+    ]
+    assert mirror.refresh(fetch)
+    assert mirror.groups() == [dict(GROUP, students_count=1)]
+    assert not mirror.refresh(fetch)
+    assert mirror.refresh(fetch)
+    assert requested == [0, 3, 3]
+    assert mirror.groups() == [dict(GROUP, name='ИС-2', students_count=0)]
+    assert mirror.students() == []
+
+
+def test_full_delta_replaces_mirror():
+    mirror = ReferenceMirror()
+    mirror.refresh(lambda since: delta(7, groups={'inserted': [GROUP, dict(GROUP, id=2, name='ИС-3')]}))
+    mirror.refresh(lambda since: delta(2, full=True, groups={'inserted': [GROUP]}))
+    assert mirror.version == 2
+    assert [group['id'] for group in mirror.groups()] == [1]
@@ -0,0 +1,71 @@
+"""Тесты чтения статистики потоком на клиенте (ServerAPI.iter_statistics)"""
+import json
+
+import pytest
+
+from api_client import NDJSON_MIMETYPE
+from user_window import ServerAPI
+
+
+class FakeResponse:
+    def __init__(self, status_code, lines, content_type=NDJSON_MIMETYPE):
+        self.status_code = status_code
+        self.lines = [json.dumps(line).encode() for line in lines]
+        self.headers = {'Content-Type': content_type}
+        self.closed = False
+
+    @property
+    def content(self):
+        return b'\n'.join(self.lines)
+
+    def json(self):
+        return json.loads(self.lines[0])
+
+    def iter_lines(self, chunk_size=None):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, params=None, stream=False, headers=None):
+        assert stream
+        return self.response
+
+
+def server_api(response):
+    api = ServerAPI('http://server')
+    api.session = FakeSession(response)
+    return api
+
+
+def test_error_response_is_closed():
+    response = FakeResponse(400, [{'error': 'Не указан период'}], content_type='application/json')
+    with pytest.raises(Exception, match='Не указан период'):
+        list(server_api(response).iter_statistics('2025-01-01', ''))
+    assert response.closed
+
+
+def test_rows_are_read_and_response_closed():
+    rows = [{'student_id': 1}, {'student_id': 2}]
+    response = FakeResponse(200, rows)
+    assert server_api(response).get_statistics('2025-01-01', '2025-01-31') == rows
+    assert response.closed
+
+
+def test_unfinished_stream_is_closed():
+    response = FakeResponse(200, [{'student_id': 1}, {'student_id': 2}])
+    rows = server_api(response).iter_statistics('2025-01-01', '2025-01-31')
+    assert next(rows) == {'student_id': 1}
+    rows.close()
+    assert response.closed
@@ -1,49 +1,103 @@
+import os
+import threading
 import requests
 from PyQt5.QtWidgets import (QWidget, QLabel, QPushButton, QMessageBox, QTabWidget,
                             QVBoxLayout, QTableWidget, QTableWidgetItem, QDateEdit,
                             QComboBox, QHBoxLayout, QHeaderView, QFrame, QSpinBox,
-                            QFileDialog,QButtonGroup,QRadioButton,QApplication)
+                            QFileDialog,QApplication, QTableView, QStyledItemDelegate,
+                            QStyle, QStyleOptionButton, QProgressDialog)
 from PyQt5.QtGui import QFont, QIcon, QColor
-from PyQt5.QtCore import Qt, QDate,QSizeF
-from PyQt5.QtPrintSupport import QPrinter
-from PyQt5.QtGui import QTextDocument
-import xlsxwriter
+from PyQt5.QtCore import (Qt, QDate, QObject, QRunnable, QThreadPool, pyqtSignal,
+                          QAbstractTableModel, QModelIndex, QEvent, QRect, QSize, QTimer)
+from api_client import (SERVER_URL, COMPACT_ACCEPT, NDJSON_MIMETYPE, get_session, decode_response,
+                        iter_ndjson, RequestRejected)
+from local_cache import LocalCache, replay_outbox
+from pdf_report import render_statistics_pdf, ReportCancelled
+
+# Интервал проверки связи для отправки отложенных изменений (мс)
+SYNC_INTERVAL = 15000
+
+
+class ServerUnavailable(Exception):
+    """Сервер недоступен (ошибка соединения или таймаут)"""
+
+
 class ServerAPI:
-    def __init__(self, base_url="http://127.0.0.1:5000"):
+    def __init__(self, base_url=SERVER_URL, cache=None):
         self.base_url = base_url
+        self.session = get_session()
+        # Локальный кэш: ответы на чтение при недоступном сервере
+        self.cache = cache
     
     def _make_request(self, method, endpoint, data=None):
         try:
             url = f"{self.base_url}{endpoint}"
             if method == "GET":
-                response = requests.get(url, params=data)
+                # Списки запрашиваются в компактном формате (сжатие gzip
+                # requests запрашивает и распаковывает сам)
+                response = self.session.get(url, params=data, headers={'Accept': COMPACT_ACCEPT})
             elif method == "POST":
-                response = requests.post(url, json=data)
+                response = self.session.post(url, json=data)
             elif method == "PUT":
-                response = requests.put(url, json=data)
+                response = self.session.put(url, json=data)
             elif method == "DELETE":
-                response = requests.delete(url)
+                response = self.session.delete(url)
             
             if response.status_code >= 400:
-                error_msg = response.json().get('error', 'Unknown error')
+                error_msg = decode_response(response).get('error', 'Unknown error')
+                if response.status_code < 500:
+                    raise RequestRejected(f"Server error: {error_msg}")
                 raise Exception(f"Server error: {error_msg}")
             
-            return response.json()
+            return decode_response(response)
         except requests.exceptions.RequestException as e:
-            QMessageBox.critical(None, 'Connection Error', f'Failed to connect to server: {str(e)}')
-            raise
+            # Запросы выполняются в рабочих потоках, поэтому окно с ошибкой
+            # показывает вызывающий код в потоке интерфейса
+            raise ServerUnavailable(f'Failed to connect to server: {str(e)}') from e
+
+    def _cached_request(self, key, endpoint, params=None):
+        """GET-запрос с сохранением ответа в кэш (без связи - ответ из кэша)"""
+        try:
+            result = self._make_request("GET", endpoint, params)
+        except ServerUnavailable:
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is None:
+                raise
+            return cached
+        if self.cache is not None:
+            self.cache.put(key, result)
+        return result
+
+    def ping(self):
+        return self._make_request("GET", "/api/ping")
     
     def get_groups(self):
-        return self._make_request("GET", "/api/get_universities")
+        return self._cached_request('groups', "/api/get_universities")
     
     def get_subjects(self):
-        return self._make_request("GET", "/api/subjects")
+        return self._cached_request('subjects', "/api/subjects")
     
-    def get_students(self, group_id=None):
+    def get_students(self, group_id=None, course=None, is_nonresident=None,
+                     name_prefix=None, after_id=None, limit=None):
+        """Студенты с фильтрацией на сервере (after_id/limit - постраничная выборка)"""
         params = {}
         if group_id:
             params['group_id'] = group_id
-        return self._make_request("GET", "/api/get_students", params)
+        if course is not None:
+            params['course'] = course
+        if is_nonresident is not None:
+            params['is_nonresident'] = int(is_nonresident)
+        if name_prefix:
+            params['name'] = name_prefix
+        if after_id is not None:
+            params['after_id'] = after_id
+        if limit is not None:
+            params['limit'] = limit
+        if after_id is not None or limit is not None:
+            # Страницы постраничной выборки не кэшируются
+            return self._make_request("GET", "/api/get_students", params)
+        key = 'students:' + ':'.join(f'{name}={value}' for name, value in sorted(params.items()))
+        return self._cached_request(key, "/api/get_students", params)
     
     def get_attendance(self, date, lesson_number, group_id=None, subject_id=None):
         params = {
@@ -56,6 +110,29 @@ class ServerAPI:
             params['subject_id'] = subject_id
         return self._make_request("GET", "/api/get_attendance", params)
     
+    def get_attendance_sheet(self, date, lesson_number, group_id=None, subject_id=None):
+        """Отметки и список студентов для ведомости занятия: (attendance, students)"""
+        key = LocalCache.sheet_key(date, lesson_number, group_id, subject_id)
+        try:
+            attendance = self.get_attendance(
+                date=date,
+                lesson_number=lesson_number,
+                group_id=group_id,
+                subject_id=subject_id
+            ) or {}  # На случай если сервер вернет None
+            students = self.get_students(group_id=group_id)
+        except ServerUnavailable:
+            # Без связи показываем последнюю загруженную версию ведомости
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is None:
+                raise
+            return tuple(cached)
+        if students is None:
+            raise Exception("Не удалось загрузить список студентов")
+        if self.cache is not None:
+            self.cache.put(key, [attendance, students])
+        return attendance, students
+    
     def save_attendance(self, student_id, date, lesson_number, status, subject_id=None):
         data = {
             'student_id': student_id,
@@ -66,8 +143,23 @@ class ServerAPI:
         if subject_id:
             data['subject_id'] = subject_id
         return self._make_request("POST", "/api/save_attendance", data)
+
+    def save_attendance_batch(self, date, lesson_number, records, subject_id=None):
+        """Сохранение всей ведомости занятия одним запросом.
+
+        records — список словарей {'student_id': ..., 'status': ...}
+        """
+        data = {
+            'date': date,
+            'lesson_number': lesson_number,
+            'records': records
+        }
+        if subject_id:
+            data['subject_id'] = subject_id
+        return self._make_request("POST", "/api/attendance/batch", data)
     
-    def get_statistics(self, start_date, end_date, group_id=None, subject_id=None, lesson_number=None):
+    def iter_statistics(self, start_date, end_date, group_id=None, subject_id=None, lesson_number=None):
+        """Строки статистики потоком NDJSON: каждая строка разбирается сразу после получения"""
         params = {
             'start_date': start_date,
             'end_date': end_date
@@ -78,12 +170,267 @@ class ServerAPI:
             params['subject_id'] = subject_id
         if lesson_number:
             params['lesson_number'] = lesson_number
-        return self._make_request("GET", "/api/get_statistics", params)
+        try:
+            # Ответ закрывается и при ошибке, и если строки дочитаны не до конца
+            with self.session.get(f"{self.base_url}/api/get_statistics", params=params, stream=True,
+                                  headers={'Accept': f'{NDJSON_MIMETYPE}, application/json;q=0.5'}) as response:
+                if response.status_code >= 400:
+                    error_msg = decode_response(response).get('error', 'Unknown error')
+                    raise Exception(f"Server error: {error_msg}")
+                yield from iter_ndjson(response)
+        except requests.exceptions.RequestException as e:
+            raise ServerUnavailable(f'Failed to connect to server: {str(e)}') from e
+
+    def get_statistics(self, start_date, end_date, group_id=None, subject_id=None, lesson_number=None):
+        # Большие отчеты читаются потоком, без разбора одного огромного JSON
+        return list(self.iter_statistics(start_date, end_date, group_id, subject_id, lesson_number))
+
+    def export_statistics_excel(self, file_path, start_date, end_date, group_id=None, subject_id=None,
+                                lesson_number=None):
+        """Загрузка готового файла Excel со статистикой с сервера по частям"""
+        params = {'start_date': start_date, 'end_date': end_date}
+        if group_id:
+            params['group_id'] = group_id
+        if subject_id:
+            params['subject_id'] = subject_id
+        if lesson_number:
+            params['lesson_number'] = lesson_number
+        part_path = file_path + '.part'
+        try:
+            with self.session.get(f"{self.base_url}/api/export/statistics.xlsx", params=params,
+                                  stream=True) as response:
+                if response.status_code >= 400:
+                    error_msg = decode_response(response).get('error', 'Unknown error')
+                    raise Exception(f"Server error: {error_msg}")
+                with open(part_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+            os.replace(part_path, file_path)
+        except requests.exceptions.RequestException as e:
+            raise ServerUnavailable(f'Failed to connect to server: {str(e)}') from e
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return file_path
+
+class ProgressSignals(QObject):
+    progress = pyqtSignal(int, int)
+
+
+class RequestSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class RequestWorker(QRunnable):
+    """Выполнение запроса к серверу в пуле потоков.
+
+    Результат возвращается сигналами в поток интерфейса. Отмененный
+    запрос доводится до конца, но его результат отбрасывается.
+    """
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.signals = RequestSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(e)
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(result)
+
+
+ATTENDANCE_STATUSES = [
+    ('present', 'Присут.'),
+    ('late', 'Опоздал'),
+    ('sick', 'Болел'),
+    ('absent', 'Отсут.')
+]
+
+
+class AttendanceModel(QAbstractTableModel):
+    """Модель ведомости посещаемости: студенты и их статусы.
+
+    Модель хранит снимок отметок, загруженных с сервера, и отдает на
+    сохранение новые и измененные строки. Студент без отметки на сервере
+    показывается как присутствующий и сохраняется с этим статусом, даже
+    если преподаватель его не менял; сохраненные и не измененные строки
+    повторно не отправляются.
+    """
+    HEADERS = ['ID', 'Фамилия', 'Имя', 'Группа', 'Статус']
+    FIELDS = ['id', 'surname', 'name', 'group_name']
+    STATUS_COLUMN = 4
+    DEFAULT_STATUS = 'present'
+
+    dirty_changed = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.students = []
+        self.statuses = []
+        self.saved_statuses = []
+        self.sheet_key = None
+
+    def set_sheet(self, students, attendance, sheet_key=None):
+        """Загрузка ведомости: студенты и отметки {student_id: status}.
+
+        При обновлении той же ведомости несохраненные правки не теряются.
+        """
+        edits = {}
+        if sheet_key is not None and sheet_key == self.sheet_key:
+            edits = {self.students[row]['id']: self.statuses[row] for row in self.dirty_rows()}
+        self.beginResetModel()
+        self.students = students
+        self.saved_statuses = [attendance.get(str(student['id'])) for student in students]
+        self.statuses = [
+            edits.get(student['id'], status)
+            for student, status in zip(students, self.saved_statuses)
+        ]
+        self.sheet_key = sheet_key
+        self.endResetModel()
+        self.dirty_changed.emit(self.dirty_count())
+
+    def is_dirty(self, row):
+        saved = self.saved_statuses[row]
+        return saved is None or (self.statuses[row] or self.DEFAULT_STATUS) != saved
+
+    def dirty_rows(self):
+        return [row for row in range(len(self.students)) if self.is_dirty(row)]
+
+    def dirty_count(self):
+        return len(self.dirty_rows())
+
+    def saved_snapshot(self):
+        """Отметки, загруженные с сервера: {student_id: status}"""
+        return {student['id']: status for student, status in zip(self.students, self.saved_statuses)}
+
+    def records(self):
+        """Новые и измененные статусы в формате пакетного сохранения"""
+        return [
+            {'student_id': self.students[row]['id'], 'status': self.statuses[row] or self.DEFAULT_STATUS}
+            for row in self.dirty_rows()
+        ]
+
+    def mark_saved(self, records, results, sheet_key=None):
+        """Перенос успешно сохраненных статусов в снимок сервера"""
+        if sheet_key != self.sheet_key:
+            return
+        saved_ids = {result['student_id'] for result in results if result.get('saved')}
+        rows = {student['id']: row for row, student in enumerate(self.students)}
+        for record in records:
+            row = rows.get(record['student_id'])
+            if row is not None and record['student_id'] in saved_ids:
+                self.saved_statuses[row] = record['status']
+        self.dirty_changed.emit(self.dirty_count())
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.students)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if column == self.STATUS_COLUMN:
+            if role in (Qt.EditRole, Qt.UserRole):
+                return self.statuses[row] or self.DEFAULT_STATUS
+            return None
+        if role == Qt.FontRole and self.is_dirty(row):
+            font = QFont()
+            font.setBold(True)
+            return font
+        if role == Qt.DisplayRole:
+            return str(self.students[row][self.FIELDS[column]])
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != self.STATUS_COLUMN or role != Qt.EditRole:
+            return False
+        if value not in dict(ATTENDANCE_STATUSES) or self.statuses[index.row()] == value:
+            return False
+        self.statuses[index.row()] = value
+        # Измененная строка выделяется жирным шрифтом
+        self.dataChanged.emit(self.index(index.row(), 0), index)
+        self.dirty_changed.emit(self.dirty_count())
+        return True
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.STATUS_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+
+class StatusDelegate(QStyledItemDelegate):
+    """Отрисовка четырех вариантов статуса в одной ячейке без виджетов"""
+
+    def status_rects(self, rect):
+        width = rect.width() // len(ATTENDANCE_STATUSES)
+        return [
+            QRect(rect.x() + i * width, rect.y(), width, rect.height())
+            for i in range(len(ATTENDANCE_STATUSES))
+        ]
+
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        current = index.data(Qt.EditRole)
+        widget = option.widget
+        style = widget.style() if widget else QApplication.style()
+        for (status, label), rect in zip(ATTENDANCE_STATUSES, self.status_rects(option.rect)):
+            button = QStyleOptionButton()
+            button.rect = rect.adjusted(6, 0, 0, 0)
+            button.text = label
+            button.fontMetrics = option.fontMetrics
+            button.palette = option.palette
+            button.state = QStyle.State_Enabled | (QStyle.State_On if status == current else QStyle.State_Off)
+            # Виджет не передается: иначе к каждому варианту применяется
+            # рамка из таблицы стилей таблицы
+            style.drawControl(QStyle.CE_RadioButton, button, painter, None)
+
+    def editorEvent(self, event, model, option, index):
+        # Клик по варианту статуса сразу меняет данные модели
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            for (status, _), rect in zip(ATTENDANCE_STATUSES, self.status_rects(option.rect)):
+                if rect.contains(event.pos()):
+                    model.setData(index, status, Qt.EditRole)
+                    return True
+        return super().editorEvent(event, model, option, index)
+
+    def createEditor(self, parent, option, index):
+        return None
+
+    def sizeHint(self, option, index):
+        text_width = max(option.fontMetrics.horizontalAdvance(label) for _, label in ATTENDANCE_STATUSES)
+        return QSize((text_width + 40) * len(ATTENDANCE_STATUSES), 50)
+
 
 class UserWindow(QWidget):
     def __init__(self):
         super().__init__()
-        self.api = ServerAPI()
+        self.cache = LocalCache()
+        self.api = ServerAPI(cache=self.cache)
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(4)
+        self.active_requests = {}
+        self.groups = None
+        self.subjects = None
         
         self.setWindowTitle('Система учета посещаемости')
         self.setGeometry(100, 100, 1600, 1000)
@@ -93,11 +440,56 @@ class UserWindow(QWidget):
         self.set_style()
         self.load_initial_data()
 
+        # Отложенные изменения отправляются, как только сервер снова доступен
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.sync_outbox)
+        self.sync_timer.start(SYNC_INTERVAL)
+
+    def run_request(self, key, func, on_success, on_error, *args, **kwargs):
+        """Асинхронный запрос к серверу.
+
+        Предыдущий незавершенный запрос с тем же ключом отменяется,
+        чтобы устаревшие данные не перезаписали результат нового.
+        """
+        previous = self.active_requests.pop(key, None)
+        if previous:
+            previous.cancel()
+            self.thread_pool.tryTake(previous)
+
+        worker = RequestWorker(func, *args, **kwargs)
+        worker.setAutoDelete(False)
+
+        def finished(result):
+            if self.active_requests.get(key) is worker:
+                del self.active_requests[key]
+            on_success(result)
+
+        def failed(error):
+            if self.active_requests.get(key) is worker:
+                del self.active_requests[key]
+            on_error(error)
+
+        worker.signals.finished.connect(finished)
+        worker.signals.failed.connect(failed)
+        self.active_requests[key] = worker
+        self.thread_pool.start(worker)
+        return worker
+
     def load_initial_data(self):
+        """Параллельная загрузка групп и предметов, затем посещаемости и статистики"""
+        self.pending_reference_data = {'groups', 'subjects'}
         self.load_groups()
         self.load_subjects()
-        self.load_attendance_data()
-        self.load_statistics()
+        self.sync_outbox()
+
+    def reference_data_loaded(self, name):
+        pending = getattr(self, 'pending_reference_data', None)
+        if not pending or name not in pending:
+            return
+        pending.discard(name)
+        if not pending:
+            self.load_attendance_data()
+            self.load_statistics()
 
     def init_ui(self):
         self.tabs = QTabWidget()
@@ -249,17 +641,21 @@ class UserWindow(QWidget):
         layout.addWidget(filter_panel)
 
         # Таблица посещаемости
-        self.attendance_table = QTableWidget()
-        self.attendance_table.setColumnCount(5)
-        self.attendance_table.setHorizontalHeaderLabels(['ID', 'Фамилия', 'Имя', 'Группа', 'Статус'])
+        self.attendance_model = AttendanceModel(self)
+        self.attendance_model.dirty_changed.connect(self.show_unsaved_changes)
+        self.attendance_table = QTableView()
+        self.attendance_table.setModel(self.attendance_model)
+        self.attendance_table.setItemDelegateForColumn(AttendanceModel.STATUS_COLUMN, StatusDelegate(self.attendance_table))
         self.attendance_table.setColumnHidden(0, True)
         self.attendance_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
         self.attendance_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
         self.attendance_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
         self.attendance_table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeToContents)
         self.attendance_table.verticalHeader().setVisible(False)
-        self.attendance_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.attendance_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.attendance_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.attendance_table.verticalHeader().setDefaultSectionSize(50)
+        self.attendance_table.setSelectionBehavior(QTableView.SelectRows)
+        self.attendance_table.setEditTriggers(QTableView.NoEditTriggers)
         self.attendance_table.setFont(QFont('Segoe UI', 11))
         self.attendance_table.setAlternatingRowColors(True)
         layout.addWidget(self.attendance_table, 1)
@@ -400,144 +796,221 @@ class UserWindow(QWidget):
         
         layout.addLayout(export_buttons)
 
+    @staticmethod
+    def fill_combo(combo, items):
+        """Заполнение списка с сохранением выбранного элемента"""
+        current = combo.currentData()
+        # Сигналы блокируются, чтобы заполнение списков не вызывало
+        # десятки промежуточных перезагрузок таблиц
+        combo.blockSignals(True)
+        combo.clear()
+        for item in items:
+            combo.addItem(item['name'], item['id'])
+        index = combo.findData(current)
+        if index >= 0:
+            combo.setCurrentIndex(index)
+        combo.blockSignals(False)
+
     def load_groups(self):
-        try:
-            groups = self.api.get_groups()
-            self.filter_group.clear()
-            self.stats_group_filter.clear()
-            
-            for group in groups:
-                self.filter_group.addItem(group['name'], group['id'])
-                self.stats_group_filter.addItem(group['name'], group['id'])
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке групп: {str(e)}')
+        # Сначала показываем список из локального кэша, затем обновляем с сервера
+        cached = self.cache.get('groups')
+        if cached:
+            self.show_groups(cached)
+        self.run_request('groups', self.api.get_groups, self.show_groups,
+                         lambda error: self.show_reference_error('groups', 'групп', error))
+
+    def show_groups(self, groups):
+        if groups != self.groups:
+            self.groups = groups
+            for combo in (self.filter_group, self.stats_group_filter):
+                self.fill_combo(combo, groups)
+        self.reference_data_loaded('groups')
 
     def load_subjects(self):
-        try:
-            subjects = self.api.get_subjects()
-            self.subject_combo.clear()
-            self.stats_subject_filter.clear()
-            
-            for subject in subjects:
-                self.subject_combo.addItem(subject['name'], subject['id'])
-                self.stats_subject_filter.addItem(subject['name'], subject['id'])
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке предметов: {str(e)}')
+        cached = self.cache.get('subjects')
+        if cached:
+            self.show_subjects(cached)
+        self.run_request('subjects', self.api.get_subjects, self.show_subjects,
+                         lambda error: self.show_reference_error('subjects', 'предметов', error))
+
+    def show_subjects(self, subjects):
+        if subjects != self.subjects:
+            self.subjects = subjects
+            for combo in (self.subject_combo, self.stats_subject_filter):
+                self.fill_combo(combo, subjects)
+        self.reference_data_loaded('subjects')
+
+    def show_reference_error(self, name, title, error):
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке {title}: {error}')
+        self.reference_data_loaded(name)
 
     def load_attendance_data(self):
-        try:
-            date = self.filter_date.date().toString('yyyy-MM-dd')
-            lesson_num = self.lesson_number.value()
-            group_id = self.filter_group.currentData()
-            subject_id = self.subject_combo.currentData()
-        
-        # Получаем данные о посещаемости
-            attendance_data = self.api.get_attendance(
-                date=date,
-                lesson_number=lesson_num,
-                group_id=group_id,
-                subject_id=subject_id
-            ) or {}  # На случай если сервер вернет None
-        
-        # Получаем список студентов
-            students = self.api.get_students(group_id=group_id)
-            if not students:
-                raise Exception("Не удалось загрузить список студентов")
-        
-            self.attendance_table.setRowCount(len(students))
-            for row, student in enumerate(students):
-                student_id = str(student['id'])
-                status = attendance_data.get(student_id, 'present')
-            
-                self.attendance_table.setItem(row, 0, QTableWidgetItem(student_id))
-                self.attendance_table.setItem(row, 1, QTableWidgetItem(student['surname']))
-                self.attendance_table.setItem(row, 2, QTableWidgetItem(student['name']))
-                self.attendance_table.setItem(row, 3, QTableWidgetItem(student['group_name']))
-            
+        date = self.filter_date.date().toString('yyyy-MM-dd')
+        lesson_num = self.lesson_number.value()
+        group_id = self.filter_group.currentData()
+        subject_id = self.subject_combo.currentData()
+        sheet_key = (date, lesson_num, group_id, subject_id)
+
+        cached = self.cache.get(LocalCache.sheet_key(date, lesson_num, group_id, subject_id))
+        if cached:
+            self.show_attendance_data(cached, sheet_key)
+        self.run_request(
+            'attendance', self.api.get_attendance_sheet,
+            lambda sheet: self.show_attendance_data(sheet, sheet_key),
+            lambda error: QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке данных: {error}'),
+            date=date, lesson_number=lesson_num, group_id=group_id, subject_id=subject_id
+        )
 
-                status_widget = QWidget()
-                status_layout = QHBoxLayout(status_widget)
-                button_group = QButtonGroup(status_widget)
-            
-                status_types = [
-                    ('present', 'Присут.'),
-                    ('late', 'Опоздал'),
-                 ('sick', 'Болел'),
-                    ('absent', 'Отсут.')
-                ]
-            
-                for status_type, label in status_types:
-                    btn = QRadioButton(label)
-                    btn.setProperty('status', status_type)
-                    button_group.addButton(btn)
-                    status_layout.addWidget(btn)
-                    if status_type == status:
-                        btn.setChecked(True)
-            
-                self.attendance_table.setCellWidget(row, 4, status_widget)
-                self.attendance_table.setRowHeight(row, 50)
-            
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке данных: {str(e)}')
+    def show_attendance_data(self, sheet, sheet_key=None):
+        attendance_data, students = sheet
+        if sheet_key:
+            # Отметки из очереди отложенной записи показываются как сохраненные
+            pending = self.cache.pending_for(sheet_key[0], sheet_key[1])
+            if pending:
+                attendance_data = {**attendance_data, **pending}
+        self.attendance_model.set_sheet(students, attendance_data, sheet_key)
+
+    def show_unsaved_changes(self, count):
+        """Индикатор несохраненных изменений"""
+        if count:
+            self.save_btn.setText(f'Сохранить ({count})')
+            self.status_bar.setText(f"Несохраненных изменений: {count}")
+            self.status_bar.setStyleSheet("color: #f0ad4e; font-weight: bold;")
+        elif self.save_btn.text() != 'Сохранить':
+            self.save_btn.setText('Сохранить')
+            self.status_bar.setText("")
 
     def save_attendance(self):
-        try:
-            date = self.filter_date.date().toString('yyyy-MM-dd')
-            lesson_num = self.lesson_number.value()
-            subject_id = self.subject_combo.currentData()
-            saved = 0
-            
-            for row in range(self.attendance_table.rowCount()):
-                student_id = int(self.attendance_table.item(row, 0).text())
-                radio_widget = self.attendance_table.cellWidget(row, 4)
-                
-                status = None
-                for btn in radio_widget.findChildren(QRadioButton):
-                    if btn.isChecked():
-                        status = btn.property('status')
-                        break
-                
-                if status:
-                    self.api.save_attendance(
-                        student_id=student_id,
-                        date=date,
-                        lesson_number=lesson_num,
-                        status=status,
-                        subject_id=subject_id
-                    )
-                    saved += 1
-            
+        date = self.filter_date.date().toString('yyyy-MM-dd')
+        lesson_num = self.lesson_number.value()
+        subject_id = self.subject_combo.currentData()
+        sheet_key = self.attendance_model.sheet_key
+        # Отправляются только новые и измененные отметки
+        records = self.attendance_model.records()
+        if not records:
+            self.status_bar.setText("Нет изменений для сохранения")
+            self.status_bar.setStyleSheet("color: #555;")
+            return
+        base_statuses = self.attendance_model.saved_snapshot()
+
+        if self.cache.outbox_count():
+            # Пока очередь ждет связи, новые отметки встают за ней,
+            # чтобы старые правки не перезаписали более новые
+            self.save_offline(date, lesson_num, subject_id, records, base_statuses, sheet_key, offline=False)
+            self.sync_outbox()
+            return
+        
+        # Все изменения уходят на сервер одним запросом
+        self.save_btn.setEnabled(False)
+        self.status_bar.setText("Сохранение...")
+        self.status_bar.setStyleSheet("color: #555;")
+        self.run_request(
+            'save', self.api.save_attendance_batch,
+            lambda result: self.show_save_result(result, records, sheet_key),
+            lambda error: self.show_save_error(
+                error, date, lesson_num, subject_id, records, base_statuses, sheet_key),
+            date=date, lesson_number=lesson_num, records=records, subject_id=subject_id
+        )
+
+    def show_save_result(self, result, records=(), sheet_key=None):
+        self.save_btn.setEnabled(True)
+        saved = result.get('saved', 0)
+        failed = result.get('failed', 0)
+        self.attendance_model.mark_saved(records, result.get('results', []), sheet_key)
+        
+        if failed:
+            self.status_bar.setText(f"Сохранено: {saved} записей, ошибок: {failed}")
+            self.status_bar.setStyleSheet("color: #d9534f; font-weight: bold;")
+        else:
             self.status_bar.setText(f"Сохранено: {saved} записей")
             self.status_bar.setStyleSheet("color: #4CAF50; font-weight: bold;")
-            
-            # Обновляем статистику после сохранения
-            self.load_statistics()
-            
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка при сохранении: {str(e)}')
+        
+        # Обновляем статистику после сохранения
+        self.load_statistics()
 
-    def load_statistics(self):
-        try:
-            start_date = self.stats_start_date.date().toString('yyyy-MM-dd')
-            end_date = self.stats_end_date.date().toString('yyyy-MM-dd')
-            group_id = self.stats_group_filter.currentData()
-            subject_id = self.stats_subject_filter.currentData()
-            lesson_num = self.stats_lesson_filter.currentData()
-            
-            stats = self.api.get_statistics(
-                start_date=start_date,
-                end_date=end_date,
-                group_id=group_id,
-                subject_id=subject_id,
-                lesson_number=lesson_num
+    def show_save_error(self, error, date=None, lesson_num=None, subject_id=None,
+                        records=(), base_statuses=None, sheet_key=None):
+        self.save_btn.setEnabled(True)
+        if isinstance(error, ServerUnavailable) and records:
+            self.save_offline(date, lesson_num, subject_id, records, base_statuses or {}, sheet_key)
+            return
+        self.status_bar.setText("")
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка при сохранении: {error}')
+
+    def save_offline(self, date, lesson_num, subject_id, records, base_statuses, sheet_key, offline=True):
+        """Сохранение отметок в локальную очередь до восстановления связи"""
+        self.cache.enqueue(date, lesson_num, subject_id, records, base_statuses)
+        self.attendance_model.mark_saved(
+            records, [{'student_id': record['student_id'], 'saved': True} for record in records], sheet_key)
+        self.show_outbox_status(offline)
+
+    def show_outbox_status(self, offline=True):
+        count = self.cache.outbox_count()
+        if count:
+            prefix = "Нет связи с сервером. " if offline else ""
+            self.status_bar.setText(f"{prefix}Ожидают отправки: {count}")
+            self.status_bar.setStyleSheet("color: #f0ad4e; font-weight: bold;")
+
+    def sync_outbox(self):
+        """Отправка очереди отложенных изменений, если сервер доступен"""
+        if 'sync' in self.active_requests or not self.cache.outbox_count():
+            return
+        self.run_request('sync', replay_outbox, self.show_sync_result, self.show_sync_error,
+                         self.cache, self.api)
+
+    def show_sync_result(self, result):
+        conflicts = result.get('conflicts', [])
+        self.status_bar.setText(f"Отправлено отложенных изменений: {result.get('sent', 0)}")
+        self.status_bar.setStyleSheet("color: #4CAF50; font-weight: bold;")
+        if conflicts:
+            QMessageBox.warning(
+                self, 'Конфликт изменений',
+                f'Не отправлено отметок: {len(conflicts)}. '
+                f'Пока не было связи, их изменили на сервере; оставлены значения сервера.'
             )
-            
-            self.update_stats_table(stats)
-            
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке статистики: {str(e)}')
+        rejected = result.get('rejected', [])
+        if rejected:
+            # Отклоненные отметки уже удалены из очереди: сообщение показывается один раз
+            self.status_bar.setText(f"Отправлено отложенных изменений: {result.get('sent', 0)}, "
+                                    f"отклонено сервером: {len(rejected)}")
+            self.status_bar.setStyleSheet("color: #d9534f; font-weight: bold;")
+            QMessageBox.warning(
+                self, 'Отметки не сохранены',
+                f'Сервер не принял отметок: {len(rejected)} '
+                f'({"; ".join(sorted({str(row["error"]) for row in rejected}))}). '
+                f'Они удалены из очереди отложенных изменений; в ведомости показаны значения сервера.'
+            )
+        self.load_attendance_data()
+        self.load_statistics()
+
+    def show_sync_error(self, error):
+        if isinstance(error, ServerUnavailable):
+            self.show_outbox_status()
+        else:
+            self.status_bar.setText(f"Ошибка отправки отложенных изменений: {error}")
+            self.status_bar.setStyleSheet("color: #d9534f; font-weight: bold;")
+
+    def load_statistics(self):
+        start_date = self.stats_start_date.date().toString('yyyy-MM-dd')
+        end_date = self.stats_end_date.date().toString('yyyy-MM-dd')
+        group_id = self.stats_group_filter.currentData()
+        subject_id = self.stats_subject_filter.currentData()
+        lesson_num = self.stats_lesson_filter.currentData()
+        
+        self.run_request(
+            'statistics', self.api.get_statistics,
+            self.update_stats_table,
+            lambda error: QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке статистики: {error}'),
+            start_date=start_date,
+            end_date=end_date,
+            group_id=group_id,
+            subject_id=subject_id,
+            lesson_number=lesson_num
+        )
 
     def update_stats_table(self, stats):
+        # Строки для PDF-отчета
+        self.stats_rows = stats
         self.stats_table.setRowCount(len(stats) + 1)
         total_present = total_late = total_sick = total_absent = total_lessons = 0
 
@@ -625,168 +1098,82 @@ class UserWindow(QWidget):
         )
 
     def export_to_pdf(self):
-        try:
-            # Создаем документ
-            doc = QTextDocument()
-            doc.setDocumentMargin(0)  # Убираем стандартные отступы
-            
-            # Рассчитываем масштаб 
-            table_width = sum(self.stats_table.columnWidth(col) for col in range(self.stats_table.columnCount()))
-            scale_factor = min(5.0, 2500 / table_width)  
-            
-            # Формируем HTML с разными коэффициентами увеличения
-            html = [
-                "<html><head><style>",
-                "body { font-family: 'Segoe UI', Arial, sans-serif; margin: 0; padding: 0; height: 100vh;",
-                "display: flex; flex-direction: column; justify-content: center; align-items: center; }",
-                "h1 { text-align: center; font-size: 72pt; margin: 0 0 40px 0; font-weight: bold; }",  # В 3 раза больше
-                "h2 { text-align: center; font-size: 36pt; margin: 0 0 60px 0; }",  # В 3 раза больше
-                "table { border-collapse: collapse; margin: 0 auto 50px auto; }",  # Таблица в 5 раз больше
-                "th, td { border: 3px solid #555; padding: 25px; font-size: 25pt; text-align: center; }",  # В 5 раз больше
-                "th { background-color: #f2f2f2; font-weight: bold; }",
-                ".good { background-color: #d4edda !important; }",
-                ".medium { background-color: #fff3cd !important; }",
-                ".bad { background-color: #ffdddd !important; }",
-                ".summary { font-size: 36pt; text-align: center; margin-top: 60px; line-height: 1.8; }",  # В 3 раза больше
-                "</style></head><body>"
-            ]
-            
-            # Заголовок 
-            html.append("<h1>СТАТИСТИКА ПОСЕЩАЕМОСТИ</h1>")
-            
-            # Таблица 
-            html.append(f'<table style="font-size: {25*scale_factor}pt">')
-            html.append("<colgroup>")
-            
-            # Ширины столбцов 
-            for col in range(self.stats_table.columnCount()):
-                width = self.stats_table.columnWidth(col) * scale_factor * 5.0
-                html.append(f'<col width="{width}px">')
-            
-            # Заголовки таблицы
-            html.append("<thead><tr>")
-            for col in range(self.stats_table.columnCount()):
-                header = self.stats_table.horizontalHeaderItem(col).text()
-                html.append(f"<th>{header}</th>")
-            html.append("</tr></thead><tbody>")
-            
-            # Данные таблицы
-            for row in range(self.stats_table.rowCount()):
-                html.append("<tr style='height: 60px;'>")
-                for col in range(self.stats_table.columnCount()):
-                    item = self.stats_table.item(row, col)
-                    text = item.text() if item else ''
-                    
-                    # Обработка цветов
-                    cell_class = ""
-                    if col == self.stats_table.columnCount() - 1 and '%' in text:
-                        try:
-                            percent = float(text.replace('%', '').strip())
-                            cell_class = "bad" if percent < 70 else "medium" if percent < 90 else "good"
-                        except ValueError:
-                            pass
-                    
-                    html.append(f'<td class="{cell_class}">{text}</td>')
-                html.append("</tr>")
-            
-            html.append("</tbody></table>")
-            
-            # Статистика 
-            summary = self.stats_summary.text().split('\n')
-            html.append('<div class="summary">')
-            html.extend(f'<div>{line}</div>' for line in summary)
-            html.append('</div></body></html>')
-            
-            doc.setHtml('\n'.join(html))
-            
-            # Настройка принтера
-            printer = QPrinter(QPrinter.HighResolution)
-            printer.setOutputFormat(QPrinter.PdfFormat)
-            printer.setResolution(600)
-            printer.setPageSize(QPrinter.A4)
-            printer.setFullPage(True)
-            printer.setOrientation(QPrinter.Landscape)
-            
-            # Сохранение файла
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, "Сохранить как PDF", "", "PDF Files (*.pdf)")
-            
-            if file_path:
-                if not file_path.endswith('.pdf'):
-                    file_path += '.pdf'
-                
-                printer.setOutputFileName(file_path)
-                doc.setPageSize(QSizeF(printer.pageRect().size()))
-                doc.print_(printer)
-                
-                QMessageBox.information(self, "Готово", "PDF создан !")
-                
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка: {str(e)}")
+        """PDF-отчет по загруженной статистике: строится в рабочем потоке с прогрессом и отменой"""
+        rows = getattr(self, 'stats_rows', None)
+        if rows is None:
+            QMessageBox.warning(self, "Ошибка", "Статистика еще не загружена")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить как PDF", "", "PDF Files (*.pdf)")
+        if not file_path:
+            return
+        if not file_path.endswith('.pdf'):
+            file_path += '.pdf'
+
+        cancel = threading.Event()
+        dialog = QProgressDialog("Формирование PDF...", "Отмена", 0, max(len(rows), 1), self)
+        dialog.setWindowTitle("Экспорт в PDF")
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(500)
+        dialog.canceled.connect(cancel.set)
+        # Сигнал прогресса передает значения из рабочего потока в поток интерфейса
+        self.pdf_progress = ProgressSignals()
+        self.pdf_progress.progress.connect(lambda done, total: dialog.setValue(done))
+        self.export_pdf_btn.setEnabled(False)
+
+        def finished(pages):
+            dialog.reset()
+            dialog.deleteLater()
+            self.export_pdf_btn.setEnabled(True)
+            QMessageBox.information(self, "Готово", f"PDF создан! Страниц: {pages}")
+
+        def failed(error):
+            dialog.reset()
+            dialog.deleteLater()
+            self.export_pdf_btn.setEnabled(True)
+            if isinstance(error, ReportCancelled):
+                self.status_bar.setText("Формирование PDF отменено")
+                return
+            QMessageBox.critical(self, "Ошибка", f"Ошибка: {error}")
+
+        self.run_request(
+            'export_pdf', render_statistics_pdf, finished, failed,
+            file_path, rows,
+            summary=self.stats_summary.text().split('\n')[0],
+            total_rows=len(rows),
+            progress=self.pdf_progress.progress.emit,
+            is_cancelled=cancel.is_set
+        )
 
     def export_to_excel(self):
-        try:
-            # Получаем данные из таблицы
-            headers = []
-            for col in range(self.stats_table.columnCount()):
-                headers.append(self.stats_table.horizontalHeaderItem(col).text())
-            
-            data = []
-            for row in range(self.stats_table.rowCount()):
-                row_data = []
-                for col in range(self.stats_table.columnCount()):
-                    item = self.stats_table.item(row, col)
-                    row_data.append(item.text() if item else '')
-                data.append(row_data)
-            
-            # Сохраняем файл
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, "Сохранить как Excel", "", "Excel Files (*.xlsx)")
-            
-            if file_path:
-                if not file_path.endswith('.xlsx'):
-                    file_path += '.xlsx'
-                
-                # Создаем новый Excel файл
-                workbook = xlsxwriter.Workbook(file_path)
-                worksheet = workbook.add_worksheet('Статистика')
-                
-                # Форматы
-                header_format = workbook.add_format({
-                    'bold': True,
-                    'border': 1,
-                    'bg_color': '#D7E4BC',
-                    'align': 'center',
-                    'valign': 'vcenter'
-                })
-                
-                # Записываем заголовки
-                for col, header in enumerate(headers):
-                    worksheet.write(0, col, header, header_format)
-                
-                # Записываем данные
-                for row_num, row_data in enumerate(data, start=1):
-                    for col_num, cell_data in enumerate(row_data):
-                        worksheet.write(row_num, col_num, cell_data)
-                
-                # Автонастройка ширины столбцов
-                for col, header in enumerate(headers):
-                    max_len = len(header)
-                    for row in data:
-                        if len(str(row[col])) > max_len:
-                            max_len = len(str(row[col]))
-                    worksheet.set_column(col, col, max_len + 2)
-                
-                # Добавляем информацию о периоде
-                summary = self.stats_summary.text().split('\n')
-                worksheet.write(len(data)+1, 0, summary[0])
-                worksheet.write(len(data)+2, 0, summary[1])
-                
-                workbook.close()
-                QMessageBox.information(self, "Успех", "Файл успешно сохранен!")
-                
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать в Excel: {str(e)}")
+        """Выгрузка статистики в Excel: файл строит сервер по тем же фильтрам"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить как Excel", "", "Excel Files (*.xlsx)")
+        if not file_path:
+            return
+        if not file_path.endswith('.xlsx'):
+            file_path += '.xlsx'
+
+        self.export_excel_btn.setEnabled(False)
+
+        def finished(path):
+            self.export_excel_btn.setEnabled(True)
+            QMessageBox.information(self, "Успех", "Файл успешно сохранен!")
+
+        def failed(error):
+            self.export_excel_btn.setEnabled(True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать в Excel: {error}")
+
+        self.run_request(
+            'export_excel', self.api.export_statistics_excel, finished, failed,
+            file_path,
+            start_date=self.stats_start_date.date().toString('yyyy-MM-dd'),
+            end_date=self.stats_end_date.date().toString('yyyy-MM-dd'),
+            group_id=self.stats_group_filter.currentData(),
+            subject_id=self.stats_subject_filter.currentData(),
+            lesson_number=self.stats_lesson_filter.currentData()
+        )
+
     def set_style(self):
         self.setStyleSheet('''
             QWidget {
@@ -845,7 +1232,7 @@ class UserWindow(QWidget):
                 width: 20px;
                 border-left: 1px solid #ccc;
             }
-            QTableWidget {
+            QTableWidget, QTableView {
                 border: 1px solid #d0d0d0;
                 border-radius: 4px;
                 background: #fff;
@@ -860,13 +1247,6 @@ class UserWindow(QWidget):
                 border: none;
                 font-weight: bold;
             }
-            QRadioButton {
-                spacing: 5px;
-            }
-            QRadioButton::indicator {
-                width: 16px;
-                height: 16px;
-            }
             #filterPanel, #dateFilter, #lessonFilter, #subjectFilter, #groupFilter {
                 background: #fff;
                 border-radius: 4px;